@@ -1,17 +1,24 @@
 # https://github.com/vitalygusev/ceilo-scripts/blob/master/mongo-generator.py
 
 import argparse
-import copy
+import binascii
 import datetime
 import itertools
+import json
+import math
 import multiprocessing
+import os
 import random
+import threading
 import uuid
 
-from oslo_config import cfg
+from six.moves import queue
 from six.moves import range
 
-from ceilometer.storage import impl_mongodb
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 metadata = {"state_description": "scheduling",
@@ -68,61 +75,167 @@ def create_resources(resources_count=5000):
     return [str(uuid.uuid4()) for _ in range(resources_count)]
 
 
-def record_samples(samples_count=50000, resources_count=5000,
-                   conf=None):
-    print('%s. %s. Start record samples' % (
-        datetime.datetime.utcnow(),
-        multiprocessing.current_process().name))
+def random_hex_ids(count):
+    """Return list of `count` random 32-chars hex ids (like uuid4().hex)"""
+    data = binascii.hexlify(os.urandom(16 * count)).decode('ascii')
+    return [data[i:i + 32] for i in range(0, 32 * count, 32)]
+
+
+def random_ints(count, high):
+    """Return list of `count` random ints from [0, high]"""
+    if numpy is not None:
+        return numpy.random.randint(0, high + 1, count).tolist()
+    return [int(random.random() * (high + 1)) for _ in range(count)]
+
+
+def resource_metadatas(resources_count):
+    """Return metadata template for each resource
+
+    Templates share nested values with `metadata`, only 'host' differs.
+    """
+    return [dict(metadata, host="host.%s" % i)
+            for i in range(resources_count)]
+
+
+def base_sample(conf):
+    """Return sample template with fields common for all samples of conf"""
+    sample = dict(sample_dict)
+    sample.update({'counter_name': conf.get('name') or 'cpu_util',
+                   'counter_unit': conf.get('unit') or '%',
+                   'project_id': conf.get('project'),
+                   'user_id': conf.get('user')})
+    return sample
+
+
+def bulk_insert(collection, ordered=True):
+    """Return function inserting list of documents to collection
+
+    Attribute check can't be used here: pymongo Collection returns
+    sub-collection for any unknown attribute, so version is checked.
+    """
+    import pymongo
+    if pymongo.version_tuple[0] >= 3:
+        return lambda docs: collection.insert_many(docs, ordered=ordered)
+    return collection.insert
+
+
+class BatchWriter(threading.Thread):
+    """Insert batches in background while next batch is generated"""
+
+    def __init__(self, collection):
+        super(BatchWriter, self).__init__()
+        self.daemon = True
+        self.queue = queue.Queue(maxsize=2)
+        self.error = None
+        self.insert = bulk_insert(collection, ordered=False)
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                break
+            if self.error is not None:
+                # Drain queue until sentinel, so producer is never blocked
+                continue
+            try:
+                self.insert(batch)
+            except Exception as e:
+                self.error = e
+
+    def put(self, batch):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    def close(self):
+        if self.is_alive():
+            self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+_db = None
+
+
+def init_worker(connection=None):
+    """Connect to mongo from ceilometer.conf or by `connection` url
+
+    Connection by url doesn't require ceilometer, so any local mongod may
+    be used.
+    """
+    global _db
+    if connection:
+        import pymongo
+        _db = pymongo.MongoClient(connection).get_default_database()
+        return
+    from ceilometer.storage import impl_mongodb
+    from oslo_config import cfg
     cfg.CONF(["--config-file", "/etc/ceilometer/ceilometer.conf"],
              project='ceilometer')
+    _db = impl_mongodb.Connection(cfg.CONF.database.connection).db
+
 
-    cl = impl_mongodb.Connection(cfg.CONF.database.connection)
-    db = cl.db
-    one_second = datetime.timedelta(seconds=1) * (conf.get('interval') or 1)
-    timestamp = datetime.datetime.utcnow() - one_second * (samples_count + 1)
-    sample = copy.deepcopy(sample_dict)
-    resource_ids = create_resources(resources_count)
-    resources_timestamps = {}
-    resource_metadatas = {}
-    batch = []
-    for i in range(samples_count):
-        m = copy.deepcopy(metadata)
-        sample['_id'] = uuid.uuid4().hex
-        sample['message_id'] = uuid.uuid4().hex
-        sample['timestamp'] = timestamp
-        sample['counter_name'] = conf.get('name') or 'cpu_util'
-        sample['counter_volume'] = random.randint(0, 1600)
-        sample['counter_unit'] = conf.get('unit') or '%'
-        sample['recorded_at'] = timestamp
-        sample['project_id'] = conf.get('project')
-        sample['user_id'] = conf.get('user')
-        timestamp += one_second
-        timestamp = timestamp.replace(microsecond=0)
-
-        resource_index = random.randint(0, resources_count - 1)
-        resource_id = resource_ids[resource_index]
-        sample['resource_id'] = resource_id
-        m['host'] = "host.%s" % resource_index
-        sample['resource_metadata'] = m
-        if resource_id not in resource_metadatas:
-            resource_metadatas[resource_id] = m
-        batch.append(copy.deepcopy(sample))
-        if len(batch) >= 5000:
-            db.meter.insert(batch)
+def record_samples(task):
+    """Write samples [start, start + count) of conf to meter collection
+
+    :param task: tuple (conf, start, count, resource_ids, batch_size)
+    :return: tuple (conf, {resource_index: [first_ts, last_ts]})
+    """
+    conf, start, count, resource_ids, batch_size = task
+    print('%s. %s. Start record %s samples' % (
+        datetime.datetime.utcnow(),
+        multiprocessing.current_process().name, count))
+    step = datetime.timedelta(seconds=conf['interval'])
+    first_timestamp = conf['start'] + step * start
+    sample = base_sample(conf)
+    metadatas = resource_metadatas(len(resource_ids))
+    timestamps = {}
+
+    writer = BatchWriter(_db.meter)
+    writer.start()
+    try:
+        for offset in range(0, count, batch_size):
+            size = min(batch_size, count - offset)
+            ids = random_hex_ids(2 * size)
+            volumes = random_ints(size, 1600)
+            indexes = random_ints(size, len(resource_ids) - 1)
+            timestamp = first_timestamp + step * offset
             batch = []
-        if not resources_timestamps.get(resource_id):
-            resources_timestamps[resource_id] = [timestamp, timestamp]
-        resources_timestamps[resource_id][1] = timestamp
+            for i in range(size):
+                index = indexes[i]
+                doc = dict(sample)
+                doc['_id'] = ids[2 * i]
+                doc['message_id'] = ids[2 * i + 1]
+                doc['timestamp'] = doc['recorded_at'] = timestamp
+                doc['counter_volume'] = volumes[i]
+                doc['resource_id'] = resource_ids[index]
+                doc['resource_metadata'] = metadatas[index]
+                batch.append(doc)
+                resource_timestamps = timestamps.get(index)
+                if resource_timestamps is None:
+                    timestamps[index] = [timestamp, timestamp]
+                else:
+                    resource_timestamps[1] = timestamp
+                timestamp += step
+            writer.put(batch)
+    finally:
+        writer.close()
+    return conf, timestamps
+
 
+def record_resources(db, conf, resource_ids, timestamps):
+    """Write resources which have samples"""
+    metadatas = resource_metadatas(len(resource_ids))
     resource_batch = []
-    for resource, timestamps in resources_timestamps.items():
-        resource_dict = {"_id": resource,
-                         "first_sample_timestamp": timestamps[0],
+    for index, (first, _) in timestamps.items():
+        resource_dict = {"_id": resource_ids[index],
+                         "first_sample_timestamp": first,
                          "last_sample_timestamp":
-                             timestamps[0] +
+                             first +
                              datetime.timedelta(
                                  seconds=random.randint(0, 1000)),
-                         "metadata": resource_metadatas[resource],
+                         "metadata": metadatas[index],
                          "user_id": conf.get('user'),
                          "project_id": conf.get('project'),
                          "source": "jira",
@@ -131,14 +244,18 @@ def record_samples(samples_count=50000, resources_count=5000,
                                     "counter_unit": conf.get('unit', '%'),
                                     "counter_type": 'gauge'}, ]}
         resource_batch.append(resource_dict)
-    if batch:
-        db.meter.insert(batch)
     if resource_batch:
-        db.resource.insert(resource_batch)
-    print("%s. %s. Writed %s samples and %s resources" % (
-        datetime.datetime.utcnow(),
-        multiprocessing.current_process().name,
-        samples_count, resources_count))
+        bulk_insert(db.resource)(resource_batch)
+
+
+def split_tasks(confs, samples_count, resources, workers, batch_size):
+    """Shard samples of each conf to chunks (several per worker)"""
+    chunk = max(batch_size,
+                int(math.ceil(samples_count * len(confs) / (workers * 4.0))))
+    for conf in confs:
+        for start in range(0, samples_count, chunk):
+            yield (conf, start, min(chunk, samples_count - start),
+                   resources[conf['key']], batch_size)
 
 
 def main():
@@ -160,17 +277,71 @@ def main():
     parser.add_argument("--meter",
                         type=str,
                         default="cpu_util")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--batch_size",
+                        type=int,
+                        default=5000)
+    parser.add_argument("--interval",
+                        type=int,
+                        default=30,
+                        help="Seconds between samples")
+    parser.add_argument("--connection",
+                        help="Mongo url (by default from ceilometer.conf)")
+    parser.add_argument("--ids_file",
+                        help="Write generated users/projects ids to file")
     args = parser.parse_args()
     users = [uuid.uuid4().hex for _ in range(args.users)]
     projects = [uuid.uuid4().hex for _ in range(args.projects)]
     meters = [args.meter]
-    interval = 30
+    interval = args.interval
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    start = now - datetime.timedelta(seconds=interval) * (args.samples + 1)
+    confs = []
+    resources = {}
     for user, project, meter in itertools.product(users, projects, meters):
-        conf = {"name": meter,
-                "user": user,
-                "project": project,
-                "interval": interval}
-        record_samples(args.samples, args.resources, conf)
+        key = (user, project, meter)
+        confs.append({"name": meter,
+                      "user": user,
+                      "project": project,
+                      "interval": interval,
+                      "start": start,
+                      "key": key})
+        resources[key] = create_resources(args.resources)
+
+    tasks = split_tasks(confs, args.samples, resources, args.workers,
+                        args.batch_size)
+    timestamps = {}
+    pool = multiprocessing.Pool(args.workers, initializer=init_worker,
+                                initargs=(args.connection,))
+    try:
+        for conf, chunk_timestamps in pool.imap_unordered(record_samples,
+                                                          tasks):
+            conf_timestamps = timestamps.setdefault(conf['key'], {})
+            for index, (first, last) in chunk_timestamps.items():
+                if index in conf_timestamps:
+                    old_first, old_last = conf_timestamps[index]
+                    first, last = min(first, old_first), max(last, old_last)
+                conf_timestamps[index] = [first, last]
+        pool.close()
+    except Exception:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    init_worker(args.connection)
+    for conf in confs:
+        record_resources(_db, conf, resources[conf['key']],
+                         timestamps.get(conf['key'], {}))
+    print("%s. Writed %s samples and %s resources" % (
+        datetime.datetime.utcnow(), args.samples * len(confs),
+        args.resources * len(confs)))
+    if args.ids_file:
+        with open(args.ids_file, 'w') as f:
+            json.dump({'users': users, 'projects': projects,
+                       'meters': meters}, f)
 
 if __name__ == '__main__':
     main()
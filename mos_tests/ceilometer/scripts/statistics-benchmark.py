@@ -0,0 +1,210 @@
+# Benchmark of ceilometer statistics queries against growing data volume.
+#
+# Samples are seeded with mongo-generator.py (incrementally, up to each
+# volume) for unique meter, then statistics are queried with each
+# period/groupby variation. Latency percentiles and result sizes are written
+# to CSV and JSON reports.
+#
+# Queries are made through ceilometer API (credentials from OS_* environment
+# variables) or directly with ceilometer storage driver, so benchmark can be
+# run against local mongod, e.g.:
+#   python statistics-benchmark.py --backend storage \
+#       --connection mongodb://localhost:27017/ceilometer \
+#       --volumes 1000000,10000000
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+GENERATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'mongo-generator.py')
+
+REPORT_FIELDS = ['volume', 'resources', 'period', 'groupby', 'repeats',
+                 'result_size', 'latency_min', 'latency_p50', 'latency_p90',
+                 'latency_max']
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[index]
+
+
+def seed(args, meter, count):
+    """Add `count` samples of meter with mongo-generator.py"""
+    cmd = [sys.executable, GENERATOR,
+           '--users', '1', '--projects', '1',
+           '--samples_per_user_project', str(count),
+           '--resources_per_user_project', str(args.resources),
+           '--meter', meter,
+           '--interval', str(args.interval)]
+    if args.connection:
+        cmd += ['--connection', args.connection]
+    subprocess.check_call(cmd)
+
+
+def api_statistics(args):
+    """Return function to query statistics through ceilometer API"""
+    from ceilometerclient import client
+
+    ceilometer = client.get_client(
+        '2',
+        os_username=os.environ['OS_USERNAME'],
+        os_password=os.environ['OS_PASSWORD'],
+        os_tenant_name=os.environ.get('OS_TENANT_NAME',
+                                      os.environ.get('OS_PROJECT_NAME')),
+        os_auth_url=os.environ['OS_AUTH_URL'])
+
+    def query(meter, period, groupby):
+        return ceilometer.statistics.list(meter, period=period or None,
+                                          groupby=groupby or None)
+
+    return query
+
+
+def mongo_url(args):
+    """Return mongo url from args or from ceilometer.conf"""
+    if args.connection:
+        return args.connection
+    from oslo_config import cfg
+    cfg.CONF(["--config-file", "/etc/ceilometer/ceilometer.conf"],
+             project='ceilometer')
+    return cfg.CONF.database.connection
+
+
+def remove_samples(args, meter):
+    """Remove seeded samples of meter from mongo"""
+    import pymongo
+
+    db = pymongo.MongoClient(mongo_url(args)).get_default_database()
+    if hasattr(db.meter, 'delete_many'):
+        db.meter.delete_many({'counter_name': meter})
+    else:
+        db.meter.remove({'counter_name': meter})
+
+
+def storage_statistics(args):
+    """Return function to query statistics with storage driver"""
+    from ceilometer import storage
+    from ceilometer.storage import impl_mongodb
+
+    conn = impl_mongodb.Connection(mongo_url(args))
+
+    def query(meter, period, groupby):
+        return list(conn.get_meter_statistics(
+            storage.SampleFilter(meter=meter), period=period or None,
+            groupby=groupby or None))
+
+    return query
+
+
+def measure(query, meter, period, groupby, repeats):
+    latencies = []
+    result_size = None
+    for _ in range(repeats):
+        start = time.time()
+        result = query(meter, period, groupby)
+        latencies.append(time.time() - start)
+        result_size = len(result)
+    return {'period': period,
+            'groupby': ','.join(groupby),
+            'repeats': repeats,
+            'result_size': result_size,
+            'latency_min': min(latencies),
+            'latency_p50': percentile(latencies, 50),
+            'latency_p90': percentile(latencies, 90),
+            'latency_max': max(latencies)}
+
+
+def write_report(rows, prefix):
+    with open(prefix + '.json', 'w') as f:
+        json.dump(rows, f, indent=2)
+    with open(prefix + '.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS,
+                                extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--volumes",
+                        type=str,
+                        default="1000000,10000000,50000000",
+                        help="Comma separated total samples counts")
+    parser.add_argument("--resources",
+                        type=int,
+                        default=1000,
+                        help="Resources for each seeding step")
+    parser.add_argument("--interval",
+                        type=int,
+                        default=30,
+                        help="Seconds between samples")
+    parser.add_argument("--periods",
+                        type=str,
+                        default="0,3600,86400",
+                        help="Comma separated periods (0 - without period)")
+    parser.add_argument("--groupby",
+                        type=str,
+                        default=";resource_id;project_id,user_id",
+                        help="Semicolon separated groupby variations")
+    parser.add_argument("--repeats",
+                        type=int,
+                        default=5)
+    parser.add_argument("--backend",
+                        choices=['api', 'storage'],
+                        default='api')
+    parser.add_argument("--connection",
+                        help="Mongo url (by default from ceilometer.conf)")
+    parser.add_argument("--meter",
+                        help="Meter name (new unique meter by default)")
+    parser.add_argument("--report",
+                        default="statistics-benchmark",
+                        help="Report files prefix")
+    parser.add_argument("--cleanup",
+                        action="store_true",
+                        help="Remove seeded samples at the end")
+    args = parser.parse_args()
+
+    volumes = sorted(int(x) for x in args.volumes.split(','))
+    periods = [int(x) for x in args.periods.split(',')]
+    groupbys = [[y for y in x.split(',') if y]
+                for x in args.groupby.split(';')]
+    meter = args.meter or 'benchmark.{0}'.format(uuid.uuid4().hex[:8])
+    if args.backend == 'api':
+        query = api_statistics(args)
+    else:
+        query = storage_statistics(args)
+
+    rows = []
+    seeded = 0
+    resources = 0
+    try:
+        for volume in volumes:
+            if volume > seeded:
+                seed(args, meter, volume - seeded)
+                seeded = volume
+                resources += args.resources
+            for period, groupby in itertools.product(periods, groupbys):
+                row = measure(query, meter, period, groupby, args.repeats)
+                row.update(volume=volume, resources=resources)
+                print(' '.join('{0}={1}'.format(x, row[x])
+                               for x in REPORT_FIELDS))
+                rows.append(row)
+            # Save after each volume, so results are kept if next is too
+            # slow
+            write_report(rows, args.report)
+    finally:
+        if args.cleanup:
+            remove_samples(args, meter)
+
+
+if __name__ == '__main__':
+    main()
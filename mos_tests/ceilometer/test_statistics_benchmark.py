@@ -0,0 +1,69 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import os
+
+import pytest
+
+from mos_tests.ceilometer.ceilometer_test import scripts_dir_path
+from mos_tests import settings
+
+logger = logging.getLogger(__name__)
+
+
+def test_statistics_benchmark(request, env):
+    """Measure ceilometer statistics latency for growing samples volume
+
+    Runs only with `--ceilometer-benchmark` option. Seeded samples are
+    removed at the end.
+
+    Actions:
+        1. Upload 'mongo-generator.py' and 'statistics-benchmark.py' to
+            controller
+        2. Seed samples up to each of CEILOMETER_BENCHMARK_VOLUMES and query
+            statistics through API with periods and groupby variations
+        3. Download CSV/JSON report to CEILOMETER_BENCHMARK_DIR (if set)
+        4. Remove seeded samples
+    """
+    if not request.config.getoption('--ceilometer-benchmark'):
+        pytest.skip('--ceilometer-benchmark option is not passed')
+    if not settings.CEILOMETER_BENCHMARK_VOLUMES:
+        pytest.skip('CEILOMETER_BENCHMARK_VOLUMES is not set')
+    scripts = ('mongo-generator.py', 'statistics-benchmark.py')
+    report = '/root/statistics-benchmark'
+    report_dir = settings.CEILOMETER_BENCHMARK_DIR
+    if report_dir and not os.path.exists(report_dir):
+        os.makedirs(report_dir)
+
+    with env.get_nodes_by_role('controller')[0].ssh() as remote:
+        # Seeding of tens of millions samples may take a while
+        remote.execution_timeout = 6 * 60 * 60
+        for script in scripts:
+            remote.upload(scripts_dir_path() + script,
+                          '/root/{0}'.format(script))
+        remote.check_call(
+            'source /root/openrc && python /root/statistics-benchmark.py '
+            '--backend api --volumes {volumes} --resources {resources} '
+            '--periods {periods} --report {report} --cleanup'.format(
+                volumes=settings.CEILOMETER_BENCHMARK_VOLUMES,
+                resources=settings.CEILOMETER_BENCHMARK_RESOURCES,
+                periods=settings.CEILOMETER_BENCHMARK_PERIODS,
+                report=report))
+        if not report_dir:
+            logger.info('Benchmark report is saved on controller to '
+                        '{0}.csv/.json'.format(report))
+            return
+        for ext in ('.csv', '.json'):
+            remote.download(report + ext, report_dir)
@@ -24,12 +24,16 @@ from six.moves import configparser
 
 from mos_tests.environment.devops_client import DevopsClient
 from mos_tests.environment.fuel_client import FuelClient
+from mos_tests.environment import revision
 from mos_tests.functions.common import gen_temp_file
 from mos_tests.functions.common import get_os_conn
 from mos_tests.functions.common import is_ceph_time_sync
 from mos_tests.functions.common import wait
 from mos_tests.functions import file_cache
 from mos_tests.functions import os_cli
+from mos_tests.functions.patch_journal import get_journal
+from mos_tests.functions import service
+from mos_tests.functions.soft_reset import SoftReset
 from mos_tests import settings
 
 
@@ -39,8 +43,11 @@ logger = logging.getLogger(__name__)
 # Define pytest plugins to use
 pytest_plugins = ("plugins.incremental",
                   "plugins.testrail_id",
+                  "plugins.testrail_report",
                   "plugins.fuel_snapshot",
                   "plugins.devops",
+                  "plugins.durations",
+                  "plugins.labs",
                   "plugins.verbose_log")
 
 
@@ -49,6 +56,16 @@ def pytest_addoption(parser):
                      help="Fuel master server ip address")
     parser.addoption("--cluster", '-C', action="append",
                      help="Fuel cluster name to test on it")
+    parser.addoption("--openstack-cli", action="store_true",
+                     help="Use `openstack` CLI on controller for "
+                          "`openstack_client` fixture instead of API calls")
+    parser.addoption("--ceilometer-benchmark", action="store_true",
+                     help="Run ceilometer statistics benchmark (seeds "
+                          "CEILOMETER_BENCHMARK_VOLUMES samples)")
+    parser.addoption("--soft-reset", action="store_true",
+                     help="Try to clean up env in place before reverting "
+                          "devops snapshot after destructive or failed "
+                          "tests marked with `soft_reset` marker")
 
 
 def pytest_configure(config):
@@ -62,6 +79,9 @@ def pytest_configure(config):
                             "testrail_id(id, params={'name': value,...}): "
                             "add suffix to test name. If defined, `params` "
                             "apply case_id only if it matches test params.")
+    config.addinivalue_line("markers",
+                            "openstack_cli: mark test which checks `openstack`"
+                            " CLI, so `openstack_client` uses CLI")
 
 
 def pytest_runtest_teardown(item, nextitem):
@@ -113,6 +133,37 @@ def setup_session(request, env_name, snapshot_name):
     revert_snapshot(env_name, snapshot_name)
 
 
+@pytest.fixture(scope="session", autouse=True)
+def patch_journal(request, setup_session, fuel_master_ip, env_name,
+                  snapshot_name):
+    """Restore configs left patched by previous (crashed) session"""
+    journal = get_journal(fuel_master_ip)
+    service.set_patch_journal(journal)
+    if journal is None:
+        return
+    if all([env_name, snapshot_name]):
+        # Snapshot revert has restored all configs
+        service.clear_patched_configs()
+    elif journal.entries():
+        # Failed records are logged and kept, they shouldn't fail session
+        try:
+            env = request.getfixturevalue('get_env')()
+            restored = journal.restore(env.get_ssh_to_node)
+        except Exception as e:
+            logger.warning("Can't restore patched configs: {0}".format(e))
+            return
+        logger.info('Restored configs: {0}'.format(restored))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def soft_reset(request, patch_journal):
+    """Record env baseline for in-place reset (with `--soft-reset`)"""
+    if not request.config.getoption("--soft-reset"):
+        return
+    env = request.getfixturevalue('get_env')()
+    setattr(request.session, 'soft_reset', SoftReset(env, env.os_conn))
+
+
 def reinit_fixtures(request):
     """Refresh some session fixtures (after revert, for example)"""
     logger.info('refresh clients fixtures')
@@ -162,10 +213,14 @@ def credentials(setup_session, fuel_master_ip):
 
 @pytest.fixture(scope='session')
 def get_fuel(fuel_master_ip):
-    """Returns callable to construct fuel client"""
+    """Returns callable to construct fuel client
+
+    Client is memoized until env revision is changed.
+    """
 
     def _get_client():
-        return get_fuel_client(fuel_master_ip)
+        return revision.memoize(('fuel', fuel_master_ip),
+                                lambda: get_fuel_client(fuel_master_ip))
 
     return _get_client
 
@@ -204,8 +259,12 @@ def restart_ceph(env):
 
 @pytest.fixture(scope='session')
 def get_env(request, get_fuel):
-    """Returns callable to construct Environment instance"""
-    def _get_env():
+    """Returns callable to construct Environment instance
+
+    Environment is memoized until env revision is changed, but its status is
+    checked on each call.
+    """
+    def _build_env():
         fuel = get_fuel()
         names = request.config.getoption('--cluster')
         if not names:
@@ -216,6 +275,10 @@ def get_env(request, get_fuel):
                 raise Exception(
                     "Can't find fuel cluster with name in {}".format(names))
             env = envs[0]
+        return env
+
+    def _get_env():
+        env = revision.memoize('env', _build_env)
         assert env.is_operational
         return env
 
@@ -547,8 +610,19 @@ def controller_remote(env):
 
 
 @pytest.fixture
-def openstack_client(controller_remote):
-    return os_cli.OpenStack(controller_remote)
+def openstack_client(request, os_conn):
+    """`OpenStack` CLI client or its keystone API implementation
+
+    CLI is used only if test marked with `openstack_cli` or `--openstack-cli`
+    option passed.
+    """
+    use_cli = (request.node.get_marker('openstack_cli') is not None or
+               request.config.getoption('--openstack-cli'))
+    remote = None
+    if use_cli:
+        remote = request.getfixturevalue('controller_remote')
+    return os_cli.get_openstack_client(remote=remote, os_conn=os_conn,
+                                       use_cli=use_cli)
 
 
 @pytest.yield_fixture
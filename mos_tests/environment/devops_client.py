@@ -17,6 +17,8 @@ import logging
 from devops.models import Environment
 from devops.models import Interface
 
+from mos_tests.environment.revision import bumps_revision
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,6 +31,7 @@ class EnvProxy(object):
     def __getattr__(self, name):
         return getattr(self._env, name)
 
+    @bumps_revision
     def add_node(self,
                  name,
                  memory=1024,
@@ -75,6 +78,7 @@ class EnvProxy(object):
 
         return node
 
+    @bumps_revision
     def del_node(self, node):
         """Add new slave node to cluster
 
@@ -133,6 +137,7 @@ class EnvProxy(object):
             result.update(dict.fromkeys(addresses, net.name))
         return result
 
+    @bumps_revision
     def revert_snapshot(self, snapshot_name):
         try:
             logger.info("Reverting snapshot {0}".format(snapshot_name))
@@ -12,11 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from collections import defaultdict
+from collections import OrderedDict
 import functools
 from itertools import groupby
 import logging
 import os
+import time
 
 import dpath.util
 from fuelclient import client
@@ -28,8 +29,10 @@ from fuelclient.objects import Plugins as FuelPlugins
 from fuelclient.objects import task as fuel_task
 from paramiko import RSAKey
 import requests
+from waiting import TimeoutExpired
 
 from mos_tests.environment.os_actions import OpenStackActions
+from mos_tests.environment.revision import bumps_revision
 from mos_tests.environment.ssh import SSHClient
 from mos_tests.functions.common import gen_temp_file
 from mos_tests.functions.common import wait
@@ -94,10 +97,10 @@ class Environment(environment.Environment):
 
     @property
     def os_conn(self):
-        controller_address = self.get_primary_controller_ip()
-        if self.ssl_enabled:
-            controller_address = self.ssl_hostname
         if self._os_conn is None:
+            controller_address = self.get_primary_controller_ip()
+            if self.ssl_enabled:
+                controller_address = self.ssl_hostname
             self._os_conn = OpenStackActions(
                 controller_ip=controller_address,
                 cert=self.certificate,
@@ -148,6 +151,18 @@ class Environment(environment.Environment):
         return [x for x in self.get_all_nodes()
                 if role in x.data['roles']]
 
+    @bumps_revision
+    def assign(self, *args, **kwargs):
+        return super(Environment, self).assign(*args, **kwargs)
+
+    @bumps_revision
+    def unassign(self, *args, **kwargs):
+        return super(Environment, self).unassign(*args, **kwargs)
+
+    @bumps_revision
+    def deploy_changes(self, *args, **kwargs):
+        return super(Environment, self).deploy_changes(*args, **kwargs)
+
     @staticmethod
     def get_plugins():
         """Returns list of plugins"""
@@ -179,47 +194,168 @@ class Environment(environment.Environment):
         self._testruns_ids = [tr['id'] for tr in testruns]
         return testruns
 
-    def is_last_test_result_ok(self):
+    def run_ostf(self, test_sets, tests=None):
+        """Start OSTF testruns for test sets (they are executed in parallel)
+
+        :param tests: dict with ids of tests to run by test sets (all tests
+            of sets are run, if None)
+        """
+        tests_data = []
+        for test_set in test_sets:
+            data = {
+                'testset': test_set,
+                'metadata': {
+                    'config': {},
+                    'cluster_id': self.id
+                }
+            }
+            if tests is not None:
+                if test_set not in tests:
+                    continue
+                data['tests'] = tests[test_set]
+            tests_data.append(data)
+        testruns = self.connection.post_request("testruns",
+                                                tests_data,
+                                                ostf=True)
+        self._testruns_ids = [tr['id'] for tr in testruns]
+        return testruns
+
+    def wait_ostf_results(self, timeout_seconds=10 * 60):
+        """Wait for last started testruns to finish and return them"""
         def tests_is_done():
             res = self.get_state_of_tests()
             if all([x['status'] == 'finished' for x in res]):
                 return res
 
-        results = wait(tests_is_done,
-                       timeout_seconds=10 * 60,
-                       waiting_for='OSTF tests to finish')
+        return wait(tests_is_done,
+                    timeout_seconds=timeout_seconds,
+                    waiting_for='OSTF tests to finish')
 
-        result_summary = defaultdict(list)
-        for result in results:
-            for test in result['tests']:
-                result_summary[test['status']].append(test)
+    @staticmethod
+    def get_ostf_failures(results):
+        """Return dict with ids of unsuccessful tests by test sets
 
-        if len(result_summary['success']) == 0:
+        :return: None if all tests are skipped or disabled
+        """
+        if not any(x['status'] == 'success'
+                   for result in results for x in result['tests']):
             logger.warning('All tests skipped or disabled at last run')
-            return False
-
-        unsuccess_statuses = set(result_summary.keys()) - set(
-            ['success', 'skipped', 'disabled'])
-        if len(unsuccess_statuses) > 0:
-            tests = (x for k, v in result_summary.items() for x in v
-                     if k in unsuccess_statuses)
-            for test in tests:
+            return None
+        failures = {}
+        for result in results:
+            failed = [x for x in result['tests']
+                      if x['status'] not in ('success', 'skipped',
+                                             'disabled')]
+            for test in failed:
                 logger.warning('Test "{name}" status is {status}; '
                                '{message}'.format(**test))
-            return False
+            if failed:
+                failures[result['testset']] = [x['id'] for x in failed]
+        return failures
 
-        return True
+    def is_last_test_result_ok(self):
+        failures = self.get_ostf_failures(self.wait_ostf_results())
+        return failures == {}
+
+    def get_readiness_problems(self):
+        """Return dict with cheap readiness problems by checks names
+
+        All checks are done in one poll: Fuel nodes are online, keystone,
+        nova and neutron APIs respond, nova services are up and neutron
+        agents are alive.
+        """
+        problems = {}
+        offline = [x.data['fqdn'] for x in self.get_all_nodes()
+                   if not x.data['online']]
+        if offline:
+            problems['nodes'] = offline
+        try:
+            os_conn = self.os_conn
+            # Clients are created without requests to keystone
+            os_conn.session.get_token()
+        except Exception as e:
+            problems['keystone'] = [str(e)]
+            return problems
+        try:
+            down = ['{0.binary}@{0.host}'.format(x)
+                    for x in os_conn.nova.services.list()
+                    if x.status == 'enabled' and x.state != 'up']
+        except Exception as e:
+            down = [str(e)]
+        if down:
+            problems['nova'] = down
+        try:
+            dead = ['{agent_type}@{host}'.format(**x)
+                    for x in os_conn.neutron.list_agents()['agents']
+                    if x['admin_state_up'] and not x['alive']]
+        except Exception as e:
+            dead = [str(e)]
+        if dead:
+            problems['neutron'] = dead
+        return problems
+
+    def wait_for_ostf_pass(self, test_groups=('ha',), timeout_seconds=20 * 60,
+                           readiness_timeout_seconds=None):
+        """Wait for env to be ready and to pass OSTF tests
+
+        Cheap readiness checks (see `get_readiness_problems`) are waited
+        first, then OSTF test sets are run in parallel. Only failed tests
+        are rerun on retries. Seconds until each check passed (OSTF ones are
+        counted from their start) are saved to `readiness_timings`.
+
+        Cheap checks can be stricter than OSTF (records of removed nodes,
+        services and agents stay down), so they are waited not longer than
+        `readiness_timeout_seconds` (quarter of `timeout_seconds` by
+        default) and OSTF decides after that.
+        """
+        if readiness_timeout_seconds is None:
+            readiness_timeout_seconds = timeout_seconds // 4
+        started = time.time()
+        timings = OrderedDict(
+            (x, 0) for x in ('nodes', 'keystone', 'nova', 'neutron', 'ostf'))
+        self.readiness_timings = timings
+        problems = [{}]
+
+        def is_ready():
+            problems[0] = self.get_readiness_problems()
+            for name in problems[0]:
+                timings[name] = time.time() - started
+            return not problems[0]
+
+        try:
+            wait(is_ready, timeout_seconds=readiness_timeout_seconds,
+                 sleep_seconds=10,
+                 expected_exceptions=Exception,
+                 waiting_for='OpenStack services to be ready')
+        except TimeoutExpired:
+            logger.warning('Readiness problems are left, rely on OSTF: '
+                           '{0}'.format(problems[0]))
 
-    def wait_for_ostf_pass(self, test_groups=('ha',), timeout_seconds=20 * 60):
         logger.info('[Re]start OSTF tests {}'.format(test_groups))
+        ostf_started = time.time()
+        failures = [None]
 
         def run_tests_and_wailt_result():
-            self.run_test_sets(test_groups)
-            return self.is_last_test_result_ok()
+            self.run_ostf(test_groups, tests=failures[0])
+            failures[0] = self.get_ostf_failures(self.wait_ostf_results())
+            if failures[0] == {}:
+                return True
+            if failures[0] is not None:
+                logger.info('Rerun failed OSTF tests {}'.format(failures[0]))
 
-        wait(run_tests_and_wailt_result, timeout_seconds=timeout_seconds,
-             sleep_seconds=20,
-             waiting_for='OpenStack to pass OSTF tests')
+        try:
+            wait(run_tests_and_wailt_result,
+                 timeout_seconds=timeout_seconds - (ostf_started - started),
+                 sleep_seconds=20,
+                 waiting_for='OpenStack to pass OSTF tests')
+        finally:
+            timings['ostf'] = time.time() - ostf_started
+            slowest = max(timings, key=timings.get)
+            logger.info('Env readiness took {0:.0f}s ({1}), dominated by '
+                        '{2}'.format(time.time() - started,
+                                     ', '.join('{0}: {1:.0f}s'.format(*x)
+                                               for x in timings.items()),
+                                     slowest))
 
     def wait_network_verification(self):
         data = self.verify_network()
@@ -298,6 +434,7 @@ class Environment(environment.Environment):
         non_primary_controllers.sort(key=lambda node: node.data['fqdn'])
         return non_primary_controllers
 
+    @bumps_revision
     def destroy_nodes(self, devops_nodes):
         node_ips = [node.get_ip_address_by_network_name('admin')
                     for node in devops_nodes]
@@ -325,6 +462,7 @@ class Environment(environment.Environment):
                 remote.check_call('/sbin/shutdown -Ph now')
         self.destroy_nodes(devops_nodes)
 
+    @bumps_revision
     def warm_start_nodes(self, devops_nodes):
         for node in devops_nodes:
             logger.info('Starting node {}'.format(node.name))
@@ -37,6 +37,7 @@ from keystoneauth1.identity import v3
 from keystoneauth1 import session as sessionV3
 from keystoneclient.v3 import Client as KeystoneClientV3
 
+from mos_tests.environment import revision
 from mos_tests.environment.ssh import NetNsProxy
 from mos_tests.environment.ssh import SSHClient
 from mos_tests.functions.common import gen_temp_file
@@ -58,6 +59,39 @@ class InstanceError(Exception):
                 '{2}'.format(self.instance, message, details))
 
 
+def get_session(auth_url, keystone_version, domain, user, password, tenant,
+                cert=None):
+    """Return keystone session shared by clients with the same credentials
+
+    Session (with its token, service catalog and HTTP connections pool) is
+    memoized until env revision is changed. Token is renewed by session
+    before expiration and on 401 responses.
+    """
+    def build():
+        path_to_cert = None
+        if cert is not None:
+            with gen_temp_file(prefix="fuel_cert_", suffix=".pem") as f:
+                f.write(cert)
+            path_to_cert = f.name
+        if keystone_version == 2:
+            auth = KeystonePassword(username=user,
+                                    password=password,
+                                    auth_url=auth_url,
+                                    tenant_name=tenant)
+            return session.Session(auth=auth, verify=path_to_cert)
+        auth = v3.Password(auth_url=auth_url,
+                           user_domain_name=domain,
+                           username=user,
+                           password=password,
+                           project_domain_name=domain,
+                           project_name=tenant)
+        return sessionV3.Session(auth=auth, verify=path_to_cert)
+
+    key = ('keystone_session', auth_url, keystone_version, domain, user,
+           password, tenant, cert)
+    return revision.memoize(key, build)
+
+
 class OpenStackActions(object):
     """OpenStack base services clients and helper actions"""
 
@@ -76,36 +110,22 @@ class OpenStackActions(object):
                 auth_url = 'http://{0}:5000/v2.0/'.format(self.controller_ip)
             else:
                 auth_url = 'http://{0}:5000/v3/'.format(self.controller_ip)
-            self.path_to_cert = None
             self.insecure = True
         else:
             if keystone_version == 2:
                 auth_url = 'https://{0}:5000/v2.0/'.format(self.controller_ip)
             else:
                 auth_url = 'https://{0}:5000/v3/'.format(self.controller_ip)
-            with gen_temp_file(prefix="fuel_cert_", suffix=".pem") as f:
-                f.write(cert)
-            self.path_to_cert = f.name
             self.insecure = False
 
         logger.debug('Auth URL is {0}'.format(auth_url))
+        self.session = get_session(auth_url, keystone_version, domain, user,
+                                   password, tenant, cert)
+        self.auth = self.session.auth
+        self.path_to_cert = None if cert is None else self.session.verify
         if keystone_version == 2:
-            self.auth = KeystonePassword(username=user,
-                                         password=password,
-                                         auth_url=auth_url,
-                                         tenant_name=tenant)
-            self.session = session.Session(auth=self.auth,
-                                           verify=self.path_to_cert)
             self.keystone = KeystoneClient(session=self.session)
         else:
-            self.auth = v3.Password(auth_url=auth_url,
-                                    user_domain_name=domain,
-                                    username=user,
-                                    password=password,
-                                    project_domain_name=domain,
-                                    project_name=tenant)
-            self.session = sessionV3.Session(auth=self.auth,
-                                             verify=self.path_to_cert)
             self.keystone = KeystoneClientV3(session=self.session)
 
         self.keystone.management_url = auth_url
@@ -122,23 +142,43 @@ class OpenStackActions(object):
 
         self.glance = GlanceClient(session=self.session)
 
-        # TODO(akuznetsova): Need to refactor initialization of heatclient
-
-        self.endpoint_url = self.session.get_endpoint(
-            service_type='orchestration',
-            endpoint_type='publicURL'
-        )
-        token = self.session.get_token()
-        self.heat = HeatClient(endpoint=self.endpoint_url, token=token)
+        self._heat = None
+        self._heat_endpoint = None
 
         self.env = env
 
+    def _get_heat_endpoint(self):
+        # TODO(akuznetsova): Need to refactor initialization of heatclient
+        if self._heat_endpoint is None:
+            self._heat_endpoint = self.session.get_endpoint(
+                service_type='orchestration',
+                endpoint_type='publicURL'
+            )
+        return self._heat_endpoint
+
+    @property
+    def heat(self):
+        """Heat client on shared session, so token is renewed on 401"""
+        if self._heat is None:
+            self._heat = HeatClient(session=self.session,
+                                    endpoint=self._get_heat_endpoint())
+        return self._heat
+
     def get_auth_token(self):
+        """Return new token for clients, which can't use session
+
+        Token is requested apart from shared session, so it isn't affected
+        by session token renewal.
+        """
         return self.auth.get_auth_ref(self.session).auth_token
 
     def reinit_heat_client(self):
-        token = self.get_auth_token()
-        self.heat = HeatClient(endpoint=self.endpoint_url, token=token)
+        """Rebuild Heat client
+
+        Token is renewed by shared session, so it's not required after 401
+        response anymore.
+        """
+        self._heat = None
 
     def _get_cirros_image(self):
         for image in self.glance.images.list():
@@ -1147,31 +1187,18 @@ class OpenStackActions(object):
              timeout_seconds=5 * 60,
              waiting_for="network reschedule to new dhcp agent")
 
-    def _get_controller(self):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        return self.env.get_nodes_by_role('controller')[0]
-
     def tenant_create(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).tenant_create(name=name)
+        return os_cli.OpenStackAPI(self.keystone).project_create(name=name)
 
     def tenant_delete(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).tenant_delete(name=name)
+        return os_cli.OpenStackAPI(self.keystone).project_delete(name=name)
 
     def user_create(self, name, password, tenant=None):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).user_create(name=name,
-                                                        password=password,
-                                                        tenant=tenant)
+        return os_cli.OpenStackAPI(self.keystone).user_create(
+            name=name, password=password, project=tenant)
 
     def user_delete(self, name):
-        # TODO(gdyuldin) remove this methods after moving to functions.os_cli
-        with self._get_controller().ssh() as remote:
-            return os_cli.OpenStack(remote).user_delete(name=name)
+        return os_cli.OpenStackAPI(self.keystone).user_delete(name=name)
 
     def server_hard_reboot(self, server):
         try:
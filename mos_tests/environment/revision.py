@@ -0,0 +1,73 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Environment revision
+
+Revision is bumped on events, which change environment (snapshot revert,
+deploy, nodes roles changes, nodes destroying). Expensive objects (Fuel
+client, `Environment`, nodes inventory) are memoized for current revision
+with `memoize` and are rebuilt after revision is bumped.
+"""
+
+import functools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_revision = 0
+_cache = {}
+
+
+def get_revision():
+    return _revision
+
+
+def bump(reason):
+    """Increment revision and drop memoized objects"""
+    global _revision
+    with _lock:
+        _revision += 1
+        _cache.clear()
+    logger.info('Env revision is {0} after {1}'.format(_revision, reason))
+
+
+def memoize(key, factory):
+    """Return object for key, built by factory for current revision
+
+    :param key: hashable object identity (like `('env', cluster_id)`)
+    :param factory: callable without arguments to build object
+    """
+    with _lock:
+        if key in _cache:
+            return _cache[key]
+        revision = _revision
+    value = factory()
+    with _lock:
+        # Object can be already outdated, if revision is bumped meanwhile
+        if revision == _revision:
+            _cache.setdefault(key, value)
+    return value
+
+
+def bumps_revision(f):
+    """Decorator for methods, which change environment"""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        finally:
+            bump(f.__name__)
+    return wrapper
@@ -0,0 +1,270 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Remote tcpdump captures
+
+Filtering (BPF expression) and truncating (snaplen) is done by tcpdump on the
+remote node, so only required data leaves the node. Three modes are
+available:
+
+* `capture_file` - write pcap file on remote and download it at the end;
+* `capture_stream` - collect packet summary lines over the SSH channel
+  while capture is running;
+* `capture_counters` - aggregate per-flow packets/bytes counters on remote,
+  pcap is not transferred at all.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import logging
+import threading
+
+import six
+from six.moves import shlex_quote
+
+from mos_tests.functions import common
+
+logger = logging.getLogger(__name__)
+
+# Enough for outer SLL/IP/UDP/VXLAN and inner Ethernet/IP/ICMP(ARP) headers
+VXLAN_SNAPLEN = 160
+SUMMARY_SNAPLEN = 128
+
+Flow = namedtuple('Flow', ['proto', 'src', 'dst'])
+FlowCounter = namedtuple('FlowCounter', ['packets', 'bytes'])
+
+# Process `tcpdump -e -tt` summary lines and print
+# `<packets> <bytes> <ethertype> [<src> <dst>]` for each flow at the end.
+COUNTERS_AWK = r'''
+$1 !~ /^[0-9]+\.[0-9]+$/ { next }
+{
+    proto = "other"; len = 0; src = ""; dst = ""
+    for (i = 2; i < NF; i++) {
+        if ($i == "ethertype") {
+            proto = $(i + 1)
+        } else if ($i == "length") {
+            len = $(i + 1) + 0
+            if ($(i + 3) == ">") {
+                src = $(i + 2); dst = $(i + 4); sub(/:$/, "", dst)
+            }
+            break
+        }
+    }
+    key = proto " " src " " dst
+    packets[key]++; bytes[key] += len
+}
+END { for (key in packets) print packets[key], bytes[key], key }
+'''
+
+
+def tcpdump_command(interface='any', bpf_filter='', snaplen=None,
+                    netns=None, args=''):
+    """Build tcpdump command line
+
+    :param interface: interface to capture on (None to not pass `-i`)
+    :param bpf_filter: BPF filter expression
+    :param snaplen: max bytes to capture from each packet
+    :param netns: network namespace to run tcpdump in
+    :param args: extra tcpdump arguments
+    :return: str
+    """
+    cmd = ['tcpdump']
+    if interface is not None:
+        cmd.append('-i {0}'.format(interface))
+    if snaplen is not None:
+        cmd.append('-s {0}'.format(snaplen))
+    if args:
+        cmd.append(args.strip())
+    if bpf_filter:
+        cmd.append(shlex_quote(bpf_filter))
+    cmd = ' '.join(cmd)
+    if netns is not None:
+        cmd = 'ip netns exec {0} {1}'.format(netns, cmd)
+    return cmd
+
+
+def parse_counters(lines):
+    """Parse `COUNTERS_AWK` output
+
+    :param lines: output lines
+    :return: dict with `Flow` keys and `FlowCounter` values
+    """
+    counters = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3 or not parts[0].isdigit():
+            continue
+        src, dst = (parts[3:5] + [None, None])[:2]
+        counters[Flow(parts[2], src, dst)] = FlowCounter(int(parts[0]),
+                                                         int(parts[1]))
+    return counters
+
+
+def parse_summary(line):
+    """Split `tcpdump -tt` summary line to timestamp and text
+
+    :return: tuple (float timestamp or None, str)
+    """
+    stamp, _, text = line.partition(' ')
+    try:
+        return float(stamp), text
+    except ValueError:
+        return None, line
+
+
+class RemoteTcpdump(object):
+    """tcpdump (with optional output filter) running over SSH channel
+
+    Command output lines are collected by background thread. First output
+    line should be the tcpdump PID, it is used to stop the capture.
+    """
+
+    def __init__(self, remote, command, callback=None):
+        self.remote = remote
+        self.command = command
+        self.callback = callback
+        self.pid = None
+        self.lines = []
+        self.errors = []
+        self._started = threading.Event()
+        self._thread = None
+        self._chan = None
+
+    @staticmethod
+    def _to_text(line):
+        if isinstance(line, six.binary_type):
+            line = line.decode('utf-8', 'replace')
+        return line.rstrip('\n')
+
+    def _read(self, stdout):
+        while True:
+            line = stdout.readline()
+            if not line:
+                break
+            line = self._to_text(line)
+            if self.pid is None:
+                self.pid = line.strip()
+                self._started.set()
+                continue
+            self.lines.append(line)
+            if self.callback is not None:
+                self.callback(line)
+        self._started.set()
+
+    def start(self, timeout=30):
+        logger.info('Start `{0}` on {1}'.format(self.command, self.remote))
+        self._chan, stdin, stdout, self._stderr = self.remote.execute_async(
+            self.command)
+        stdin.close()
+        self._thread = threading.Thread(target=self._read, args=(stdout,))
+        self._thread.daemon = True
+        self._thread.start()
+        self._started.wait(timeout)
+        if self.pid is None:
+            self.stop()
+            raise Exception("Can't start `{0}`: {1}".format(
+                self.command, ''.join(self.errors)))
+
+    def stop(self, timeout=30):
+        if self.pid is not None and not self._chan.closed:
+            self.remote.execute('kill -INT {0}'.format(self.pid),
+                                verbose=False)
+        self._thread.join(timeout)
+        # stdout is closed, so command is exited (exit status can arrive
+        # later) and stderr can be read without blocking
+        if not self._thread.is_alive():
+            self.errors = [self._to_text(x)
+                           for x in self._stderr.readlines()]
+        self._chan.close()
+        return self.lines
+
+
+@contextmanager
+def capture_file(remote, log_path, interface='any', bpf_filter='',
+                 snaplen=None, netns=None, args='',
+                 remote_path='/tmp/capture.pcap'):
+    """Write pcap on remote before enter and download it after
+
+    Pcap is downloaded to `log_path` only if block exits without errors.
+    """
+    cmd = tcpdump_command(interface=interface, bpf_filter=bpf_filter,
+                          snaplen=snaplen, netns=netns,
+                          args='-U {0} -w {1}'.format(args, remote_path))
+    logger.info('Start `{0}` on {1}'.format(cmd, remote))
+    pid = remote.background_call(cmd)
+    try:
+        yield log_path
+    except Exception:
+        raise
+    else:
+        remote.execute('kill -INT {0}'.format(pid), verbose=False)
+        common.wait(
+            lambda: not remote.execute('kill -0 {0}'.format(pid),
+                                       verbose=False).is_ok,
+            timeout_seconds=30,
+            waiting_for='tcpdump to stop')
+        remote.download(remote_path, log_path)
+    finally:
+        remote.execute('kill {0}; rm -f {1}'.format(pid, remote_path),
+                       verbose=False)
+
+
+@contextmanager
+def capture_stream(remote, interface='any', bpf_filter='',
+                   snaplen=SUMMARY_SNAPLEN, netns=None, args='',
+                   callback=None):
+    """Collect tcpdump summary lines while block is executing
+
+    Yields `RemoteTcpdump` object, it's `lines` attribute is populated as
+    packets arrive. Lines starts with epoch timestamp (see `parse_summary`).
+
+    :param callback: callable to be called with each line
+    """
+    cmd = tcpdump_command(interface=interface, bpf_filter=bpf_filter,
+                          snaplen=snaplen, netns=netns,
+                          args='-l -n -tt {0}'.format(args))
+    tcpdump = RemoteTcpdump(remote,
+                            'sh -c {0}'.format(shlex_quote(
+                                'echo $$; exec ' + cmd)),
+                            callback=callback)
+    tcpdump.start()
+    try:
+        yield tcpdump
+    finally:
+        tcpdump.stop()
+
+
+@contextmanager
+def capture_counters(remote, interface='any', bpf_filter='',
+                     snaplen=SUMMARY_SNAPLEN, netns=None, args=''):
+    """Count packets and bytes per flow while block is executing
+
+    Yields dict, which is populated with `Flow` keys and `FlowCounter`
+    values after block exits. Bytes are counted by frame length.
+    """
+    cmd = tcpdump_command(interface=interface, bpf_filter=bpf_filter,
+                          snaplen=snaplen, netns=netns,
+                          args='-l -n -e -tt {0}'.format(args))
+    # PID is passed with shell `read` (it doesn't read ahead from pipe, unlike
+    # awk), so it arrives before any packet is counted
+    cmd = 'sh -c {0} | {{ read pid; echo $pid; awk {1}; }}'.format(
+        shlex_quote('echo $$; exec ' + cmd), shlex_quote(COUNTERS_AWK))
+    tcpdump = RemoteTcpdump(remote, cmd)
+    counters = {}
+    tcpdump.start()
+    try:
+        yield counters
+    finally:
+        counters.update(parse_counters(tcpdump.stop()))
+        logger.debug('Captured flows: {0}'.format(counters))
@@ -12,9 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from contextlib import contextmanager
 import inspect
 import json
 import logging
+from multiprocessing.dummy import Pool
 import os
 import socket
 from tempfile import NamedTemporaryFile
@@ -27,6 +29,8 @@ from waiting import TimeoutExpired
 from waiting import wait as base_wait
 import yaml
 
+from mos_tests import settings
+
 
 logger = logging.getLogger(__name__)
 
@@ -699,6 +703,22 @@ def wait_no_exception(predicate, log=True, exceptions=Exception, **kwargs):
             raise e
 
 
+@contextmanager
+def bounded_pool(tasks_count, concurrency=None):
+    """Thread pool with no more than `concurrency` threads
+
+    `settings.POOL_CONCURRENCY` is used by default. Pool is closed and
+    joined on exit.
+    """
+    concurrency = concurrency or settings.POOL_CONCURRENCY
+    pool = Pool(max(1, min(tasks_count, concurrency)))
+    try:
+        yield pool
+    finally:
+        pool.close()
+        pool.join()
+
+
 def gen_random_resource_name(prefix=None, reduce_by=None):
     random_name = str(uuid.uuid4()).replace('-', '')[::reduce_by]
     if prefix:
@@ -13,7 +13,9 @@
 #    under the License.
 
 import logging
-from multiprocessing.dummy import Pool
+import re
+import threading
+import time
 import warnings
 
 import six
@@ -36,6 +38,24 @@ class MultipleAssertionErrors(AssertionError):
         return msg
 
 
+class RateLimiter(object):
+    """Thread-safe limiter of events count per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_time = 0
+
+    def wait(self):
+        """Block until next event is allowed"""
+        with self._lock:
+            now = time.time()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
 def run_on_vm(env,
               os_conn,
               vm,
@@ -58,26 +78,87 @@ def run_on_vm(env,
                              vm_ip=vm_ip)
 
 
-def _ping_ip_list(remote, ips, version):
-    results = []
-    for ip in ips:
-        if version == 6:
-            cmd = "ping6 -c1 {0}".format(ip)
+# fping prints `<ip> : <rtt>` (or `<ip> : -`) for each target.
+# If fping is absent - all targets are pinged with parallel background
+# `ping` processes, each prints `<ip> <exit_code> <rtt>` line
+PING_SCRIPT = (
+    'if command -v {fping} >/dev/null 2>&1; then '
+    '{fping} -C1 -q -t1000 {ips} 2>&1; '
+    'else for ip in {ips}; do '
+    '(out=$({ping} -c1 -W2 $ip 2>&1); rc=$?; '
+    'rtt=$(echo "$out" | sed -n "s/.*time=\\([0-9.]*\\).*/\\1/p"); '
+    'echo "$ip $rc ${{rtt:--}}") & '
+    'done; wait; fi')
+
+FPING_LINE = re.compile(r'^(?P<ip>\S+)\s+:\s+(?P<rtt>\S+)$')
+PING_LINE = re.compile(r'^(?P<ip>\S+) (?P<code>\d+) (?P<rtt>\S+)$')
+
+
+def _parse_ping_output(output, ips):
+    """Parse PING_SCRIPT output
+
+    :return: dict with ip as key and RTT in ms (or None if ip is
+        unreachable) as value
+    """
+    rtts = dict.fromkeys(ips)
+    for line in output.splitlines():
+        line = line.strip()
+        match = FPING_LINE.match(line)
+        if match is not None:
+            # fping prints `-` for lost packet
+            code = 1 if match.group('rtt') == '-' else 0
         else:
-            cmd = "ping -c1 {0}".format(ip)
-        result = remote.execute(cmd, verbose=False)
-        results.append(result)
-    return results
+            match = PING_LINE.match(line)
+            if match is None:
+                continue
+            code = int(match.group('code'))
+        ip, rtt = match.group('ip'), match.group('rtt')
+        if ip not in rtts or code != 0:
+            continue
+        try:
+            rtts[ip] = float(rtt)
+        except ValueError:
+            # Reply is received, but its time isn't parsed
+            rtts[ip] = 0.0
+    return rtts
+
+
+def _ping_ip_list(remote, ips, version):
+    """Ping all ips with single command
+
+    :return: tuple (dict with ip: RTT or None, CommandResult)
+    """
+    if version == 6:
+        fping, ping = 'fping6', 'ping6'
+    else:
+        fping, ping = 'fping', 'ping'
+    cmd = PING_SCRIPT.format(fping=fping, ping=ping, ips=' '.join(ips))
+    result = remote.execute(cmd, verbose=False)
+    return _parse_ping_output(result.stdout_string, ips), result
 
 
 def _wait_success_ping(remote, ip_list, timeout=None, version=4):
-    results = []
+    """Ping ip_list until all ips are reachable
+
+    Only unreachable ips are pinged on next attempts.
+
+    :return: tuple (dict with ip: RTT or None, last CommandResult)
+    """
+    rtts = dict.fromkeys(ip_list)
+    last_result = []
     timeout = timeout or 0
 
     def predicate():
-        loop_result = _ping_ip_list(remote, ip_list, version)
-        results.append(loop_result)
-        return all([x.is_ok for x in loop_result])
+        pending = [ip for ip in ip_list if rtts[ip] is None]
+        loop_rtts, result = _ping_ip_list(remote, pending, version)
+        last_result[:] = [result]
+        rtts.update(loop_rtts)
+        failed = [ip for ip, rtt in rtts.items() if rtt is None]
+        logger.debug('{host}: {ok}/{total} targets are reachable, '
+                     'unreachable: {failed}'.format(
+                         host=remote.host, ok=len(ip_list) - len(failed),
+                         total=len(ip_list), failed=failed))
+        return len(failed) == 0
 
     try:
         common.wait(predicate,
@@ -85,7 +166,7 @@ def _wait_success_ping(remote, ip_list, timeout=None, version=4):
                     waiting_for='pings to be successful')
     except TimeoutExpired as e:
         logger.error(e)
-    return results[-1]
+    return rtts, last_result[-1]
 
 
 def check_ping_from_vm(env,
@@ -97,7 +178,13 @@ def check_ping_from_vm(env,
                        vm_login='cirros',
                        vm_password='cubswin:)',
                        vm_ip=None,
-                       version=4):
+                       version=4,
+                       ssh_limiter=None):
+    """Check that all ips are reachable from vm
+
+    :param ssh_limiter: RateLimiter for SSH connections to vm
+    :return: dict with ip as key and RTT in ms as value
+    """
     logger.info('Expecting that ping from VM should pass')
     # Get ping results
 
@@ -106,36 +193,54 @@ def check_ping_from_vm(env,
     if isinstance(ip_to_ping, six.string_types):
         ip_to_ping = [ip_to_ping]
 
+    if ssh_limiter is not None:
+        ssh_limiter.wait()
     with os_conn.ssh_to_instance(env,
                                  vm,
                                  vm_keypair=vm_keypair,
                                  username=vm_login,
                                  password=vm_password) as remote:
-        result = _wait_success_ping(remote, ip_to_ping, timeout=timeout,
-                                    version=version)
+        rtts, result = _wait_success_ping(remote, ip_to_ping,
+                                          timeout=timeout, version=version)
 
-    error_msg = '\n'.join([repr(x) for x in result if not x.is_ok])
+    failed = sorted(ip for ip, rtt in rtts.items() if rtt is None)
+    error_msg = ('Connectivity error from {name}: {ips} are unreachable\n'
+                 '{result!r}').format(name=vm.name, ips=', '.join(failed),
+                                      result=result)
 
-    error_msg = ('Connectivity error from {name}:\n{msg}').format(
-        name=vm.name, msg=error_msg)
-
-    # As ping should pass we expect '0' in exit_code
-    assert all([x.is_ok for x in result]), error_msg
+    assert len(failed) == 0, error_msg
+    return rtts
 
 
 def check_vm_connectivity(env, os_conn, vm_keypair=None, timeout=4 * 60,
-                          version=4):
-    """Check that all vms can ping each other and public ip"""
+                          version=4, concurrency=None, ssh_rate=None):
+    """Check that all vms can ping each other and public ip
+
+    :param concurrency: max count of vms checked in parallel
+    :param ssh_rate: max count of new SSH connections per second
+    :return: connectivity matrix - dict with server name as key and
+        dict {ip: RTT in ms or None} as value
+    """
     ping_plan = {}
     exc = []
+    matrix = {}
+    if ssh_rate is None:
+        ssh_rate = settings.CONNECTIVITY_CHECK_SSH_RATE
+    ssh_limiter = RateLimiter(ssh_rate)
 
     def check(args):
         server, ips_to_ping = args
+        start = time.time()
         try:
-            check_ping_from_vm(env, os_conn, server, vm_keypair, ips_to_ping,
-                               timeout=timeout, version=version)
+            rtts = check_ping_from_vm(env, os_conn, server, vm_keypair,
+                                      ips_to_ping, timeout=timeout,
+                                      version=version,
+                                      ssh_limiter=ssh_limiter)
+            error = None
         except AssertionError as e:
-            return e
+            rtts = dict.fromkeys(ips_to_ping)
+            error = e
+        return server, rtts, error, time.time() - start
 
     servers = os_conn.get_servers()
     for server1 in servers:
@@ -149,9 +254,19 @@ def check_vm_connectivity(env, os_conn, vm_keypair=None, timeout=4 * 60,
             ips_to_ping += os_conn.get_nova_instance_ips(
                 server2, version).values()
         ping_plan[server1] = ips_to_ping
-    p = Pool(len(ping_plan))
-    for result in p.imap_unordered(check, ping_plan.items()):
-        if result is not None:
-            exc.append(result)
+    concurrency = concurrency or settings.CONNECTIVITY_CHECK_CONCURRENCY
+    with common.bounded_pool(len(ping_plan), concurrency) as pool:
+        results = pool.imap_unordered(check, ping_plan.items())
+        for server, rtts, error, duration in results:
+            matrix[server.name] = rtts
+            logger.debug('Connectivity from {name} checked in '
+                         '{time:.1f}s'.format(name=server.name,
+                                              time=duration))
+            if error is not None:
+                exc.append(AssertionError(
+                    '[{name}, {time:.0f}s] {error}'.format(
+                        name=server.name, time=duration, error=error)))
+    logger.debug('Connectivity matrix: {0}'.format(matrix))
     if len(exc) > 0:
         raise MultipleAssertionErrors(exc)
+    return matrix
@@ -13,11 +13,55 @@
 #    under the License.
 
 import json
+import select
+import shlex
+import socket
+import time
+import uuid
 
+from keystoneclient import exceptions as ks_exceptions
 import six
 from tempest.lib.cli import output_parser as parser
 from tempest.lib import exceptions
 
+from mos_tests.environment.ssh import CommandResult
+
+# Runs several `openstack` commands in one python process: interpreter is
+# started and keystone token is taken once. Results are separated with the
+# same markers as `CLISession` uses for shell commands.
+OPENSTACK_BATCH_SCRIPT = """
+import json
+import sys
+
+from openstackclient import shell
+
+options, commands = json.loads({data!r})
+app = shell.OpenStackShell()
+
+for i, (marker, argv) in enumerate(commands):
+    try:
+        if i == 0:
+            # Global options are parsed and client manager is built once
+            exit_code = app.run(options + argv)
+        else:
+            exit_code = app.run_subcommand(argv)
+    except SystemExit as e:
+        exit_code = e.code
+    except Exception as e:
+        sys.stderr.write('%s\\n' % e)
+        exit_code = 1
+    if not isinstance(exit_code, int):
+        exit_code = 1 if exit_code else 0
+    sys.stdout.write('\\n%s %s\\n' % (marker, exit_code))
+    sys.stdout.flush()
+    sys.stderr.write('\\n%s\\n' % marker)
+    sys.stderr.flush()
+"""
+
+
+class CLISessionError(Exception):
+    """CLI session was closed or doesn't respond"""
+
 
 class Result(six.text_type):
     def listing(self):
@@ -32,19 +76,272 @@ class Result(six.text_type):
         return self.__class__(super(Result, self).__add__(other))
 
 
-def os_execute(remote, command, fail_ok=False, merge_stderr=False):
-    command = '. openrc && {}'.format(command.encode('utf-8'))
-    result = remote.execute(command)
+class CLISession(object):
+    """Long-lived remote shell to run CLI commands
+
+    openrc is sourced only once on session start, so next commands don't
+    pay for new SSH channel and openrc sourcing. Every command runs in a
+    subshell with closed stdin, its stdout, stderr and exit code are
+    separated with unique markers.
+
+    Usage:
+        with os_cli.CLISession(remote) as session:
+            os_cli.OpenStack(session).project_list()
+    """
+
+    end_marker = '__CLI_SESSION_END_{0}__'
+
+    def __init__(self, remote, init_command='. openrc', timeout=None):
+        """Create (not opened yet) session
+
+        :param remote: connected SSHClient instance
+        :param init_command: command to execute once on session start
+        :param timeout: timeout in seconds for single command (or batch)
+        """
+        self.remote = remote
+        self.init_command = init_command
+        self.timeout = timeout or remote.execution_timeout
+        self._chan = None
+        self._stdout = b''
+        self._stderr = b''
+
+    def __repr__(self):
+        return '<CLISession {0!r}>'.format(self.remote)
+
+    @property
+    def is_opened(self):
+        return self._chan is not None and not self._chan.closed
+
+    def open(self):
+        transport = self.remote._ssh.get_transport()
+        self._chan = transport.open_session(timeout=self.remote.timeout)
+        self._chan.exec_command('bash --noprofile --norc')
+        self._stdout = self._stderr = b''
+        if self.init_command:
+            result = self._run([self.init_command], subshell=False)[0]
+            if not result.is_ok:
+                self.close()
+                raise exceptions.CommandFailed(
+                    result['exit_code'], self.init_command,
+                    result.stdout_string, result.stderr_string)
+        return self
+
+    def close(self):
+        if self._chan is not None:
+            self._chan.close()
+            self._chan = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _build_script(self, command, marker, subshell=True):
+        if subshell:
+            command = '( {0}\n) </dev/null'.format(command)
+        script = ("{command}\n"
+                  "printf '\\n%s %s\\n' {marker} $?\n"
+                  "printf '\\n%s\\n' {marker} >&2\n")
+        return script.format(command=command, marker=marker)
+
+    def _read_until(self, marker, deadline, abort_marker=None):
+        """Read output of command until its marker
+
+        :param abort_marker: marker of enclosing command, if it's found
+            before `marker`, then command has failed before reporting result
+        """
+        stdout_marker = six.b('\n{0} '.format(marker))
+        stderr_marker = six.b('\n{0}\n'.format(marker))
+        while True:
+            out_pos = self._stdout.find(stdout_marker)
+            err_pos = self._stderr.find(stderr_marker)
+            if out_pos >= 0 and err_pos >= 0:
+                exit_pos = out_pos + len(stdout_marker)
+                eol_pos = self._stdout.find(six.b('\n'), exit_pos)
+                if eol_pos >= 0:
+                    break
+            if (abort_marker is not None and
+                    six.b('\n{0} '.format(abort_marker)) in self._stdout):
+                raise CLISessionError(
+                    'Batch on {0!r} was aborted: {1}'.format(
+                        self.remote, self._stderr.decode('utf-8', 'replace')))
+            if self._chan.closed or self._chan.exit_status_ready():
+                has_data = (self._chan.recv_ready() or
+                            self._chan.recv_stderr_ready())
+                if not has_data:
+                    raise CLISessionError(
+                        'CLI session on {0!r} was closed '
+                        'unexpectedly'.format(self.remote))
+            if time.time() > deadline:
+                self.close()
+                raise CLISessionError(
+                    'Waiting for CLI session output is too long '
+                    '(more than {0} seconds)'.format(self.timeout))
+            try:
+                select.select([self._chan], [], [self._chan], 1)
+                if self._chan.recv_ready():
+                    self._stdout += self._chan.recv(65536)
+                if self._chan.recv_stderr_ready():
+                    self._stderr += self._chan.recv_stderr(65536)
+            except (socket.error, IOError) as e:
+                self.close()
+                raise CLISessionError(
+                    'Reading from CLI session on {0!r} failed: {1}'.format(
+                        self.remote, e))
+
+        stdout = self._stdout[:out_pos]
+        exit_code = int(self._stdout[exit_pos:eol_pos])
+        stderr = self._stderr[:err_pos]
+        self._stdout = self._stdout[eol_pos + 1:]
+        self._stderr = self._stderr[err_pos + len(stderr_marker):]
+        return stdout, stderr, exit_code
+
+    def _send(self, script):
+        """Send script to shell, raise CLISessionError if it has exited"""
+        if self._chan.exit_status_ready():
+            self.close()
+            raise CLISessionError(
+                'CLI session on {0!r} was closed unexpectedly'.format(
+                    self.remote))
+        try:
+            self._chan.sendall(script)
+        except (socket.error, IOError) as e:
+            self.close()
+            raise CLISessionError(
+                'Writing to CLI session on {0!r} failed: {1}'.format(
+                    self.remote, e))
+
+    def _run(self, commands, subshell=True):
+        markers = [self.end_marker.format(uuid.uuid4().hex) for _ in commands]
+        script = ''.join(self._build_script(cmd, marker, subshell=subshell)
+                         for cmd, marker in zip(commands, markers))
+        self._send(script)
+
+        deadline = time.time() + self.timeout
+        return [self._make_command_result(command,
+                                          *self._read_until(marker, deadline))
+                for command, marker in zip(commands, markers)]
+
+    @staticmethod
+    def _make_command_result(command, stdout, stderr, exit_code):
+        result = CommandResult({
+            'stdout': stdout.splitlines(True),
+            'stderr': stderr.splitlines(True),
+            'exit_code': exit_code
+        })
+        result.command = command
+        return result
+
+    def execute(self, command, verbose=False):
+        """Execute command and return CommandResult instance"""
+        return self.execute_many([command])[0]
+
+    def execute_many(self, commands):
+        """Send all commands at once and return list of CommandResult"""
+        if not self.is_opened:
+            self.open()
+        return self._run(commands)
+
+    def execute_openstack_many(self, argvs, options=()):
+        """Run `openstack` commands in single process
+
+        :param argvs: list of commands arguments lists (without global
+            options)
+        :param options: global options arguments list
+        :return: list of CommandResult
+        """
+        if not self.is_opened:
+            self.open()
+        markers = [self.end_marker.format(uuid.uuid4().hex) for _ in argvs]
+        data = json.dumps([list(options), list(zip(markers, argvs))])
+        batch_marker = self.end_marker.format(uuid.uuid4().hex)
+        command = "python - <<'{marker}'\n{script}\n{marker}".format(
+            marker=batch_marker,
+            script=OPENSTACK_BATCH_SCRIPT.format(data=str(data)))
+        self._send(self._build_script(command, batch_marker))
+
+        deadline = time.time() + self.timeout
+        results = []
+        for argv, marker in zip(argvs, markers):
+            output = self._read_until(marker, deadline,
+                                      abort_marker=batch_marker)
+            command = u' '.join(['openstack'] + list(options) + list(argv))
+            results.append(self._make_command_result(
+                command.encode('utf-8'), *output))
+        self._read_until(batch_marker, deadline)
+        return results
+
+
+def _make_result(result, fail_ok=False, merge_stderr=False):
     if not fail_ok and not result.is_ok:
         raise exceptions.CommandFailed(
-            result['exit_code'], command.decode('utf-8'), result.stdout_string,
-            result.stderr_string)
+            result['exit_code'], result.command.decode('utf-8'),
+            result.stdout_string, result.stderr_string)
     output = Result()
     if merge_stderr:
         output += result.stderr_string
     return output + result.stdout_string
 
 
+def os_execute(remote, command, fail_ok=False, merge_stderr=False):
+    """Execute command with sourced openrc
+
+    :param remote: SSHClient or CLISession instance
+    """
+    if isinstance(remote, CLISession):
+        command = command.encode('utf-8')
+    else:
+        command = '. openrc && {}'.format(command.encode('utf-8'))
+    result = remote.execute(command)
+    return _make_result(result, fail_ok=fail_ok, merge_stderr=merge_stderr)
+
+
+def _split_args(args):
+    if six.PY2:
+        args = args.encode('utf-8')
+    return [x.decode('utf-8') if isinstance(x, bytes) else x
+            for x in shlex.split(args)]
+
+
+def os_execute_openstack_many(remote, actions, flags='', fail_ok=False,
+                              merge_stderr=False):
+    """Execute several `openstack` actions in single process
+
+    If `remote` is SSHClient - temporary CLISession will be opened on it.
+
+    :param actions: list of actions with params (without `openstack`)
+    :param flags: global options of `openstack`
+    :return: list of Result (one for each action)
+    """
+    argvs = [_split_args(x) for x in actions]
+    options = _split_args(flags)
+    if isinstance(remote, CLISession):
+        results = remote.execute_openstack_many(argvs, options)
+    else:
+        with CLISession(remote) as session:
+            results = session.execute_openstack_many(argvs, options)
+    return [_make_result(x, fail_ok=fail_ok, merge_stderr=merge_stderr)
+            for x in results]
+
+
+def os_execute_many(remote, commands, fail_ok=False, merge_stderr=False):
+    """Execute several commands through single CLISession
+
+    If `remote` is SSHClient - temporary CLISession will be opened on it.
+
+    :return: list of Result (one for each command)
+    """
+    commands = [x.encode('utf-8') for x in commands]
+    if isinstance(remote, CLISession):
+        results = remote.execute_many(commands)
+    else:
+        with CLISession(remote) as session:
+            results = session.execute_many(commands)
+    return [_make_result(x, fail_ok=fail_ok, merge_stderr=merge_stderr)
+            for x in results]
+
+
 class CLICLient(object):
 
     command = ''
@@ -69,10 +366,52 @@ class CLICLient(object):
                           fail_ok=fail_ok,
                           merge_stderr=merge_stderr)
 
+    def batch(self,
+              actions,
+              flags='',
+              prefix='',
+              fail_ok=False,
+              merge_stderr=False):
+        """Execute several actions with single round trip to remote
+
+        :param actions: list of actions with params (like
+            ['project show foo -f json', 'user list -f json'])
+        :return: list of Result (one for each action)
+        """
+        commands = [self.build_command(action, flags, prefix=prefix)
+                    for action in actions]
+        return os_execute_many(self.remote,
+                               commands,
+                               fail_ok=fail_ok,
+                               merge_stderr=merge_stderr)
+
 
 class OpenStack(CLICLient):
     command = 'openstack'
 
+    def batch(self,
+              actions,
+              flags='',
+              prefix='',
+              fail_ok=False,
+              merge_stderr=False):
+        """Execute several actions in single `openstack` process
+
+        Unlike other CLI clients, python interpreter is started and keystone
+        token is taken once for whole batch. Actions with shell `prefix`
+        are run in separate processes.
+        """
+        if prefix:
+            return super(OpenStack, self).batch(actions, flags=flags,
+                                                prefix=prefix,
+                                                fail_ok=fail_ok,
+                                                merge_stderr=merge_stderr)
+        return os_execute_openstack_many(self.remote,
+                                         actions,
+                                         flags=flags,
+                                         fail_ok=fail_ok,
+                                         merge_stderr=merge_stderr)
+
     def details(self, output, mapping=('Field', 'Value')):
         """List with one dict with data"""
         data = json.loads(output)
@@ -165,6 +504,168 @@ class OpenStack(CLICLient):
         return self('user set', params=params)
 
 
+class OpenStackAPI(object):
+    """OpenStack client with `OpenStack` CLI interface over keystone API
+
+    It calls keystoneclient directly from test host instead of running
+    `openstack` CLI on controller, so it doesn't spend time on SSH round trip
+    and python interpreter start. Return values have same format as
+    `OpenStack` CLI client methods.
+    """
+
+    def __init__(self, keystone):
+        """Create client
+
+        :param keystone: initialized keystoneclient (v2.0 or v3) instance
+        """
+        self.keystone = keystone
+        self.is_v3 = keystone.version == 'v3'
+
+    @property
+    def projects(self):
+        if self.is_v3:
+            return self.keystone.projects
+        return self.keystone.tenants
+
+    @property
+    def current_user_id(self):
+        session = self.keystone.session
+        return session.auth.get_user_id(session)
+
+    @staticmethod
+    def _find(manager, name_or_id):
+        """Find resource by id or name (like CLI does)"""
+        try:
+            return manager.get(name_or_id)
+        except ks_exceptions.NotFound:
+            return manager.find(name=name_or_id)
+
+    @staticmethod
+    def _to_dict(resource):
+        data = resource.to_dict()
+        data.pop('links', None)
+        return data
+
+    def _user_to_dict(self, user):
+        data = self._to_dict(user)
+        project_id = data.pop('tenantId', data.get('default_project_id'))
+        if project_id is not None:
+            data['project_id'] = project_id
+        return data
+
+    def project_list(self, longout=False):
+        keys = ['ID', 'Name']
+        if longout:
+            keys += ['Description', 'Enabled']
+        return [{key: getattr(x, key.lower(), None) for key in keys}
+                for x in self.projects.list()]
+
+    def project_create(self, name):
+        if self.is_v3:
+            project = self.projects.create(name=name, domain='default')
+        else:
+            project = self.projects.create(tenant_name=name)
+        return self._to_dict(project)
+
+    def project_delete(self, name):
+        self.projects.delete(self._find(self.projects, name))
+
+    def project_show(self, name):
+        return self._to_dict(self._find(self.projects, name))
+
+    def user_list(self, longout=False):
+        keys = ['ID', 'Name']
+        if longout:
+            keys += ['Project', 'Email', 'Enabled']
+        result = []
+        for user in self.keystone.users.list():
+            data = self._user_to_dict(user)
+            data['project'] = data.get('project_id')
+            result.append({key: data.get(key.lower()) for key in keys})
+        return result
+
+    def user_show(self, name):
+        return self._user_to_dict(self._find(self.keystone.users, name))
+
+    def user_create(self, name, password, project=None):
+        if project is not None:
+            project = self._find(self.projects, project)
+        if self.is_v3:
+            user = self.keystone.users.create(name=name,
+                                              password=password,
+                                              default_project=project,
+                                              domain='default')
+        else:
+            user = self.keystone.users.create(name=name,
+                                              password=password,
+                                              tenant_id=getattr(project, 'id',
+                                                                None))
+        return self._user_to_dict(user)
+
+    def user_delete(self, name):
+        self.keystone.users.delete(self._find(self.keystone.users, name))
+
+    def role_create(self, name):
+        return self._to_dict(self.keystone.roles.create(name=name))
+
+    def role_delete(self, name):
+        self.keystone.roles.delete(self._find(self.keystone.roles, name))
+
+    def assign_role_to_user(self, role_name, user, project):
+        role = self._find(self.keystone.roles, role_name)
+        user = self._find(self.keystone.users, user)
+        project = self._find(self.projects, project)
+        if self.is_v3:
+            self.keystone.roles.grant(role, user=user, project=project)
+        else:
+            self.keystone.roles.add_user_role(user, role, tenant=project)
+        return self._to_dict(role)
+
+    def ec2_cred_list(self):
+        creds = self.keystone.ec2.list(self.current_user_id)
+        return [{'Access': x.access,
+                 'Secret': x.secret,
+                 'Project ID': getattr(x, 'tenant_id',
+                                       getattr(x, 'project_id', None)),
+                 'User ID': x.user_id} for x in creds]
+
+    def ec2_cred_create(self, user='admin', project='admin'):
+        user = self._find(self.keystone.users, user)
+        project = self._find(self.projects, project)
+        data = self._to_dict(self.keystone.ec2.create(user.id, project.id))
+        data.setdefault('project_id', data.pop('tenant_id', None))
+        return data
+
+    def ec2_cred_del(self, access_key):
+        self.keystone.ec2.delete(self.current_user_id, access_key)
+
+    def user_set_new_name(self, name, new_name):
+        user = self._find(self.keystone.users, name)
+        self.keystone.users.update(user, name=new_name)
+
+    def user_set_new_password(self, name, new_password):
+        user = self._find(self.keystone.users, name)
+        if self.is_v3:
+            self.keystone.users.update(user, password=new_password)
+        else:
+            self.keystone.users.update_password(user, new_password)
+
+
+def get_openstack_client(remote=None, os_conn=None, use_cli=False):
+    """Return `OpenStack` CLI client or its keystone API implementation
+
+    API implementation is used if `os_conn` is passed and CLI is not
+    requested explicitly.
+
+    :param remote: SSHClient or CLISession instance (for CLI)
+    :param os_conn: OpenStackActions instance (for API)
+    :param use_cli: force to use CLI
+    """
+    if os_conn is None or use_cli:
+        return OpenStack(remote)
+    return OpenStackAPI(os_conn.keystone)
+
+
 class Glance(CLICLient):
     command = 'glance'
 
@@ -0,0 +1,202 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persistent journal of configs patched by `service.patch_conf`
+
+Each patched config is recorded to own JSON file in journal directory
+(node host, config path, restart command, checksums and original content)
+before config is changed, and the record is removed after config is
+restored. So configs left patched by crashed session can be restored
+without snapshot revert::
+
+    $ python -m mos_tests.functions.patch_journal 10.109.0.2
+
+Optionally original config is mirrored on node (`<path>.mos-tests.orig`).
+"""
+
+from __future__ import print_function
+import argparse
+import base64
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+
+from mos_tests import settings
+
+logger = logging.getLogger(__name__)
+
+BACKUP_SUFFIX = '.mos-tests.orig'
+
+
+def checksum(content):
+    return hashlib.md5(content).hexdigest()
+
+
+class PatchJournal(object):
+    """Directory with records of not restored configs patches
+
+    :param mirror_on_node: save copy of original config on node too
+    """
+
+    def __init__(self, directory, mirror_on_node=False):
+        self.directory = directory
+        self.mirror_on_node = mirror_on_node
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, '{0}.json'.format(key))
+
+    def add(self, key, remote, path, original, patched, restart_cmd=None):
+        """Record config patch (should be called before config writing)
+
+        :param remote: opened SSH connection to node
+        """
+        entry = {
+            'key': key,
+            'host': remote.host,
+            'path': path,
+            'restart_cmd': restart_cmd,
+            'original_md5': checksum(original),
+            'patched_md5': checksum(patched),
+            'original': base64.b64encode(original).decode('ascii'),
+            'backup': None,
+            'created': time.time(),
+        }
+        if self.mirror_on_node:
+            entry['backup'] = path + BACKUP_SUFFIX
+            with remote.open(entry['backup'], 'wb') as f:
+                f.write(original)
+        # Entry should be complete even if process is killed while writing
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp_path, self._path(key))
+
+    def remove(self, key, remote=None):
+        """Remove record of restored config
+
+        :param remote: opened SSH connection to remove node mirror with
+        """
+        entry_path = self._path(key)
+        if not os.path.exists(entry_path):
+            return
+        if remote is not None:
+            with open(entry_path) as f:
+                backup = json.load(f)['backup']
+            if backup is not None:
+                remote.execute('rm -f {0}'.format(backup), verbose=False)
+        os.remove(entry_path)
+
+    def entries(self):
+        """Return outstanding records in order of patching"""
+        entries = []
+        for entry_path in glob.glob(os.path.join(self.directory, '*.json')):
+            with open(entry_path) as f:
+                entries.append(json.load(f))
+        return sorted(entries, key=lambda x: x['created'])
+
+    def clear(self):
+        """Forget all records (after snapshot revert, for example)"""
+        for entry in self.entries():
+            os.remove(self._path(entry['key']))
+
+    def _restore_entry(self, entry, get_remote):
+        """Restore config of record
+
+        :return: True if config is written, False otherwise
+        """
+        remote = get_remote(entry['host'])
+        with remote:
+            with remote.open(entry['path'], 'rb') as f:
+                current_md5 = checksum(f.read())
+            restored = False
+            if current_md5 == entry['patched_md5']:
+                logger.info('Restore {path} on {host}'.format(**entry))
+                with remote.open(entry['path'], 'wb') as f:
+                    f.write(base64.b64decode(entry['original']))
+                if entry['restart_cmd'] is not None:
+                    remote.check_call(entry['restart_cmd'], verbose=False)
+                restored = True
+            elif current_md5 != entry['original_md5']:
+                # Config is changed by someone else (redeployment, for
+                # example), so original content is outdated
+                logger.warning('{path} on {host} is changed after patching, '
+                               'it is not restored'.format(**entry))
+            self.remove(entry['key'], remote)
+        return restored
+
+    def restore(self, get_remote):
+        """Restore outstanding patches in reverse order
+
+        Configs, which are already restored (checksum is equal to original
+        one) or changed after patching (checksum is equal neither to
+        original nor to patched one), are not written and services are not
+        restarted, records of them are dropped. Records, which failed to be
+        restored (node is unavailable, for example), are kept.
+
+        :param get_remote: callable to get SSH connection (closed) by host
+        :return: list of tuples (host, path) of restored configs
+        """
+        restored = []
+        for entry in reversed(self.entries()):
+            try:
+                if self._restore_entry(entry, get_remote):
+                    restored.append((entry['host'], entry['path']))
+            except Exception as e:
+                logger.warning("Can't restore {path} on {host}: {0}".format(
+                    e, **entry))
+        return restored
+
+
+def get_journal(fuel_ip):
+    """Return journal for env with Fuel master `fuel_ip`
+
+    :return: `PatchJournal` or None, if journal is disabled in settings
+    """
+    if not settings.PATCH_JOURNAL_DIR:
+        return None
+    return PatchJournal(os.path.join(settings.PATCH_JOURNAL_DIR, fuel_ip),
+                        mirror_on_node=settings.PATCH_JOURNAL_ON_NODE)
+
+
+def main():
+    from mos_tests.environment.fuel_client import FuelClient
+    from mos_tests.environment.ssh import SSHClient
+
+    parser = argparse.ArgumentParser(
+        description='Restore configs left patched by crashed tests session')
+    parser.add_argument('fuel_ip', help='Fuel master server ip address')
+    args = parser.parse_args()
+
+    journal = get_journal(args.fuel_ip)
+    if journal is None:
+        parser.error('PATCH_JOURNAL_DIR is empty')
+    fuel = FuelClient(ip=args.fuel_ip,
+                      login=settings.KEYSTONE_USER,
+                      password=settings.KEYSTONE_PASS,
+                      ssh_login=settings.SSH_CREDENTIALS['login'],
+                      ssh_password=settings.SSH_CREDENTIALS['password'])
+    restored = journal.restore(
+        lambda host: SSHClient(host=host, username='root',
+                               private_keys=fuel.admin_keys))
+    for host, path in restored:
+        print('Restored {0} on {1}'.format(path, host))
+
+
+if __name__ == '__main__':
+    main()
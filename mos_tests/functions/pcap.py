@@ -0,0 +1,205 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Minimal pcap reader with Ethernet/SLL, VXLAN, IPv4, ARP and ICMP decoding
+
+It replaces `tshark` calls in tests: capture file is decoded with single pass
+to the list of compact `Packet` records, and all conditions are checked
+against these records.
+"""
+
+from collections import namedtuple
+import logging
+import mmap
+import os
+import socket
+import struct
+
+import six
+
+logger = logging.getLogger(__name__)
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+
+ETH_TYPE_IP = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_VLAN = (0x8100, 0x88a8)
+
+IP_PROTO_ICMP = 1
+IP_PROTO_UDP = 17
+
+VXLAN_PORT = 4789
+
+PCAP_MAGIC = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+
+# Packet fields are taken from innermost layers (inside VXLAN, if present)
+Packet = namedtuple('Packet', ['index', 'time', 'vni', 'eth_type', 'src',
+                               'dst', 'proto', 'arp_src', 'arp_dst'])
+
+
+class PcapError(Exception):
+    pass
+
+
+def _ip_to_str(data):
+    return socket.inet_ntoa(bytes(data))
+
+
+def _decode_ethernet(data, offset):
+    """Return ethertype and payload offset (skipping VLAN tags)"""
+    if len(data) < offset + 14:
+        return None, offset
+    eth_type, = struct.unpack_from('!H', data, offset + 12)
+    offset += 14
+    while eth_type in ETH_TYPE_VLAN and len(data) >= offset + 4:
+        eth_type, = struct.unpack_from('!H', data, offset + 2)
+        offset += 4
+    return eth_type, offset
+
+
+def _decode_l3(data, eth_type, offset, fields):
+    """Decode ARP/IPv4 (and VXLAN inside UDP) layers to fields dict"""
+    fields['eth_type'] = eth_type
+    if eth_type == ETH_TYPE_ARP and len(data) >= offset + 28:
+        fields['arp_src'] = _ip_to_str(data[offset + 14:offset + 18])
+        fields['arp_dst'] = _ip_to_str(data[offset + 24:offset + 28])
+        return
+    if eth_type != ETH_TYPE_IP or len(data) < offset + 20:
+        return
+    ihl = (bytearray(data[offset:offset + 1])[0] & 0x0f) * 4
+    proto = bytearray(data[offset + 9:offset + 10])[0]
+    fields['proto'] = proto
+    fields['src'] = _ip_to_str(data[offset + 12:offset + 16])
+    fields['dst'] = _ip_to_str(data[offset + 16:offset + 20])
+    offset += ihl
+    if proto != IP_PROTO_UDP or len(data) < offset + 16:
+        return
+    src_port, dst_port = struct.unpack_from('!HH', data, offset)
+    if VXLAN_PORT not in (src_port, dst_port):
+        return
+    offset += 8
+    vni, = struct.unpack_from('!I', data, offset + 4)
+    fields['vni'] = vni >> 8
+    inner_type, offset = _decode_ethernet(data, offset + 8)
+    if inner_type is not None:
+        fields.update(dict.fromkeys(['src', 'dst', 'proto']))
+        _decode_l3(data, inner_type, offset, fields)
+
+
+def decode_packet(data, linktype):
+    """Decode single frame and return dict with `Packet` fields"""
+    fields = dict.fromkeys(Packet._fields)
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return fields
+        eth_type, = struct.unpack_from('!H', data, 14)
+        offset = 16
+    elif linktype == LINKTYPE_ETHERNET:
+        eth_type, offset = _decode_ethernet(data, 0)
+        if eth_type is None:
+            return fields
+    else:
+        raise PcapError('Unsupported link type {0}'.format(linktype))
+    _decode_l3(data, eth_type, offset, fields)
+    return fields
+
+
+def iter_packets(path):
+    """Iterate over `Packet` records of pcap file
+
+    File is memory-mapped and read with single pass.
+    """
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(buf) < 24 or buf[:4] not in PCAP_MAGIC:
+                raise PcapError('{0} is not a pcap file'.format(path))
+            endian, ts_scale = PCAP_MAGIC[buf[:4]]
+            header = struct.Struct(endian + 'IIII')
+            linktype, = struct.unpack_from(endian + 'I', buf, 20)
+            offset = 24
+            index = 0
+            while offset + header.size <= len(buf):
+                ts_sec, ts_frac, incl_len, _ = header.unpack_from(buf, offset)
+                offset += header.size
+                data = buf[offset:offset + incl_len]
+                offset += incl_len
+                index += 1
+                if len(data) < incl_len:
+                    logger.warning('{0} is truncated at packet '
+                                   '{1}'.format(path, index))
+                    break
+                fields = decode_packet(data, linktype)
+                fields['index'] = index
+                fields['time'] = ts_sec + ts_frac * ts_scale
+                yield Packet(**fields)
+        finally:
+            buf.close()
+
+
+def read_packets(path):
+    """Return list of `Packet` records of pcap file"""
+    return list(iter_packets(path))
+
+
+def match(packets, **conditions):
+    """Evaluate several conditions with single pass over packets
+
+    :param packets: iterable with `Packet` records (or path to pcap file)
+    :param conditions: names with predicates (callable with `Packet` arg)
+    :return: dict with condition names as keys and lists of matched
+        packets as values
+    """
+    if isinstance(packets, six.string_types):
+        packets = iter_packets(packets)
+    result = {name: [] for name in conditions}
+    for packet in packets:
+        for name, predicate in conditions.items():
+            if predicate(packet):
+                result[name].append(packet)
+    return result
+
+
+def vni_is_not(vni):
+    """Packet is VXLAN encapsulated with VNI other than `vni`"""
+    return lambda p: p.vni is not None and p.vni != int(vni)
+
+
+def arp(src_ip, dst_ip):
+    """Packet is ARP from `src_ip` for `dst_ip`"""
+    return lambda p: p.arp_src == src_ip and p.arp_dst == dst_ip
+
+
+def icmp(src_ip, dst_ip):
+    """Packet is ICMP from `src_ip` to `dst_ip`"""
+    return lambda p: (p.proto == IP_PROTO_ICMP and p.src == src_ip and
+                      p.dst == dst_ip)
+
+
+def format_packets(packets, limit=20):
+    """Return human readable representation of packets list"""
+    lines = ['{0.index}: vni={0.vni} {0.src} -> {0.dst} proto={0.proto} '
+             'arp={0.arp_src} -> {0.arp_dst}'.format(x)
+             for x in packets[:limit]]
+    if len(packets) > limit:
+        lines.append('... and {0} more'.format(len(packets) - limit))
+    return '\n'.join(lines)
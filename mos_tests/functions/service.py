@@ -12,8 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
 from contextlib import contextmanager
 import logging
+import os
+import threading
 
 from contextlib2 import ExitStack
 from six import BytesIO
@@ -23,6 +26,71 @@ from mos_tests.functions import common
 
 logger = logging.getLogger(__name__)
 
+# Configs changed by `patch_conf`, which are not restored yet (changed from
+# `patch_nodes_conf` threads too, so it's guarded by lock)
+_patched_configs = OrderedDict()
+_patched_configs_lock = threading.Lock()
+# Persistent copy of `_patched_configs` (see `set_patch_journal`)
+_journal = None
+
+
+def set_patch_journal(journal):
+    """Record configs patches to `patch_journal.PatchJournal` (or None)"""
+    global _journal
+    _journal = journal
+
+
+def _journal_key(orig_cong):
+    return '{0}-{1}'.format(os.getpid(), id(orig_cong))
+
+
+def _patch(remote, path, new_values, restart_cmd=None):
+    """Patch config on opened remote
+
+    :return: original config content (None, if config is not changed)
+    """
+    changed = False
+    parser = configparser.RawConfigParser()
+    with remote.open(path, 'rb') as f:
+        orig_cong = BytesIO(f.read())
+    parser.readfp(orig_cong)
+
+    for section, key, val in new_values:
+        if section != 'DEFAULT' and not parser.has_section(section):
+            changed = True
+            parser.add_section(section)
+        if (parser.has_option(section, key) and
+                parser.get(section, key) == str(val)):
+            continue
+
+        changed = True
+        parser.set(section, key, val)
+
+    if not changed:
+        return None
+    patched = BytesIO()
+    parser.write(patched)
+    if _journal is not None:
+        _journal.add(_journal_key(orig_cong), remote, path,
+                     orig_cong.getvalue(), patched.getvalue(), restart_cmd)
+    with _patched_configs_lock:
+        _patched_configs[id(orig_cong)] = (remote, path, orig_cong,
+                                           restart_cmd)
+    with remote.open(path, 'wb') as f:
+        f.write(patched.getvalue())
+    return orig_cong
+
+
+def _restore(remote, path, orig_cong):
+    """Write original config content on opened remote"""
+    orig_cong.seek(0)
+    with remote.open(path, 'wb') as f:
+        f.write(orig_cong.read())
+    with _patched_configs_lock:
+        _patched_configs.pop(id(orig_cong), None)
+    if _journal is not None:
+        _journal.remove(_journal_key(orig_cong), remote)
+
 
 @contextmanager
 def patch_conf(remote, path, new_values, restart_cmd=None):
@@ -34,63 +102,157 @@ def patch_conf(remote, path, new_values, restart_cmd=None):
     :restart_cmd: command to run after change config
     :return: bool flag indicates this config was changed
     """
-    changed = False
+    orig_cong = None
     try:
         with remote:
-            parser = configparser.RawConfigParser()
-            with remote.open(path, 'rb') as f:
-                orig_cong = BytesIO(f.read())
-            parser.readfp(orig_cong)
-
-            for section, key, val in new_values:
-                if section != 'DEFAULT' and not parser.has_section(section):
-                    changed = True
-                    parser.add_section(section)
-                if (parser.has_option(section, key) and
-                        parser.get(section, key) == str(val)):
-                    continue
-
-                changed = True
-                parser.set(section, key, val)
-
-            if changed:
-                with remote.open(path, 'wb') as f:
-                    parser.write(f)
-
-                if restart_cmd is not None:
-                    remote.check_call(restart_cmd, verbose=False)
-        yield changed
+            orig_cong = _patch(remote, path, new_values, restart_cmd)
+            if orig_cong is not None and restart_cmd is not None:
+                remote.check_call(restart_cmd, verbose=False)
+        yield orig_cong is not None
     finally:
-        if changed:
+        if orig_cong is not None:
             with remote:
-                orig_cong.seek(0)
-                with remote.open(path, 'wb') as f:
-                    f.write(orig_cong.read())
+                _restore(remote, path, orig_cong)
                 if restart_cmd is not None:
                     remote.check_call(restart_cmd, verbose=False)
 
 
-def nova_patch(env, config, nodes=None):
+def restore_patched_configs():
+    """Restore configs changed by `patch_conf`, which are not restored yet
+
+    It happens, if restoring was failed (node was unavailable, for
+    example). Configs are restored in reverse order of patching.
+
+    :return: list of tuples (host, path) of restored configs
+    """
+    restored = []
+    with _patched_configs_lock:
+        patched = list(_patched_configs.values())
+    for remote, path, orig_cong, restart_cmd in reversed(patched):
+        logger.info('Restore {0} on {1}'.format(path, remote.host))
+        with remote:
+            _restore(remote, path, orig_cong)
+            if restart_cmd is not None:
+                remote.check_call(restart_cmd, verbose=False)
+        restored.append((remote.host, path))
+    return restored
+
+
+def clear_patched_configs():
+    """Forget not restored configs (after snapshot revert, for example)"""
+    with _patched_configs_lock:
+        _patched_configs.clear()
+    if _journal is not None:
+        _journal.clear()
+
+
+def split_waves(nodes, waves='all'):
+    """Split nodes to groups, where services are restarted at once
+
+    :param waves: 'all' - all nodes at once, 'rolling' - node by node,
+        'role' - nodes with the same roles at once
+    :return: list of nodes lists
+    """
+    if waves == 'all':
+        return [list(nodes)]
+    if waves == 'rolling':
+        return [[x] for x in nodes]
+    if waves == 'role':
+        groups = OrderedDict()
+        for node in nodes:
+            roles = tuple(sorted(node.data['roles']))
+            groups.setdefault(roles, []).append(node)
+        return list(groups.values())
+    raise ValueError('Unknown restart waves: {0}'.format(waves))
+
+
+def _run_concurrently(func, items):
+    with common.bounded_pool(len(items)) as pool:
+        return pool.map(func, items)
+
+
+@contextmanager
+def patch_nodes_conf(nodes, path, new_values, restart_cmd=None, waves='all',
+                     check=None):
+    """Patch ini-like config on nodes concurrently
+
+    One SSH connection for each node is used for patching (or restoring)
+    and restarting service. Service is restarted only on nodes, where
+    config was changed.
+
+    :param nodes: list of Fuel nodes
+    :param waves: how to restart services (see `split_waves`)
+    :param check: callable to check services health after restart of each
+        wave
+    :return: list of bool flags indicates configs were changed on nodes
+    """
+    remotes = {x.data['fqdn']: x.ssh() for x in nodes}
+    originals = {}
+    restored = set()
+
+    def restart(fqdns):
+        if restart_cmd is None or not fqdns:
+            return
+        for wave in split_waves(nodes, waves):
+            wave = [remotes[x.data['fqdn']] for x in wave
+                    if x.data['fqdn'] in fqdns]
+            if not wave:
+                continue
+            _run_concurrently(
+                lambda r: r.check_call(restart_cmd, verbose=False), wave)
+            # Next wave is restarted only when services are healthy again
+            if check is not None:
+                check()
+
+    def patch(node):
+        fqdn = node.data['fqdn']
+        logger.info('Patch {0} on {1}'.format(path, fqdn))
+        orig_cong = _patch(remotes[fqdn], path, new_values, restart_cmd)
+        if orig_cong is not None:
+            originals[fqdn] = orig_cong
+
+    def restore(node):
+        fqdn = node.data['fqdn']
+        if fqdn in originals:
+            logger.info('Restore {0} on {1}'.format(path, fqdn))
+            _restore(remotes[fqdn], path, originals[fqdn])
+            restored.add(fqdn)
+
+    try:
+        with ExitStack() as stack:
+            _run_concurrently(stack.enter_context, list(remotes.values()))
+            _run_concurrently(patch, nodes)
+            restart(originals)
+        yield [x.data['fqdn'] in originals for x in nodes]
+    finally:
+        if originals:
+            with ExitStack() as stack:
+                _run_concurrently(stack.enter_context,
+                                  [remotes[x] for x in originals])
+                try:
+                    _run_concurrently(restore, nodes)
+                finally:
+                    # Restored nodes should get original config even if
+                    # restoring is failed on other nodes
+                    restart(restored)
+
+
+def nova_patch(env, config, nodes=None, waves='all'):
+    """Patch nova config on nodes (controllers and computes by default)
+
+    :param waves: how to restart nova services (see `split_waves`)
+    """
     nova_config_path = '/etc/nova/nova.conf'
     restart_cmd = 'service nova-api restart || service nova-compute restart'
     nodes = nodes or (
         env.get_nodes_by_role('controller') + env.get_nodes_by_role('compute'))
 
-    with ExitStack() as stack:
-        for node in nodes:
-            remote = node.ssh()
-            logger.info('Patch nova config on {fqdn}'.format(**node.data))
-            stack.enter_context(patch_conf(remote,
-                                           path=nova_config_path,
-                                           new_values=config,
-                                           restart_cmd=restart_cmd))
+    def check():
         common.wait(env.os_conn.is_nova_ready,
                     timeout_seconds=60 * 5,
                     expected_exceptions=Exception,
                     waiting_for="Nova services to be alive")
-        yield
 
-    common.wait(env.os_conn.is_nova_ready,
-                timeout_seconds=60 * 5,
-                expected_exceptions=Exception,
-                waiting_for="Nova services to be alive")
+    with patch_nodes_conf(nodes, nova_config_path, new_values=config,
+                          restart_cmd=restart_cmd, waves=waves, check=check):
+        yield
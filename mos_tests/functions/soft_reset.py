@@ -0,0 +1,306 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-place environment reset as alternative to devops snapshot revert
+
+Baseline inventory of OpenStack resources and health (Fuel nodes, nova
+services, neutron agents, pacemaker resources) is recorded at session start.
+After test the current inventory is compared with baseline: resources
+created by test are deleted (concurrently for each resource type) and
+configs left patched by `service.patch_conf` are restored. Reset fails (and
+full revert is needed), if baseline resources are deleted or env is less
+healthy than on start.
+
+Reset is tried only after tests marked with `soft_reset` marker (tests which
+change env through OpenStack API only), other tests are always followed by
+full revert.
+
+Sub-resources of baseline resources (subnets and ports of networks, router
+gateways and interfaces, security group rules, flavor extra specs, projects
+quotas) are not deleted, they are compared with baseline after cleanup and
+any difference means that full revert is needed too.
+"""
+
+from collections import defaultdict
+from collections import namedtuple
+from collections import OrderedDict
+import logging
+
+from mos_tests.functions import common
+from mos_tests.functions import service
+from mos_tests.rabbitmq_oslo.utils import BashCommand
+from mos_tests.rabbitmq_oslo.utils.control import PacemakerStatus
+
+logger = logging.getLogger(__name__)
+
+Resource = namedtuple('Resource', ['list', 'delete'])
+State = namedtuple('State', ['resource', 'get'])
+
+
+def _ids(items, key='id'):
+    return {x[key] if isinstance(x, dict) else getattr(x, key)
+            for x in items}
+
+
+def _all_tenants(manager):
+    return manager.list(search_opts={'all_tenants': 1})
+
+
+def _delete_router(os_conn, router_id):
+    ports = os_conn.neutron.list_ports(
+        device_id=router_id,
+        device_owner='network:router_interface')['ports']
+    for port in ports:
+        os_conn.neutron.remove_interface_router(router_id,
+                                                {'port_id': port['id']})
+    os_conn.neutron.remove_gateway_router(router_id)
+    os_conn.neutron.delete_router(router_id)
+
+
+def _delete_network(os_conn, network_id):
+    for port in os_conn.neutron.list_ports(network_id=network_id)['ports']:
+        if port['device_owner'] != 'network:dhcp':
+            os_conn.neutron.delete_port(port['id'])
+    os_conn.neutron.delete_network(network_id)
+
+
+def _projects(os_conn):
+    keystone = os_conn.keystone
+    return getattr(keystone, 'projects', None) or keystone.tenants
+
+
+# Resources in order of deletion
+RESOURCES = OrderedDict([
+    ('stacks', Resource(
+        lambda c: _ids(c.heat.stacks.list()),
+        lambda c, x: c.heat.stacks.delete(x))),
+    ('servers', Resource(
+        lambda c: _ids(_all_tenants(c.nova.servers)),
+        lambda c, x: c.nova.servers.delete(x))),
+    ('floatingips', Resource(
+        lambda c: _ids(c.neutron.list_floatingips()['floatingips']),
+        lambda c, x: c.neutron.delete_floatingip(x))),
+    ('volume_snapshots', Resource(
+        lambda c: _ids(_all_tenants(c.cinder.volume_snapshots)),
+        lambda c, x: c.cinder.volume_snapshots.delete(x))),
+    ('volumes', Resource(
+        lambda c: _ids(_all_tenants(c.cinder.volumes)),
+        lambda c, x: c.cinder.volumes.delete(x))),
+    ('images', Resource(
+        lambda c: _ids(c.glance.images.list()),
+        lambda c, x: c.glance.images.delete(x))),
+    ('flavors', Resource(
+        lambda c: _ids(c.nova.flavors.list(is_public=None)),
+        lambda c, x: c.nova.flavors.delete(x))),
+    ('keypairs', Resource(
+        lambda c: _ids(c.nova.keypairs.list(), key='name'),
+        lambda c, x: c.nova.keypairs.delete(x))),
+    ('routers', Resource(
+        lambda c: _ids(c.neutron.list_routers()['routers']),
+        _delete_router)),
+    ('networks', Resource(
+        lambda c: _ids(c.neutron.list_networks()['networks']),
+        _delete_network)),
+    ('security_groups', Resource(
+        lambda c: _ids(c.neutron.list_security_groups()['security_groups']),
+        lambda c, x: c.neutron.delete_security_group(x))),
+    ('users', Resource(
+        lambda c: _ids(c.keystone.users.list()),
+        lambda c, x: c.keystone.users.delete(x))),
+    ('projects', Resource(
+        lambda c: _ids(_projects(c).list()),
+        lambda c, x: _projects(c).delete(x))),
+])
+
+
+def _network_subnets(os_conn, ids):
+    return {x['id']: set(x['subnets'])
+            for x in os_conn.neutron.list_networks()['networks']
+            if x['id'] in ids}
+
+
+def _network_ports(os_conn, ids):
+    ports = defaultdict(set)
+    for port in os_conn.neutron.list_ports()['ports']:
+        # DHCP ports are recreated by agents
+        if (port['network_id'] in ids and
+                port['device_owner'] != 'network:dhcp'):
+            ports[port['network_id']].add(port['id'])
+    return dict(ports)
+
+
+def _router_ports(os_conn, ids):
+    state = {}
+    for router in os_conn.neutron.list_routers()['routers']:
+        if router['id'] not in ids:
+            continue
+        gateway = router['external_gateway_info'] or {}
+        ports = os_conn.neutron.list_ports(
+            device_id=router['id'],
+            device_owner='network:router_interface')['ports']
+        subnets = {ip['subnet_id'] for port in ports
+                   for ip in port['fixed_ips']}
+        state[router['id']] = (gateway.get('network_id'), subnets)
+    return state
+
+
+def _security_group_rules(os_conn, ids):
+    groups = os_conn.neutron.list_security_groups()['security_groups']
+    return {x['id']: _ids(x['security_group_rules'])
+            for x in groups if x['id'] in ids}
+
+
+def _flavor_extra_specs(os_conn, ids):
+    return {x.id: x.get_keys()
+            for x in os_conn.nova.flavors.list(is_public=None)
+            if x.id in ids}
+
+
+def _quotas(os_conn, ids):
+    return {x: (os_conn.nova.quotas.get(x).to_dict(),
+                os_conn.neutron.show_quota(x)['quota'],
+                os_conn.cinder.quotas.get(x).to_dict())
+            for x in ids}
+
+
+# Sub-resources of baseline resources (by `RESOURCES` names), which should
+# not be changed
+STATES = OrderedDict([
+    ('network_subnets', State('networks', _network_subnets)),
+    ('network_ports', State('networks', _network_ports)),
+    ('router_ports', State('routers', _router_ports)),
+    ('security_group_rules', State('security_groups',
+                                   _security_group_rules)),
+    ('flavor_extra_specs', State('flavors', _flavor_extra_specs)),
+    ('quotas', State('projects', _quotas)),
+])
+
+
+def take_inventory(os_conn):
+    """Return dict with sets of resources ids by `RESOURCES` names"""
+    return {name: resource.list(os_conn)
+            for name, resource in RESOURCES.items()}
+
+
+def take_states(os_conn, inventory):
+    """Return dicts of sub-resources by ids of resources from inventory
+
+    :return: dict with dicts by `STATES` names
+    """
+    return {name: state.get(os_conn, inventory[state.resource])
+            for name, state in STATES.items()}
+
+
+def get_pacemaker_problems(env):
+    """Return set of pacemaker problems (see `PacemakerStatus.problems`)
+
+    Status is taken from first online controller.
+    """
+    command = BashCommand.pacemaker.full_status + ' xml'
+    for node in env.get_nodes_by_role('controller'):
+        if not node.data['online']:
+            continue
+        with node.ssh() as remote:
+            result = remote.execute(command, verbose=False)
+        if result.is_ok:
+            return PacemakerStatus(result.stdout_string).problems()
+    return {'status is unavailable'}
+
+
+def get_health(env):
+    """Return set of unhealthy parts of env
+
+    :return: set of strings like 'nodes:<fqdn>', 'nova:<binary>@<host>'
+        (see `Environment.get_readiness_problems`), 'pacemaker:<problem>'
+    """
+    health = {'{0}:{1}'.format(check, problem)
+              for check, problems in env.get_readiness_problems().items()
+              for problem in problems}
+    health.update('pacemaker:{0}'.format(x)
+                  for x in get_pacemaker_problems(env))
+    return health
+
+
+class SoftReset(object):
+    """Undo changes of env made after baseline was taken
+
+    :param timeout: seconds to wait for deletion of each resources type
+    """
+
+    def __init__(self, env, os_conn, timeout=5 * 60):
+        self.env = env
+        self.os_conn = os_conn
+        self.timeout = timeout
+        self.baseline = take_inventory(os_conn)
+        self.baseline_states = take_states(os_conn, self.baseline)
+        self.baseline_health = get_health(env)
+        logger.info('Soft reset baseline: {0}'.format(
+            {k: len(v) for k, v in self.baseline.items()}))
+
+    def _delete(self, name, ids):
+        resource = RESOURCES[name]
+        logger.info('Delete {0}: {1}'.format(name, ', '.join(sorted(ids))))
+
+        def delete(resource_id):
+            try:
+                resource.delete(self.os_conn, resource_id)
+            except Exception as e:
+                logger.warning("Can't delete {0} {1}: {2}".format(
+                    name, resource_id, e))
+
+        with common.bounded_pool(len(ids)) as pool:
+            pool.map(delete, ids)
+        common.wait(lambda: not (resource.list(self.os_conn) & ids),
+                    timeout_seconds=self.timeout,
+                    sleep_seconds=5,
+                    waiting_for='{0} to be deleted'.format(name))
+
+    def reset(self):
+        """Try to return env to baseline state
+
+        :return: True on success, False if full revert is needed
+        """
+        try:
+            restored = service.restore_patched_configs()
+            if restored:
+                logger.info('Restored configs: {0}'.format(restored))
+            damage = get_health(self.env) - self.baseline_health
+            if damage:
+                logger.info('Soft reset is impossible, env is damaged: '
+                            '{0}'.format(', '.join(sorted(damage))))
+                return False
+            current = take_inventory(self.os_conn)
+            for name in RESOURCES:
+                missing = self.baseline[name] - current[name]
+                if missing:
+                    logger.info('Soft reset is impossible, baseline {0} are '
+                                'deleted: {1}'.format(name, missing))
+                    return False
+            for name in RESOURCES:
+                created = current[name] - self.baseline[name]
+                if created:
+                    self._delete(name, created)
+            states = take_states(self.os_conn, self.baseline)
+            for name, baseline in self.baseline_states.items():
+                changed = {x for x in set(baseline) | set(states[name])
+                           if baseline.get(x) != states[name].get(x)}
+                if changed:
+                    logger.info('Soft reset is impossible, {0} of baseline '
+                                'resources are changed: {1}'.format(
+                                    name, ', '.join(sorted(changed))))
+                    return False
+        except Exception as e:
+            logger.warning('Soft reset failed: {0}'.format(e))
+            return False
+        return True
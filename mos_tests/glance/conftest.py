@@ -111,11 +111,6 @@ def image_file_remote(request, controller_remote, suffix):
     controller_remote.execute('rm -f {}'.format(filename))
 
 
-@pytest.fixture
-def openstack_client(controller_remote):
-    return os_cli.OpenStack(controller_remote)
-
-
 @pytest.fixture(params=['1', '2'], ids=['api v1', 'api v2'])
 def glance_remote(request, controller_remote):
     flags = '--os-image-api-version {0.param}'.format(request)
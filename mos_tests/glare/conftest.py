@@ -22,7 +22,7 @@ def glare_client(os_conn):
     type_version = '2.0'
     endpoint = os_conn.session.get_endpoint(service_type='artifact',
                                             interface="internalURL")
-    token = os_conn.session.get_auth_headers()['X-Auth-Token']
+    token = os_conn.get_auth_token()
     glanceclient = GlanceClient(endpoint=endpoint,
                                 type_name=type_name,
                                 type_version=type_version,
@@ -1332,7 +1332,7 @@ def test_plugin_interoperability_murano(os_conn, env, devops_env, admin_remote,
     # Murano is installed with Glare (Enable glance artifact repository)
     murano_endpoint = os_conn.session.get_endpoint(
         service_type='application-catalog', endpoint_type='publicURL')
-    token = os_conn.session.get_auth_headers()['X-Auth-Token']
+    token = os_conn.get_auth_token()
     glare_endpoint = os_conn.session.get_endpoint(
         service_type='artifact', endpoint_type='publicURL')
     glare = glare_client.Client(endpoint=glare_endpoint,
@@ -59,7 +59,6 @@ class MuranoActions(object):
                                        token=token,
                                        cacert=os_conn.path_to_cert)
 
-        os_conn.reinit_heat_client()
         self.heat = os_conn.heat
         self.postgres_passwd = self.rand_name("O5t@")
 
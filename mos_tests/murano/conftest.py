@@ -87,11 +87,6 @@ def murano_k8s_image_username():
     return settings.MURANO_KUBERNETES_IMAGE_USER
 
 
-@pytest.fixture
-def openstack_client(controller_remote):
-    return os_cli.OpenStack(controller_remote)
-
-
 @pytest.yield_fixture
 def environment(murano, package):
     environment = murano.murano.environments.create(
@@ -21,11 +21,13 @@ import signal
 import subprocess
 import threading
 
+from contextlib2 import ExitStack
 from neutronclient.common.exceptions import InternalServerError
 import pytest
 from six.moves.queue import Empty
 from six.moves.queue import Queue
 
+from mos_tests.functions import capture
 from mos_tests.functions.common import wait
 from mos_tests.functions import network_checks
 from mos_tests.neutron.python_tests.base import TestBase
@@ -628,38 +630,16 @@ class TestL3HA(TestBase):
             10. Check that tcpdump results and active l3 agents statuses
             11. Check that ping lost less than 50 packets
         """
-        def start_tcpdump_in_background(node, router_id, active_qg_iface_id):
-            """Start tcpdump on l3ha-router provided port.
+        def get_last_package_time(tcpdump):
+            """Get last ICMP echo reply time from tcpdump summary lines
 
-            :param node: node on which start tcpdump
-            :param router_id: router id on which start tcpdump
-            :param active_qg_iface_id: interface id on which start tcpdump
+            :param tcpdump: `RemoteTcpdump` object with captured lines
+            :return: last reply epoch time or None, if there is no replies
             """
-            logger.info('Start tcpdump on {0}'.format(node.data['fqdn']))
-            cmd_for_tcpdump = (
-                'ip netns exec qrouter-{router_id} '
-                'tcpdump -n -l -tttt -i {qg_port_id} icmp '
-                '<&- >/tmp/tcpdump.log 2>&1 &'.format(
-                    router_id=router_id, qg_port_id=active_qg_iface_id))
-
-            with node.ssh() as remote:
-                remote.check_call(cmd_for_tcpdump)
-
-        def get_last_package_datetime(node):
-            """Get last package time from tcpdump log on provided node
-
-            :param node: node on which we need to analyze log
-            :return: last time from log or None, if log is empty
-            """
-            with node.ssh() as remote:
-                res = remote.execute("grep 'ICMP echo reply' /tmp/tcpdump.log")
-                if res['exit_code'] != 0:
-                    return None
-                res = remote.execute(
-                    "grep 'ICMP echo reply' /tmp/tcpdump.log | "
-                    "tail -1 | cut -d ' ' -f 1,2")
-                last_checked = res['stdout'][0].strip()
-                return last_checked
+            times = [stamp for stamp, text in map(capture.parse_summary,
+                                                  tcpdump.lines)
+                     if 'ICMP echo reply' in text]
+            return times[-1] if times else None
 
         instance = self.os_conn.nova.servers.find(name="server02")
         instance_ip = (
@@ -677,35 +657,35 @@ class TestL3HA(TestBase):
         active_qg_iface_id = 'qg-{}'.format(
             active_l3_qg_port_for_router_id[:11])
 
-        # Start tcpdump on all controllers
-        for controller in controllers:
-            start_tcpdump_in_background(controller, router_id,
-                                        active_qg_iface_id)
-        # Ban l3 agent
-        with self.background_ping_from_host(
-                ip_to_ping=instance_ip) as ping_result:
-            with controllers[0].ssh() as remote:
-                logger.info("Ban active l3 agent")
-                remote.check_call(
-                    "pcs resource ban neutron-l3-agent {0}".format(
-                        active_hostname))
-                new_active_agent = self.wait_router_rescheduled(
-                    router_id=router['router']['id'],
-                    from_node=active_hostname)
-                new_active_hostname = new_active_agent['host']
-
-        # kill tcpdump on controllers
-        for controller in controllers:
-            logger.info('Killing tcpdump on {0}'.format(
-                controller.data['fqdn']))
-            with controller.ssh() as remote:
-                remote.execute('killall tcpdump')
+        with ExitStack() as stack:
+            # Start tcpdump on all controllers, only ICMP summary lines are
+            # streamed back over SSH
+            captures = {}
+            for controller in controllers:
+                remote = stack.enter_context(controller.ssh())
+                captures[controller.data['fqdn']] = stack.enter_context(
+                    capture.capture_stream(
+                        remote, interface=active_qg_iface_id,
+                        bpf_filter='icmp',
+                        netns='qrouter-{0}'.format(router_id)))
+            # Ban l3 agent
+            with self.background_ping_from_host(
+                    ip_to_ping=instance_ip) as ping_result:
+                with controllers[0].ssh() as remote:
+                    logger.info("Ban active l3 agent")
+                    remote.check_call(
+                        "pcs resource ban neutron-l3-agent {0}".format(
+                            active_hostname))
+                    new_active_agent = self.wait_router_rescheduled(
+                        router_id=router['router']['id'],
+                        from_node=active_hostname)
+                    new_active_hostname = new_active_agent['host']
 
         # check that l3 active agents matching with tcpdump results
-        last_active_node = self.env.find_node_by_fqdn(active_hostname)
-        new_active_node = self.env.find_node_by_fqdn(new_active_hostname)
-        last_tcpdump_results = get_last_package_datetime(last_active_node)
-        new_tcpdump_results = get_last_package_datetime(new_active_node)
+        last_tcpdump_results = get_last_package_time(
+            captures[active_hostname])
+        new_tcpdump_results = get_last_package_time(
+            captures[new_active_hostname])
         assert (last_tcpdump_results and new_tcpdump_results) is not None
         assert last_tcpdump_results < new_tcpdump_results
         assert (ping_result['sent'] - ping_result['received']) < 50
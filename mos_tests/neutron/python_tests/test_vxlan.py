@@ -13,16 +13,15 @@
 #    under the License.
 
 from contextlib import contextmanager
-from distutils.spawn import find_executable
 import logging
-import subprocess
-import threading
 
 from contextlib2 import ExitStack
 import pytest
 
+from mos_tests.functions import capture
 from mos_tests.functions import common
 from mos_tests.functions import network_checks
+from mos_tests.functions import pcap
 from mos_tests.neutron.python_tests.base import TestBase
 
 logger = logging.getLogger(__name__)
@@ -32,29 +31,15 @@ logger = logging.getLogger(__name__)
 def tcpdump(node, log_path, tcpdump_args):
     """Start tcpdump on vxlan port before enter and stop it after
 
-    Log will download to log_path argument
+    Only packet headers are captured (filter from `tcpdump_args` is applied
+    on the node). Log will download to log_path argument
     """
     with node.ssh() as remote:
-
-        def tcpdump(node):
-            logger.info('Start tcpdump on {0}'.format(node))
-            remote.background_call('tcpdump -U {0} -w /tmp/vxlan.log'.format(
-                tcpdump_args))
-
-        thread = threading.Thread(target=tcpdump, args=(node, ))
-        try:
-            # Start tcpdump
-            thread.start()
+        with capture.capture_file(remote, log_path, interface=None,
+                                  snaplen=capture.VXLAN_SNAPLEN,
+                                  args=tcpdump_args,
+                                  remote_path='/tmp/vxlan.log'):
             yield
-        except Exception:
-            raise
-        else:
-            # Download log
-            remote.download('/tmp/vxlan.log', log_path)
-        finally:
-            # Kill tcpdump
-            remote.execute('killall tcpdump')
-            thread.join(0)
 
 
 def tcpdump_vxlan(node, log_path):
@@ -62,56 +47,46 @@ def tcpdump_vxlan(node, log_path):
 
     Log will download to log_path argument
     """
-    return tcpdump(node, log_path, '-U -vvni any port 4789')
-
-
-def _run_tshark_on_vxlan(log_file, cond):
-    tshark = find_executable('tshark')
-    return subprocess.check_output([
-        tshark, '-d', 'udp.port==4789,vxlan', '-r', log_file, '-Y',
-        '{0}'.format(cond)
-    ])
+    return tcpdump(node, log_path, '-ni any udp port 4789')
 
 
 def check_all_traffic_has_vni(vni, log_file):
     __tracebackhide__ = True
-    output = _run_tshark_on_vxlan(log_file, 'vxlan.vni!={0}'.format(vni))
-    if output.strip():
+    packets = pcap.match(log_file, other_vni=pcap.vni_is_not(vni))
+    if packets['other_vni']:
         pytest.fail(("Log contains records with another VNI (not {vni})\n"
-                     "{output}").format(vni=vni, output=output))
+                     "{output}").format(
+                         vni=vni, output=pcap.format_packets(
+                             packets['other_vni'])))
 
 
 def get_arp_traffic(src_ip, dst_ip, log_file):
-    cond = ("arp.dst.proto_ipv4=={dst_ip} and "
-            "arp.src.proto_ipv4=={src_ip}".format(dst_ip=dst_ip,
-                                                  src_ip=src_ip))
-    return _run_tshark_on_vxlan(log_file, cond)
+    packets = pcap.match(log_file, arp=pcap.arp(src_ip, dst_ip))
+    return packets['arp']
 
 
 def check_no_arp_traffic(src_ip, dst_ip, log_file):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if output.strip():
+    packets = get_arp_traffic(src_ip, dst_ip, log_file)
+    if packets:
         pytest.fail(("Log contains ARP traffic from {src} to {dst}\n"
                      "{output}").format(src=src_ip,
                                         dst=dst_ip,
-                                        output=output))
+                                        output=pcap.format_packets(packets)))
 
 
 def check_arp_traffic(src_ip, dst_ip, log_file):
     __tracebackhide__ = True
-    output = get_arp_traffic(src_ip, dst_ip, log_file)
-    if not output.strip():
+    packets = get_arp_traffic(src_ip, dst_ip, log_file)
+    if not packets:
         pytest.fail("Log not contains ARP traffic from {src} to {dst}".format(
             src=src_ip, dst=dst_ip))
 
 
 def check_icmp_traffic(src_ip, dst_ip, log_file):
     __tracebackhide__ = True
-    cond = "icmp and ip.src=={src_ip} and ip.dst=={dst_ip}".format(
-        src_ip=src_ip, dst_ip=dst_ip)
-    output = _run_tshark_on_vxlan(log_file, cond)
-    if not output.strip():
+    packets = pcap.match(log_file, icmp=pcap.icmp(src_ip, dst_ip))
+    if not packets['icmp']:
         pytest.fail(
             "Log not contains ICMP traffic from {src_ip} to {dst_ip}".format(
                 src_ip=src_ip, dst_ip=dst_ip))
@@ -139,7 +114,6 @@ class TestVxlanBase(TestBase):
         return router
 
 
-@pytest.mark.requires_('tshark')
 class TestVxlan(TestVxlanBase):
     """Simple Vxlan tests"""
 
@@ -315,7 +289,6 @@ class TestVxlanL2pop(TestVxlanBase):
     @pytest.mark.testrail_id(
         '542637',
         params={'tcpdump_args': '-n src host {source_ip} -i any'})
-    @pytest.mark.requires_('tshark')
     @pytest.mark.check_env_('has_2_or_more_computes')
     @pytest.mark.parametrize(
         'tcpdump_args', [
@@ -509,7 +482,6 @@ class TestVxlanL2pop(TestVxlanBase):
                     [x in result.stdout_string for x in compute3.ip_list])
 
     @pytest.mark.testrail_id('542638')
-    @pytest.mark.requires_('tshark')
     @pytest.mark.check_env_('has_2_or_more_computes')
     def test_broadcast_traffic_propagation_single_net(self, router):
         """Check broadcast traffic between instances placed in a single
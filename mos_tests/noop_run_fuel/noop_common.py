@@ -12,14 +12,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import defaultdict
 import logging
 import os
 import random
 import re
+import time
 import yaml
 
+from fuelclient.client import APIClient
 from fuelclient.objects.task import Task as FuelTask
+from waiting import TimeoutExpired
 
+from mos_tests.environment import revision
 from mos_tests.functions import common
 
 
@@ -36,7 +41,7 @@ def run_noop_nodes_deploy(admin_remote, env, nodes):
     # ex: Deployment task with id 13 for the nodes 1 within the environment 1
     # has been started.
     task_id = int(re.findall(r'Deployment task with id (\d+) ', output)[0])
-    child_task = get_child_task(admin_remote, task_id)
+    child_task = get_child_task(env, task_id)
 
     # pending -> running
     check_env_state_during_task(env, task=child_task, nodes=nodes)
@@ -56,7 +61,7 @@ def run_noop_env_deploy(admin_remote, env, command='deploy'):
     output = admin_remote.check_call(cmd)['stdout'][0]
     # ex: Deployment task with id 23 for the environment 1 has been started.
     task_id = int(re.findall(r'Deployment task with id (\d+) ', output)[0])
-    child_task = get_child_task(admin_remote, task_id)
+    child_task = get_child_task(env, task_id)
     nodes = env.get_all_nodes()
 
     # pending -> running
@@ -78,7 +83,7 @@ def run_noop_graph_execute(admin_remote, env, nodes=None, g_type='default'):
         cmd += " -n {0}".format(node_ids)
     output = admin_remote.check_call(cmd)['stdout'][0]
     task_id = int(re.findall(r'Deployment task with id (\d+) ', output)[0])
-    child_task = get_child_task(admin_remote, task_id)
+    child_task = get_child_task(env, task_id)
     nodes = nodes or env.get_all_nodes()
 
     # pending -> running
@@ -89,19 +94,97 @@ def run_noop_graph_execute(admin_remote, env, nodes=None, g_type='default'):
     return child_task
 
 
-def get_child_task(admin_remote, parent_task_id, child_task_name='deployment'):
-    """This function finds ID of the child task"""
-    # ID of the child task should be max
-    cmd = "fuel2 task list | grep {0}".format(child_task_name)
-    cmd += " | awk '{print $2}'"  # split into 2 lines because of $1
-    output = admin_remote.check_call(cmd).stdout_string
-    child_task_id = max(map(int, output.split()))
-    if child_task_id > parent_task_id:
-        child_task = FuelTask(child_task_id)
-    else:
+def get_child_task(env, parent_task_id, child_task_name='deployment',
+                   timeout=60):
+    """This function finds the child task with Nailgun tasks API"""
+    def find():
+        tasks = APIClient.get_request('tasks/',
+                                      params={'cluster_id': env.id})
+        children = [x for x in tasks if x['name'] == child_task_name and
+                    x['id'] > parent_task_id]
+        # Use explicit relation if API provides it
+        related = [x for x in children
+                   if x.get('parent_id') == parent_task_id]
+        children = related or children
+        if children:
+            # The first task created after the parent one
+            return min(x['id'] for x in children)
+
+    try:
+        child_task_id = common.wait(
+            find, timeout_seconds=timeout, sleep_seconds=2,
+            waiting_for='child task for task {0}'.format(parent_task_id))
+    except TimeoutExpired:
         raise AssertionError("Unable to find child task for task id {0}"
                              .format(parent_task_id))
-    return child_task
+    return FuelTask(child_task_id)
+
+
+class TaskTracker(object):
+    """Watch task and nodes state of env with single poll
+
+    Each poll gets the task and env nodes with one API request for each,
+    and logs task progress with ETA.
+    """
+
+    def __init__(self, env, task, nodes=None):
+        self.env = env
+        self.task = task
+        self.node_ids = None
+        if nodes is not None:
+            self.node_ids = set(x.data['id'] for x in nodes)
+        self.started_at = time.time()
+        self.task_data = {}
+        self.nodes_statuses = {}
+
+    def poll(self):
+        self.task_data = APIClient.get_request(
+            'tasks/{0}/'.format(self.task.id))
+        self.nodes_statuses = get_nodes_statuses(self.env, self.node_ids)
+        logger.debug('Task {0} is {1}, progress {2}%, ETA {3}, nodes: '
+                     '{4}'.format(self.task.id, self.status, self.progress,
+                                  self.eta, self.nodes_statuses))
+        return self
+
+    @property
+    def status(self):
+        return self.task_data.get('status')
+
+    @property
+    def progress(self):
+        return self.task_data.get('progress') or 0
+
+    @property
+    def eta(self):
+        """Estimated seconds to finish (by progress) or None"""
+        if not 0 < self.progress < 100:
+            return None
+        elapsed = time.time() - self.started_at
+        return int(elapsed * (100 - self.progress) / self.progress)
+
+    def nodes_in_state(self, expected_state):
+        return all(x == expected_state for x in self.nodes_statuses.values())
+
+    def is_in_state(self, task_statuses=None, nodes_state=None):
+        """Poll and check task and nodes states
+
+        Raises exception if task is failed.
+        """
+        self.poll()
+        if self.status not in ('ready', 'running', 'pending'):
+            raise Exception('Task is {0}. {1}'.format(self.status,
+                                                      self.task_data))
+        if task_statuses is not None and self.status not in task_statuses:
+            return False
+        return nodes_state is None or self.nodes_in_state(nodes_state)
+
+    def wait(self, task_statuses=None, nodes_state=None, timeout=60,
+             sleep=2, waiting_for=None):
+        return common.wait(
+            lambda: self.is_in_state(task_statuses, nodes_state),
+            timeout_seconds=timeout, sleep_seconds=sleep,
+            waiting_for=waiting_for or 'task {0} to be {1}'.format(
+                self.task.id, task_statuses))
 
 
 def create_and_upload_custom_graph(admin_remote, env, modify=None):
@@ -152,20 +235,27 @@ def create_and_upload_custom_graph(admin_remote, env, modify=None):
     admin_remote.execute(cmd)
 
 
+def get_nodes_statuses(env, node_ids=None):
+    """Return dict with env nodes ids and statuses (with one API request)"""
+    nodes = APIClient.get_request('nodes/', params={'cluster_id': env.id})
+    return {x['id']: x['status'] for x in nodes
+            if node_ids is None or x['id'] in node_ids}
+
+
 def are_nodes_in_state(env, nodes, expected_state):
-    return all(x.data['status'] == expected_state
-               for x in env.get_all_nodes() if x in nodes)
+    node_ids = set(x.data['id'] for x in nodes)
+    return all(x == expected_state
+               for x in get_nodes_statuses(env, node_ids).values())
 
 
 def check_env_state_during_task(env, task, nodes=None):
     """This function checks state of env and nodes after task starting"""
-    common.wait(lambda: task.status == 'running', timeout_seconds=60,
-                sleep_seconds=2, waiting_for='deployment task to be started')
+    tracker = TaskTracker(env, task, nodes=nodes)
+    tracker.wait(('running',), waiting_for='deployment task to be started')
 
     if nodes is not None:
-        common.wait(lambda: are_nodes_in_state(env, nodes, 'deploying'),
-                    timeout_seconds=60, sleep_seconds=2,
-                    waiting_for='nodes in deploying state')
+        tracker.wait(nodes_state='deploying',
+                     waiting_for='nodes in deploying state')
 
     assert env.status == 'operational', (
         "Env should be operational when noop run of fuel task is in progress, "
@@ -174,18 +264,85 @@ def check_env_state_during_task(env, task, nodes=None):
 
 def check_env_state_after_task(env, task, nodes):
     """This function checks state of env after task finishing"""
-    common.wait(lambda: common.is_task_ready(task), timeout_seconds=60 * 120,
-                sleep_seconds=30, waiting_for='deployment task to be finished')
-
-    common.wait(lambda: are_nodes_in_state(env, nodes, 'ready'),
-                timeout_seconds=60, sleep_seconds=2,
-                waiting_for='nodes in ready state')
+    tracker = TaskTracker(env, task, nodes=nodes)
+    # Task and nodes states are checked together, so finish is detected
+    # with the first poll after it
+    tracker.wait(('ready',), nodes_state='ready', timeout=60 * 120, sleep=5,
+                 waiting_for='deployment task to be finished and nodes '
+                             'in ready state')
 
     assert env.status == 'operational', (
         "Env should be operational after noop run of fuel task execution, "
         "but current state is {0}".format(env.status))
 
 
+def normalize_text(text):
+    """Collapse whitespaces to compare messages"""
+    return ' '.join(text.split())
+
+
+class SummaryResults(object):
+    """Per node index of noop run task summary results
+
+    Results are fetched once per task (until env revision is changed), then
+    any number of messages can be checked against the index.
+    """
+
+    def __init__(self, lines):
+        self.by_node = defaultdict(list)
+        node_column = None
+        for line in lines:
+            cells = [x.strip() for x in line.split('|')]
+            if node_column is None and 'node_id' in cells:
+                # table header
+                node_column = cells.index('node_id')
+                continue
+            if node_column is not None:
+                keys = set(cells[node_column:node_column + 1])
+            else:
+                keys = set(cells)
+            text = normalize_text(line)
+            for key in keys - {''}:
+                self.by_node[key].append(text)
+
+    @classmethod
+    def fetch(cls, admin_remote, task_id):
+        """Return SummaryResults of the task, memoized for env revision"""
+        key = ('noop_summary', admin_remote.host, task_id)
+        return revision.memoize(key,
+                                lambda: cls._download(admin_remote, task_id))
+
+    @classmethod
+    def _download(cls, admin_remote, task_id):
+        tmp_file = "/tmp/noop_results-{0}.txt".format(
+            random.randint(1, 10000))
+        cmd = "fuel deployment-tasks --tid {0} --include-summary > {1}".format(
+            task_id, tmp_file)
+        admin_remote.check_call(cmd)
+        # NOTE: Results are written in tmp file because of big size
+        #      (~ 4 Mbytes for every node).
+        admin_remote.download(tmp_file, tmp_file)
+        admin_remote.check_call("rm {0}".format(tmp_file))
+        try:
+            with open(tmp_file, 'r') as f:
+                results = cls(f)
+        finally:
+            os.remove(tmp_file)
+        return results
+
+    def find(self, node_id, message):
+        """Return node lines which contain message"""
+        message = normalize_text(message)
+        return [x for x in self.by_node.get(str(node_id), [])
+                if message in x]
+
+    def search(self, node_id, pattern):
+        """Return node lines which match regexp pattern"""
+        pattern = re.compile(pattern)
+        return [x for x in self.by_node.get(str(node_id), [])
+                if pattern.search(x)]
+
+
 def are_messages_in_summary_results(admin_remote, task_id, messages,
                                     is_expected=True):
     """This function checks that expected messages for correct nodes are
@@ -197,46 +354,23 @@ def are_messages_in_summary_results(admin_remote, task_id, messages,
     :param is_expected: True or False
     :return:
     """
-
-    tmp_file = "/tmp/noop_results-{0}.txt".format(random.randint(1, 10000))
-    cmd = "fuel deployment-tasks --tid {0} --include-summary > {1}".format(
-        task_id, tmp_file)
-    admin_remote.check_call(cmd)
-    # NOTE: Results are written in tmp file because of big size
-    #      (~ 4 Mbytes for every node). This solution is not optimal but
-    #      anyway this function will be rewritten using API.
-
-    admin_remote.download(tmp_file, tmp_file)
-    admin_remote.check_call("rm {0}".format(tmp_file))
+    results = SummaryResults.fetch(admin_remote, task_id)
 
     logger.debug("Checking messages in results of noop run")
-    found = dict.fromkeys(messages, False)
-    with open(tmp_file, 'r') as f:
-        for line in f:
-            for node_id, message in messages:
-                if not re.search("\| +{0} +\|".format(node_id), line):
-                    # another node
-                    continue
-                if message in line:
-                    found[(node_id, message)] = True
-                    log_msg = ("Message for node {0} is found:\n{1}".
-                               format(node_id, line.strip()))
-                    if is_expected:
-                        logger.info(log_msg)
-                    else:
-                        logger.error(log_msg)
-            if all(found.values()):
-                break
-    for elem in messages:
-        if not found[elem]:
+    found = {}
+    for node_id, message in messages:
+        lines = results.find(node_id, message)
+        found[(node_id, message)] = bool(lines)
+        if lines:
+            log_msg = ("Message for node {0} is found:\n{1}".
+                       format(node_id, lines[0]))
+        else:
             log_msg = ("Message for node {0} is not found:\n{1}".
-                       format(elem[0], elem[1]))
-            if is_expected:
-                logger.error(log_msg)
-            else:
-                logger.info(log_msg)
-
-    os.remove(tmp_file)
+                       format(node_id, message))
+        if bool(lines) == is_expected:
+            logger.info(log_msg)
+        else:
+            logger.error(log_msg)
     return all(found.values())
 
 
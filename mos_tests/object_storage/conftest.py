@@ -36,28 +36,35 @@ def ctrl_remote(get_env):
         yield remote
 
 
+@pytest.yield_fixture(scope='module')
+def ctrl_cli_session(ctrl_remote):
+    """Persistent CLI session (with sourced openrc) on controller"""
+    with os_cli.CLISession(ctrl_remote) as session:
+        yield session
+
+
 @pytest.fixture(scope='module')
-def openstack_client(ctrl_remote):
+def openstack_client(ctrl_cli_session):
     """Client to Openstack"""
-    return os_cli.OpenStack(ctrl_remote)
+    return os_cli.OpenStack(ctrl_cli_session)
 
 
 @pytest.fixture
-def os_swift_client(ctrl_remote):
+def os_swift_client(ctrl_cli_session):
     """Client to Swift"""
-    return os_cli.OpenStackSwift(ctrl_remote)
+    return os_cli.OpenStackSwift(ctrl_cli_session)
 
 
 @pytest.fixture
-def swift_cli(ctrl_remote):
+def swift_cli(ctrl_cli_session):
     """Swift cli client"""
-    return os_cli.Swift(ctrl_remote)
+    return os_cli.Swift(ctrl_cli_session)
 
 
 @pytest.fixture
-def s3cmd_client(ctrl_remote):
+def s3cmd_client(ctrl_cli_session):
     """Client to s3cmd tool"""
-    return os_cli.S3CMD(ctrl_remote)
+    return os_cli.S3CMD(ctrl_cli_session)
 
 
 @pytest.yield_fixture
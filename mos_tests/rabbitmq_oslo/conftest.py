@@ -13,11 +13,13 @@
 #    under the License.
 
 import logging
+import os
 import random
 
 import pytest
 
 from mos_tests.rabbitmq_oslo.utils import control
+from mos_tests import settings
 
 
 logger = logging.getLogger(__name__)
@@ -28,6 +30,19 @@ def check_tool():
     return control.MessagingCheckTool()
 
 
+@pytest.yield_fixture
+def messaging_metrics(request, check_tool):
+    """Messaging metrics, saved to RABBITOSLO_METRICS_DIR if it's set"""
+    metrics = control.MessagingMetrics(check_tool)
+    yield metrics
+    metrics.stop()
+    if not settings.RABBITOSLO_METRICS_DIR:
+        return
+    if metrics.series['rpc'] or metrics.series['rates']:
+        metrics.save(os.path.join(settings.RABBITOSLO_METRICS_DIR,
+                                  '{0}.json'.format(request.node.name)))
+
+
 @pytest.fixture
 def rabbitmq(env):
     datached_rabbit = len(env.get_nodes_by_role('standalone-rabbitmq'))
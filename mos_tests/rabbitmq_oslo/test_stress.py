@@ -28,9 +28,10 @@ class RabbitStressFunctions(TestBase):
     TIMEOUT = 500  # seconds
 
     @pytest.fixture(autouse=True)
-    def tools(self, rabbitmq, check_tool):
+    def tools(self, rabbitmq, check_tool, messaging_metrics):
         self.rabbitmq = rabbitmq
         self.oslo_tool = check_tool
+        self.metrics = messaging_metrics
         self.cmd = BashCommand
 
     def start_load_generator(self, msg_topic, rpc_topic):
@@ -66,6 +67,10 @@ class RabbitStressFunctions(TestBase):
                 remote, timeout=self.TIMEOUT)
             assert self.oslo_tool.get_http_code(remote) == 200
 
+        # Sample RPC latency on consumer and messages rates on generator
+        self.metrics.start_rpc_sampler(compute)
+        self.metrics.start_rates_sampler(controller, topic=msg_topic)
+
         return {'generator': controller,
                 'consumer': compute}
 
@@ -110,6 +115,9 @@ class TestRabbitStress(RabbitStressFunctions):
         OR ban it with a peacemaker.
         8) Wait till RabbitMQ Cluster will recover. (Timeout 500 sec)
         9) Check that oslo.messaging-check-tool will return '200' for curl GET.
+
+        RPC latency, messages rates and recovery time are sampled during the
+        test, logged and saved to RABBITOSLO_METRICS_DIR (if set).
         """
         rand_num = random.randint(0, 10000)
 
@@ -123,6 +131,7 @@ class TestRabbitStress(RabbitStressFunctions):
         rabbit_node = self.rabbitmq.rabbit_node_by_role(role=role)
 
         # Stop selected rabbit node
+        self.metrics.mark(stop_method)
         if stop_method == 'kill':
             self.rabbitmq.kill_rabbitmq_node(node=rabbit_node)
             self.rabbitmq.wait_rabbit_cluster_is_ok(timeout=500)
@@ -145,3 +154,6 @@ class TestRabbitStress(RabbitStressFunctions):
                 remote, timeout=self.TIMEOUT)
             assert self.oslo_tool.get_http_code(remote) == 200, (
                 "HTTP code is not 200")
+
+        self.metrics.stop()
+        logger.info('Messaging metrics: {0}'.format(self.metrics.summary()))
@@ -12,16 +12,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import namedtuple
 import itertools
+import json
 import logging
+import math
+import os
 import re
 import sys
+import time
 
 from pika import URLParameters
 from six.moves import configparser
 from six.moves.configparser import NoOptionError
+from six.moves import shlex_quote
 import xml.etree.ElementTree as ElementTree
 
+from mos_tests.functions.common import bounded_pool
 from mos_tests.functions.common import wait
 from mos_tests.rabbitmq_oslo.utils import BashCommand
 from mos_tests import settings
@@ -341,6 +348,276 @@ class MessagingCheckTool(object):
                         'RPC server/client app on %s' % remote.host)
 
 
+def percentile(values, percent):
+    """Return nearest-rank percentile of values (None for empty list)"""
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class MessagingMetrics(object):
+    """Time series of messaging metrics sampled on nodes
+
+    Samplers are shell loops running on nodes, so sampling doesn't depend on
+    SSH connection from the test host during failover:
+    * 'rpc' - HTTP code and response time of oslo.messaging-check-tool
+      endpoint (each request is RPC call through RabbitMQ);
+    * 'rates' - published/delivered messages per second for queues of topic.
+    Events (like node kill or ban) are marked with node time to calculate
+    recovery time.
+    """
+
+    def __init__(self, check_tool, interval=None):
+        self.check_tool = check_tool
+        self.cmd = BashCommand
+        self.interval = interval or settings.RABBITOSLO_METRICS_INTERVAL
+        self.samplers = []
+        self.series = {'rpc': [], 'rates': []}
+        self.events = []
+
+    def _start_sampler(self, node, kind, command):
+        log_path = '/tmp/oslo_metrics_{0}.log'.format(kind)
+        loop = 'while true; do {0}; sleep {1}; done'.format(command,
+                                                            self.interval)
+        with node.ssh() as remote:
+            remote.execute('rm -f {0}'.format(log_path), verbose=False)
+            pid = remote.background_call('bash -c {0}'.format(
+                shlex_quote(loop)), stdout=log_path)
+        logger.debug('Start {0} metrics sampler on {1}'.format(
+            kind, node.data['fqdn']))
+        self.samplers.append((node, kind, log_path, pid))
+
+    def start_rpc_sampler(self, node, host='127.0.0.1', port=None):
+        """Sample RPC round-trip through check tool HTTP endpoint on node"""
+        port = port or self.check_tool.config_vars['rpc_port']
+        curl = self.cmd.oslo_messaging_check_tool.curl_get_timing.format(
+            host=host, port=port)
+        self._start_sampler(
+            node, 'rpc', 'echo "$(date +%s.%N) $({0})"'.format(curl))
+
+    def start_rates_sampler(self, node, topic):
+        """Sample published/delivered messages rates for topic queues
+
+        If rates can't be listed, sample is marked as failed instead of
+        being recorded with zero rates.
+        """
+        rates = self.cmd.oslo_messaging_check_tool.queues_rates.format(
+            usr=self.check_tool.config_vars['rabbit_userid'],
+            pwd=self.check_tool.config_vars['rabbit_password'])
+        self._start_sampler(
+            node, 'rates',
+            "if out=$({0}); then echo \"$out\" | "
+            "awk -v ts=$(date +%s.%N) -v topic={1} "
+            "'index($1, topic) {{p += $2; d += $3}} "
+            "END {{print ts, p + 0, d + 0}}'; "
+            "else echo \"$(date +%s.%N) failed\"; fi".format(
+                rates, shlex_quote(topic)))
+
+    def mark(self, name, node=None):
+        """Save event with current time of node (first sampler's node)"""
+        if node is None:
+            if not self.samplers:
+                logger.warning('Metrics event {0} is not saved: no samplers '
+                               'are running'.format(name))
+                return
+            node = self.samplers[0][0]
+        with node.ssh() as remote:
+            timestamp = float(
+                remote.check_call('date +%s.%N', verbose=False).stdout_string)
+        logger.debug('Metrics event {0} at {1}'.format(name, timestamp))
+        self.events.append({'name': name, 'time': timestamp})
+
+    @staticmethod
+    def _parse(kind, lines):
+        samples = []
+        for line in lines:
+            parts = line.split()
+            try:
+                if kind == 'rpc':
+                    samples.append({'time': float(parts[0]),
+                                    'code': int(parts[1]),
+                                    'latency': float(parts[2])})
+                else:
+                    samples.append({'time': float(parts[0]),
+                                    'published': float(parts[1]),
+                                    'delivered': float(parts[2])})
+            except (IndexError, ValueError):
+                continue
+        return samples
+
+    def stop(self):
+        """Stop samplers and collect samples from nodes"""
+        while self.samplers:
+            node, kind, log_path, pid = self.samplers.pop()
+            try:
+                with node.ssh() as remote:
+                    remote.execute('kill {0}'.format(pid), verbose=False)
+                    with remote.open(log_path) as f:
+                        lines = f.readlines()
+                    remote.execute('rm -f {0}'.format(log_path),
+                                   verbose=False)
+            except Exception as e:
+                logger.warning("Can't collect {0} metrics from {1}: "
+                               "{2}".format(kind, node.data['fqdn'], e))
+                continue
+            failed = [x for x in lines if x.split()[1:2] == ['failed']]
+            if failed:
+                logger.warning('{0} of {1} {2} metrics samples failed on '
+                               '{3}'.format(len(failed), len(lines), kind,
+                                            node.data['fqdn']))
+            self.series[kind].extend(self._parse(kind, lines))
+        for samples in self.series.values():
+            samples.sort(key=lambda x: x['time'])
+
+    def recovery_time(self, event_time):
+        """Return seconds from event till RPC calls became successful
+
+        :return: 0 if there were no failures after event, None if RPC calls
+            are not recovered
+        """
+        samples = [x for x in self.series['rpc'] if x['time'] >= event_time]
+        failed = [i for i, x in enumerate(samples) if x['code'] != 200]
+        if not failed:
+            return 0
+        recovered = samples[failed[-1] + 1:]
+        if not recovered:
+            return None
+        return recovered[0]['time'] - event_time
+
+    def summary(self):
+        """Return dict with aggregated metrics"""
+        rpc = self.series['rpc']
+        latencies = [x['latency'] for x in rpc if x['code'] == 200]
+        result = {
+            'rpc_samples': len(rpc),
+            'rpc_failed': len(rpc) - len(latencies),
+            'recovery_time': {x['name']: self.recovery_time(x['time'])
+                              for x in self.events},
+        }
+        for percent in (50, 90, 99):
+            result['rpc_latency_p{0}'.format(percent)] = percentile(
+                latencies, percent)
+        for key in ('published', 'delivered'):
+            values = [x[key] for x in self.series['rates']]
+            result['{0}_rate_avg'.format(key)] = (
+                sum(values) / len(values) if values else None)
+            result['{0}_rate_min'.format(key)] = min(values or [None])
+        return result
+
+    def save(self, path):
+        """Dump series, events and summary to json file"""
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as f:
+            json.dump({'series': self.series,
+                       'events': self.events,
+                       'summary': self.summary()}, f, indent=2)
+        logger.info('Messaging metrics are saved to {0}'.format(path))
+
+
+class RabbitNodeHealth(namedtuple('RabbitNodeHealth', [
+        'fqdn', 'reachable', 'running', 'clustered', 'in_pacemaker', 'pid',
+        'partitions', 'alarms', 'error'])):
+    """Result of rabbit node probe"""
+
+    @property
+    def is_ok(self):
+        return all((self.reachable, self.running, self.clustered,
+                    self.in_pacemaker, not self.partitions))
+
+    def __str__(self):
+        return ('{0.fqdn}: reachable={0.reachable} running={0.running} '
+                'clustered={0.clustered} in_pacemaker={0.in_pacemaker} '
+                'pid={0.pid} partitions={0.partitions} alarms={0.alarms} '
+                'error={0.error}').format(self)
+
+
+def _erlang_list(output, key):
+    """Return content of `{key,[...]}` tuple from rabbitmqctl output"""
+    found = re.search(r'\{%s,\[(.*?)\]\}' % key, output, re.S)
+    return found.group(1) if found else ''
+
+
+class PacemakerStatus(object):
+    """Parsed 'pcs status --full xml' snapshot
+
+    XML is parsed once, resources and nodes are indexed for lookups.
+    """
+
+    ROLES = ('master', 'slave')
+    ONLINE_MAPPING = {'true': 'online', 'false': 'offline'}
+
+    def __init__(self, xml):
+        self.root = ElementTree.fromstring(xml)
+        self.created_at = time.time()
+        # {resource_agent: [(role, node_fqdn), ...]}
+        self.resources = {}
+        for resource in self.root.findall('./resources//resource'):
+            agent = resource.attrib.get('resource_agent', '')
+            role = resource.attrib.get('role', '').lower()
+            for node in resource.findall('node'):
+                self.resources.setdefault(agent, []).append(
+                    (role, node.get('name')))
+        # {node_fqdn: 'online'/'offline'}
+        self.nodes = {}
+        for node in self.root.findall('nodes/node'):
+            self.nodes[node.attrib.get('name', '')] = self.ONLINE_MAPPING.get(
+                node.attrib.get('online', ''))
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    def roles(self, agent_name='rabbitmq-server'):
+        """Return dict with nodes FQDNs for each role of resource agent
+
+        :param agent_name: part of resource agent name
+        :return: dict like {'all': [...], 'master': [...], 'slave': [...]}
+        """
+        roles = {role: [] for role in self.ROLES}
+        for agent, items in self.resources.items():
+            if agent_name not in agent:
+                continue
+            for role, fqdn in items:
+                if role in roles:
+                    roles[role].append(fqdn)
+        roles['all'] = list(itertools.chain.from_iterable(
+            roles[role] for role in self.ROLES))
+        return roles
+
+    def statuses(self, fqdns=None):
+        """Return dict with online statuses of nodes
+
+        :param fqdns: return statuses only for these nodes
+        """
+        return {fqdn: status for fqdn, status in self.nodes.items()
+                if fqdns is None or fqdn in fqdns}
+
+    def problems(self):
+        """Return set of failed or stopped resources and offline nodes
+
+        :return: set of strings like '<resource_id>@<node_fqdn>:<role>' and
+            '<node_fqdn>:offline'
+        """
+        problems = set()
+        for resource in self.root.findall('./resources//resource'):
+            attrib = resource.attrib
+            if (attrib.get('failed') != 'true' and
+                    attrib.get('active') == 'true'):
+                continue
+            nodes = [x.get('name') for x in resource.findall('node')] or ['']
+            for node in nodes:
+                problems.add('{0}@{1}:{2}'.format(
+                    attrib.get('id'), node, attrib.get('role', '').lower()))
+        problems.update('{0}:{1}'.format(fqdn, status)
+                        for fqdn, status in self.nodes.items()
+                        if status != 'online')
+        return problems
+
+
 class RabbitMQWrapper(object):
 
     def __init__(self, env, datached_rabbit=False):
@@ -354,9 +631,12 @@ class RabbitMQWrapper(object):
         self.cmd = BashCommand
         self.name_slave = BashCommand.pacemaker.rabbit_slave_name
         self.name_master = BashCommand.pacemaker.rabbit_master_name
-        self.nodes = self.nodes_list()
         self.TIMEOUT_LONG = 8 * 60
         self.TIMEOUT_SHORT = 4 * 60
+        # Pacemaker status is shared by accessors during this period
+        self.STATUS_TTL = 10
+        self._status = None
+        self.nodes = self.nodes_list()
 
     def alive_node(self):
         """Returns one alive rabbit host node"""
@@ -377,71 +657,63 @@ class RabbitMQWrapper(object):
     def all_alive_nodes(self):
         """Returns all alive rabbit host node"""
         rabbit_hosts = self.all_nodes()
-        alive_nodes = []
-        for node in rabbit_hosts:
-            if node.is_ssh_avaliable():
-                alive_nodes.append(node)
+        with bounded_pool(len(rabbit_hosts)) as pool:
+            available = pool.map(lambda x: x.is_ssh_avaliable(), rabbit_hosts)
+        alive_nodes = [node for node, is_alive in zip(rabbit_hosts, available)
+                       if is_alive]
         if not len(alive_nodes):
             raise Exception('No alive standalone-rabbitmq nodes')
         return alive_nodes
 
-    def get_status(self, node=None):
-        """Return xml obj with 'pcs status' content"""
+    def status_snapshot(self, node=None, refresh=False):
+        """Return `PacemakerStatus`, cached for STATUS_TTL seconds
+
+        :param node: node to get status from (cache is not used if set)
+        :param refresh: get new status even if cached one is not expired
+        :return: PacemakerStatus or None if 'pcs status' is failed
+        """
+        if (node is None and not refresh and self._status is not None and
+                self._status.age < self.STATUS_TTL):
+            return self._status
         node = node or self.alive_node()
         get_xml_pcm_status_cmd = self.cmd.pacemaker.full_status + " xml"
 
         with node.ssh() as remote:
             out = remote.execute(get_xml_pcm_status_cmd, verbose=False)
-        if out.is_ok:
-            return ElementTree.fromstring(out.stdout_string)
-        else:
+        if not out.is_ok:
             return None
+        self._status = PacemakerStatus(out.stdout_string)
+        return self._status
+
+    def invalidate_status(self):
+        """Drop cached pacemaker status (after cluster state is changed)"""
+        self._status = None
 
-    def nodes_list(self, node=None):
+    def get_status(self, node=None):
+        """Return xml obj with 'pcs status' content"""
+        status = self.status_snapshot(node)
+        if status is None:
+            return None
+        return status.root
+
+    def nodes_list(self, node=None, refresh=False):
         """Return dict with mapping between alive rabbit node FQDN and its role
         :return: Dict with roles and nodes's FQDNs. Like:
         :  {'all':    ['node-1.test.domain.local','node-4...'],
         :   'master': ['node-1.test.domain.local'],
         :   'slave':  ['node-2.test.domain.local', 'node-4...']}
         """
-        status = self.get_status(node)
-        counted_roles = ('master', 'slave')
-
-        nodes_roles = {}
-        for role in counted_roles:
-            nodes_roles[role] = []
-
-        for node in status.findall('./resources//resource'):
-            node_resource_agent = node.attrib.get('resource_agent', '')
-            node_role = node.attrib.get('role', '').lower()
-            if ('rabbitmq-server' in node_resource_agent and
-                    node_role in counted_roles):
-                node_fqdn = node.find('node').get('name')
-                nodes_roles[node_role].append(node_fqdn)
-
-        nodes_roles['all'] = list(itertools.chain.from_iterable(
-            nodes_roles.values()))
-        return nodes_roles
-
-    def nodes_statuses(self, node=None):
+        return self.status_snapshot(node, refresh=refresh).roles()
+
+    def nodes_statuses(self, node=None, refresh=False):
         """Returns dict of nodes' FQDNs with statuses based on 'pcs status xml'
         performed from standalone rabbit node.
         :return: Like:
         :   {'node-1.test.domain.local': 'offline',
         :    'node-3.test.domain.local': 'online'}
         """
-        alive_mapping = {'true': 'online', 'false': 'offline'}
-        all_rabbit_nodes = self.nodes['all']
-        status = self.get_status(node)
-
-        nodes_statuses = {}
-        for node in status.findall('nodes/node'):
-            node_fqdn = node.attrib.get('name', '')
-            if node_fqdn not in all_rabbit_nodes:
-                continue
-            node_status = node.attrib.get('online', '')
-            nodes_statuses[node_fqdn] = alive_mapping[node_status]
-        return nodes_statuses
+        status = self.status_snapshot(node, refresh=refresh)
+        return status.statuses(self.nodes['all'])
 
     def rabbit_node_by_role(self, role='slave'):
         """Returns one rabbit master or slave node.
@@ -472,12 +744,13 @@ class RabbitMQWrapper(object):
         fqdn = remote.check_call('hostname').stdout_string
         return self.rabbit_node_by_fqdn(fqdn)
 
-    def num_of_running_nodes(self, node_type='all'):
+    def num_of_running_nodes(self, node_type='all', refresh=False):
         """Returns number of rabbit running nodes
         :param node_type: all, slave, master
+        :param refresh: don't use cached pacemaker status
         :return: int
         """
-        nodes_list = self.nodes_list()
+        nodes_list = self.nodes_list(refresh=refresh)
         return len(nodes_list[node_type])
 
     def wait_for_rabbit_running_nodes(
@@ -492,19 +765,25 @@ class RabbitMQWrapper(object):
         if primary_nodes is None:
             primary_nodes = len(self.nodes['master'])
 
+        expected = {}
         if exp_nodes >= 0:
-            wait(lambda: self.num_of_running_nodes() == exp_nodes,
-                 timeout_seconds=self.TIMEOUT_LONG,
-                 sleep_seconds=30,
-                 waiting_for='number of running nodes will be %s.' % exp_nodes)
-
+            expected['all'] = exp_nodes
         if primary_nodes >= 0:
-            wait(lambda:
-                 self.num_of_running_nodes("master") == primary_nodes,
-                 timeout_seconds=self.TIMEOUT_LONG,
-                 sleep_seconds=30,
-                 waiting_for='number of running primary nodes will be %s.'
-                             % primary_nodes)
+            expected['master'] = primary_nodes
+        if not expected:
+            return
+
+        def predicate():
+            # All facts are checked against single fresh status
+            nodes_list = self.nodes_list(refresh=True)
+            return all(len(nodes_list[node_type]) == count
+                       for node_type, count in expected.items())
+
+        wait(predicate,
+             timeout_seconds=self.TIMEOUT_LONG,
+             sleep_seconds=30,
+             waiting_for='number of running nodes will be {0}.'.format(
+                 expected))
 
     def start_rabbitmq_node(self, fqdn="$(hostname)", node=None, verify=True):
         """pcs resource clear"""
@@ -519,6 +798,7 @@ class RabbitMQWrapper(object):
 
         with node.ssh() as remote:
             remote.check_call(cmd)
+        self.invalidate_status()
 
         if verify:
             self.wait_for_rabbit_running_nodes(exp_nodes)
@@ -536,6 +816,7 @@ class RabbitMQWrapper(object):
 
         with node.ssh() as remote:
             remote.check_call(cmd)
+        self.invalidate_status()
 
         if verify:
             if exp_nodes > 0:
@@ -562,15 +843,18 @@ class RabbitMQWrapper(object):
         with node.ssh() as remote:
             # Process re-spawn may be very fast.
             # So kill and check commands should be together.
-            wait(
-                lambda: int(
-                    remote.execute(
-                        cmd_kill + ' ; ' + cmd_check,
-                        verbose=False).stdout_string) == 0,
-                timeout_seconds=10,
-                sleep_seconds=1,
-                waiting_for='RabbitMQ process will be killed on %s'
-                            % node.data['fqdn'])
+            try:
+                wait(
+                    lambda: int(
+                        remote.execute(
+                            cmd_kill + ' ; ' + cmd_check,
+                            verbose=False).stdout_string) == 0,
+                    timeout_seconds=10,
+                    sleep_seconds=1,
+                    waiting_for='RabbitMQ process will be killed on %s'
+                                % node.data['fqdn'])
+            finally:
+                self.invalidate_status()
             return True
             # otherwise there will be exception from wait()
 
@@ -585,6 +869,7 @@ class RabbitMQWrapper(object):
         logger.debug("Kill RabbitMQ on %s" % node.data['fqdn'])
         with node.ssh() as remote:
             remote.check_call(self.cmd.system.kill_by_pid.format(pid=pid))
+        self.invalidate_status()
 
     def start_rabbitmq_cluster(self, verify=True):
         """pcs resource enable"""
@@ -596,6 +881,7 @@ class RabbitMQWrapper(object):
         logger.debug("Enable RabbitMQ cluster")
         with self.alive_node().ssh() as remote:
             remote.check_call(cmd)
+        self.invalidate_status()
 
         if verify:
             self.wait_for_rabbit_running_nodes()
@@ -610,6 +896,7 @@ class RabbitMQWrapper(object):
         logger.debug("Disable RabbitMQ cluster")
         with self.alive_node().ssh() as remote:
             remote.check_call(cmd)
+        self.invalidate_status()
 
         if verify:
             self.wait_for_rabbit_running_nodes(0, 0)
@@ -626,6 +913,62 @@ class RabbitMQWrapper(object):
             self.stop_rabbitmq_cluster()
             self.start_rabbitmq_cluster()
 
+    def probe_node(self, node):
+        """Check rabbit on node with single SSH connection.
+
+        :param node: Node
+        :return: RabbitNodeHealth
+        """
+        fqdn = node.data['fqdn']
+        pcs_show = self.cmd.pacemaker.show.format(
+            service=self.cmd.pacemaker.rabbit_slave_name,
+            timeout=self.TIMEOUT_SHORT,
+            fqdn='')
+        try:
+            with node.ssh() as remote:
+                cluster = remote.execute(self.cmd.rabbitmqctl.cluster_status,
+                                         verbose=False)
+                status = remote.execute(self.cmd.rabbitmqctl.status,
+                                        verbose=False)
+                pcs = remote.execute(pcs_show, verbose=False)
+        except Exception as e:
+            return RabbitNodeHealth(fqdn, False, False, False, False, None,
+                                    [], [], str(e))
+
+        pid = re.search(r'\{pid,(\d+)\}', status.stdout_string)
+        partitions = re.findall(
+            r"'(rabbit@[^']+)'",
+            _erlang_list(cluster.stdout_string, 'partitions'))
+        alarms = re.findall(r'\b(memory|disk)\b',
+                            _erlang_list(status.stdout_string, 'alarms'))
+        return RabbitNodeHealth(
+            fqdn=fqdn,
+            reachable=True,
+            running=status.is_ok,
+            clustered=cluster.is_ok,
+            in_pacemaker=pcs.is_ok,
+            pid=int(pid.group(1)) if pid else None,
+            partitions=partitions,
+            alarms=alarms,
+            error=None)
+
+    def cluster_health(self, nodes=None, exclude_node=None):
+        """Probe rabbit nodes concurrently.
+
+        :param nodes: Nodes to check, all rabbit nodes by default.
+        :param exclude_node: Exclude this one node from check.
+        :returns: Dict with FQDNs as keys and RabbitNodeHealth as values.
+        """
+        nodes = nodes or self.all_nodes()
+        if exclude_node:
+            nodes = [x for x in nodes
+                     if x.data['fqdn'] != exclude_node.data['fqdn']]
+        with bounded_pool(len(nodes)) as pool:
+            reports = pool.map(self.probe_node, nodes)
+        for report in reports:
+            logger.debug(str(report))
+        return {x.fqdn: x for x in reports}
+
     def rabbit_cluster_is_ok(self, node=None, exclude_node=None):
         """Execute on all nodes cluster status command.
         :param node: Provide node if you want to perform check on this certain
@@ -633,43 +976,19 @@ class RabbitMQWrapper(object):
         :param exclude_node: Exclude this one node from cluster status check.
         :returns: Boolean
         """
-
-        def check_cluster_is_ok(nodes):
-            for one in nodes:
-                with one.ssh() as remote:
-                    logger.debug("%s" % '-' * 10)
-                    for cmd in commands:
-                        result = remote.execute(cmd, verbose=False)
-                        logger.debug("{0}: [{1}] is OK: {2} ".format(
-                            one.data['fqdn'], cmd, result.is_ok))
-                        all_results.append(result.is_ok)
-                    return all(all_results)
-
-        commands = [self.cmd.rabbitmqctl.cluster_status,
-                    self.cmd.rabbitmqctl.status,
-                    self.cmd.pacemaker.show.format(
-                        service=self.cmd.pacemaker.rabbit_slave_name,
-                        timeout=self.TIMEOUT_SHORT,
-                        fqdn='')]
-
-        all_results = []
         if node:
             # check on one certain node
             logger.debug(
                 "Check Rabbit cluster status on %s" % node.data['fqdn'])
-            return check_cluster_is_ok([node])
+            return self.probe_node(node).is_ok
 
-        if exclude_node:
-            logger.debug("--- Check cluster status from all rabbit nodes "
-                         "EXCEPT %s ---" % exclude_node.data['fqdn'])
-            rabbit_hosts = [x for x in self.all_alive_nodes()
-                            if x.data['fqdn'] != exclude_node.data['fqdn']]
-            return check_cluster_is_ok(rabbit_hosts)
-
-        else:
-            logger.debug("--- Check cluster status from all rabbit nodes ---")
-            rabbit_hosts = self.all_alive_nodes()
-            return check_cluster_is_ok(rabbit_hosts)
+        logger.debug("--- Check cluster status from all rabbit nodes ---")
+        reports = self.cluster_health(exclude_node=exclude_node).values()
+        # Unreachable nodes are not checked (as with `all_alive_nodes`)
+        reachable = [x for x in reports if x.reachable]
+        if not reachable:
+            raise Exception('No alive standalone-rabbitmq nodes')
+        return all(x.is_ok for x in reachable)
 
     def wait_rabbit_cluster_is_ok(
             self, node=None, timeout=None, exclude_node=None):
@@ -33,6 +33,15 @@ KEYSTONE_CREDS = {'username': KEYSTONE_USER,
 
 PUBLIC_TEST_IP = os.environ.get('PUBLIC_TEST_IP', '8.8.8.8')
 
+# Default threads count of `functions.common.bounded_pool`
+POOL_CONCURRENCY = int(os.environ.get('POOL_CONCURRENCY', 16))
+# Max count of VMs checked in parallel by network connectivity checks
+CONNECTIVITY_CHECK_CONCURRENCY = int(os.environ.get(
+    'CONNECTIVITY_CHECK_CONCURRENCY', 16))
+# Max count of new SSH connections to VMs per second for connectivity checks
+CONNECTIVITY_CHECK_SSH_RATE = float(os.environ.get(
+    'CONNECTIVITY_CHECK_SSH_RATE', 4))
+
 # Path to folder with required images
 TEST_IMAGE_PATH = os.environ.get("TEST_IMAGE_PATH", os.path.expanduser('~/images'))  # noqa
 UBUNTU_QCOW2_URL = os.environ.get('UBUNTU_QCOW2_URL',
@@ -44,6 +53,16 @@ VANILLA_UBUNTU_QCOW2_URL = 'http://sahara-files.mirantis.com/mos90/sahara-mitaka
 
 CONSOLE_LOG_LEVEL = os.environ.get('LOG_LEVEL', logging.DEBUG)
 
+# SQLite database with history of tests durations (plugins.durations),
+# disabled if empty
+DURATIONS_DB = os.environ.get('DURATIONS_DB', '')
+
+# Journal of patched configs (mos_tests.functions.patch_journal), disabled if
+# empty. Original configs are mirrored on nodes, if PATCH_JOURNAL_ON_NODE is
+# set
+PATCH_JOURNAL_DIR = os.environ.get('PATCH_JOURNAL_DIR', '')
+PATCH_JOURNAL_ON_NODE = bool(os.environ.get('PATCH_JOURNAL_ON_NODE'))
+
 # Openstack Apache proxy config file
 PROXY_CONFIG_FILE = '/etc/apache2/sites-enabled/25-apache_api_proxy.conf'
 
@@ -139,3 +158,22 @@ IRONIC_NODES_CONFIG = os.environ.get('IRONIC_NODES_CONFIG',
 RABBITOSLO_REPO = 'https://github.com/dmitrymex/oslo.messaging-check-tool.git'
 RABBITOSLO_PKG = 'oslo.messaging-check-tool*.deb'
 RABBITOSLO_TOOL_PORT = 12400
+# Messaging metrics (RPC latency, messages rates) sampling
+RABBITOSLO_METRICS_INTERVAL = int(os.environ.get(
+    'RABBITOSLO_METRICS_INTERVAL', 5))
+# Directory to save metrics json files to, metrics are not saved if empty
+RABBITOSLO_METRICS_DIR = os.environ.get('RABBITOSLO_METRICS_DIR', '')
+
+##################################
+# Ceilometer benchmark settings  #
+##################################
+
+# Comma separated samples volumes, benchmark is skipped if empty
+CEILOMETER_BENCHMARK_VOLUMES = os.environ.get('CEILOMETER_BENCHMARK_VOLUMES',
+                                              '')
+CEILOMETER_BENCHMARK_RESOURCES = int(os.environ.get(
+    'CEILOMETER_BENCHMARK_RESOURCES', 1000))
+CEILOMETER_BENCHMARK_PERIODS = os.environ.get('CEILOMETER_BENCHMARK_PERIODS',
+                                              '0,3600,86400')
+# Directory to download report to, report is left on controller if empty
+CEILOMETER_BENCHMARK_DIR = os.environ.get('CEILOMETER_BENCHMARK_DIR', '')
@@ -12,12 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from __future__ import print_function
+from collections import OrderedDict
 import logging
+import time
 import unittest
 
 import pytest
 
 from mos_tests.environment.devops_client import DevopsClient
+from mos_tests.functions import service
+from plugins.fuel_snapshot import wait_for_snapshots
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +36,20 @@ def pytest_addoption(parser):
                      '-S',
                      action="store",
                      help="Fuel devops snapshot name")
+    parser.addoption("--schedule-reverts",
+                     action="store_true",
+                     help="Reorder tests to minimize snapshot reverts: "
+                          "undestructive tests first, then destructive ones "
+                          "grouped by disjoint side effects")
+    parser.addoption("--revert-plan",
+                     action="store_true",
+                     help="Show estimated reverts count and time (before and "
+                          "after reordering) and exit without running tests")
+    parser.addoption("--revert-minutes",
+                     action="store",
+                     type=int,
+                     default=15,
+                     help="Estimated time of revert with env validation")
 
 
 def pytest_configure(config):
@@ -42,6 +61,14 @@ def pytest_configure(config):
     config.addinivalue_line("markers",
                             "force_revert_cleanup: run revert after executing "
                             "test(s) in function/class/module")
+    config.addinivalue_line("markers",
+                            "side_effects(*names): destructive test affects "
+                            "only named parts of env, so tests with disjoint "
+                            "side effects can share single revert")
+    config.addinivalue_line("markers",
+                            "soft_reset: test changes env through OpenStack "
+                            "API only, so with `--soft-reset` env can be "
+                            "cleaned up in place instead of revert")
 
 
 @pytest.fixture(scope="session")
@@ -68,6 +95,126 @@ def revert_snapshot(env_name, snapshot_name):
                                  snapshot_name=snapshot_name)
 
 
+def get_side_effects(item):
+    """Return declared side effects of destructive test
+
+    :return: frozenset or None, if side effects are not declared
+    """
+    marker = item.get_marker('side_effects')
+    if marker is None:
+        return None
+    return frozenset(marker.args)
+
+
+def revert_after(item, nextitem, pending=frozenset()):
+    """Check if env should be reverted after passed test
+
+    Revert is deferred while destructive tests with declared side effects
+    are followed by the ones with side effects disjoint to all not reverted
+    yet.
+
+    :param pending: side effects of previous tests, which are not reverted
+    :return: tuple (revert is needed, side effects left after test)
+    """
+    if 'undestructive' in item.keywords:
+        return False, pending
+    effects = get_side_effects(item)
+    if (effects is None or nextitem is None or
+            'undestructive' in nextitem.keywords):
+        return True, frozenset()
+    next_effects = get_side_effects(nextitem)
+    pending = pending | effects
+    if next_effects is None or pending & next_effects:
+        return True, frozenset()
+    return False, pending
+
+
+def count_reverts(items):
+    """Count reverts between items (assuming all tests pass)"""
+    count = 0
+    pending = frozenset()
+    for item, nextitem in zip(items, items[1:]):
+        revert, pending = revert_after(item, nextitem, pending)
+        count += revert
+    return count
+
+
+def split_units(items):
+    """Split items to units, which should not be reordered or divided
+
+    Unit is single test or whole incremental class.
+    """
+    units = OrderedDict()
+    for i, item in enumerate(items):
+        if 'incremental' in item.keywords and item.cls is not None:
+            key = item.parent.nodeid
+        else:
+            key = i
+        units.setdefault(key, []).append(item)
+    return list(units.values())
+
+
+def schedule(items):
+    """Return items reordered to minimize reverts
+
+    Undestructive tests go first grouped by module and class (to share
+    fixtures of these scopes), then destructive tests with declared side
+    effects packed into groups with disjoint side effects (one revert per
+    group), then the rest of destructive tests. Original order is kept
+    inside groups.
+    """
+    undestructive = OrderedDict()
+    groups = []
+    destructive = []
+    for unit in split_units(items):
+        if all('undestructive' in x.keywords for x in unit):
+            key = (str(unit[0].fspath), unit[0].cls)
+            undestructive.setdefault(key, []).extend(unit)
+            continue
+        effects = [get_side_effects(x) for x in unit]
+        if None in effects:
+            destructive.extend(unit)
+            continue
+        effects = frozenset().union(*effects)
+        for group in groups:
+            if not group[0] & effects:
+                group[0] |= effects
+                group[1].extend(unit)
+                break
+        else:
+            groups.append([set(effects), list(unit)])
+    result = [x for unit in undestructive.values() for x in unit]
+    for _, group_items in groups:
+        result.extend(group_items)
+    return result + destructive
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Reorder tests to minimize reverts and show reverts estimation"""
+    if not (config.getoption("--schedule-reverts") or
+            config.getoption("--revert-plan")):
+        return
+    before = count_reverts(items)
+    if config.getoption("--schedule-reverts"):
+        items[:] = schedule(items)
+    after = count_reverts(items)
+    message = ('Snapshot reverts estimation (without failures): '
+               '{0} (~{1} min) before scheduling, '
+               '{2} (~{3} min) after').format(
+        before, before * config.getoption("--revert-minutes"),
+        after, after * config.getoption("--revert-minutes"))
+    logger.info(message)
+    if config.getoption("--revert-plan"):
+        print('')
+        print(message)
+
+
+def pytest_runtestloop(session):
+    if session.config.getoption("--revert-plan"):
+        return True
+
+
 def clean_finalizers(request, finalizers):
     for finalizer in finalizers:
         try:
@@ -115,13 +262,30 @@ def pytest_runtest_teardown(item, nextitem):
     failed = (item.failed_count_before != item.session.testsfailed or
               outcome.excinfo is not None)
 
-    destructive = 'undestructive' not in item.keywords
+    pending = getattr(item.session, 'pending_side_effects', frozenset())
+    revert_needed, pending = revert_after(item, nextitem, pending)
+    setattr(item.session, 'pending_side_effects', pending)
     env_name = item.config.getoption("--env")
     snapshot_name = item.config.getoption("--snapshot")
-    if destructive or failed:
-        if all([env_name, snapshot_name]):
-            revert_snapshot(env_name, snapshot_name)
-
+    if revert_needed or failed:
+        started = time.time()
+        soft_reset = getattr(item.session, 'soft_reset', None)
+        # Other tests can damage env in ways which are not seen by health
+        # checks of soft reset
+        if item.get_marker('soft_reset') is None:
+            soft_reset = None
+        reset_in_place = soft_reset is not None and soft_reset.reset()
+        if reset_in_place or all([env_name, snapshot_name]):
+            if not reset_in_place:
+                # Revert would destroy Fuel snapshot, which is generated
+                wait_for_snapshots(item.config)
+                revert_snapshot(env_name, snapshot_name)
+                service.clear_patched_configs()
+            # Saved by `plugins.durations` apart from teardown duration
+            setattr(item, 'revert_duration', time.time() - started)
+
+            # Resources of fixtures are deleted by soft reset too, so they
+            # should be set up again in both cases
             finalizers = [
                 x
                 for y in item.session._setupstate._finalizers.values()
@@ -138,6 +302,7 @@ def pytest_runtest_teardown(item, nextitem):
                 parent = parent.parent
             if item in item.session._setupstate._finalizers:
                 del item.session._setupstate._finalizers[item]
-            reverted = True
+            reverted = not reset_in_place
+            setattr(item.session, 'pending_side_effects', frozenset())
 
     setattr(nextitem._request.session, 'reverted', reverted)
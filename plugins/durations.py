@@ -0,0 +1,231 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""History of tests durations
+
+Setup, call and teardown durations of each test are stored to SQLite
+database (`--durations-db`). Env revert (or soft reset) after test made by
+`plugins.devops` is stored as separate `revert` phase, it isn't included to
+teardown duration. Tests are identified by `testrail_id` (if present) or by
+node id without `testrail_id` suffix. Predicted duration of test is the sum
+of mean durations of its last passed phases except reverts (they depend on
+tests order and are estimated by `count_reverts`).
+
+Predictions are used for longest processing time first ordering
+(`--durations-order`), for `--durations-forecast` report and for tests
+sharding by `plugins.labs`.
+"""
+
+from collections import defaultdict
+import logging
+import sqlite3
+import time
+
+import pytest
+
+from mos_tests import settings
+from plugins.devops import count_reverts
+from plugins.devops import split_units
+from plugins.testrail_id import get_testrail_id
+from plugins.testrail_id import SUFFIX_RE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DURATION = 60
+REVERT_PHASE = 'revert'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS durations (
+    key TEXT NOT NULL,
+    nodeid TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    duration REAL NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS durations_key ON durations (key, finished);
+'''
+
+
+def pytest_addoption(parser):
+    parser.addoption("--durations-db",
+                     action="store",
+                     default=settings.DURATIONS_DB,
+                     help="SQLite database with tests durations history "
+                          "(empty to disable)")
+    parser.addoption("--durations-order",
+                     action="store_true",
+                     help="Run longest (by history) tests first")
+    parser.addoption("--durations-forecast",
+                     action="store_true",
+                     help="Show predicted session time and exit without "
+                          "running tests")
+
+
+def item_key(item):
+    """Return history key of test"""
+    testrail_id = get_testrail_id(item.name)
+    if testrail_id is not None:
+        return 'testrail:{0}'.format(testrail_id)
+    return SUFFIX_RE.sub('', item.nodeid)
+
+
+class DurationsHistory(object):
+    """Tests phases durations stored in SQLite database
+
+    :param depth: count of last passed runs to predict duration with
+    :param until: timestamp to ignore durations saved after it
+    """
+
+    def __init__(self, path, depth=5, until=None):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.executescript(SCHEMA)
+        self.depth = depth
+        self.until = until
+        self._predictions = None
+
+    def add(self, item, phase, outcome, duration):
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO durations VALUES (?, ?, ?, ?, ?, ?)',
+                (item_key(item), item.nodeid, phase, outcome, duration,
+                 time.time()))
+
+    def load(self):
+        """Return dict with predicted durations by history keys"""
+        samples = defaultdict(list)
+        rows = self.connection.execute(
+            'SELECT key, phase, duration FROM durations '
+            'WHERE outcome = ? AND phase != ? AND finished < ? '
+            'ORDER BY finished DESC',
+            ('passed', REVERT_PHASE, self.until or time.time()))
+        for key, phase, duration in rows:
+            values = samples[key, phase]
+            if len(values) < self.depth:
+                values.append(duration)
+        predictions = defaultdict(float)
+        for (key, _), values in samples.items():
+            predictions[key] += sum(values) / len(values)
+        return dict(predictions)
+
+    def predict(self, item):
+        """Return predicted duration of test in seconds
+
+        Tests without history are predicted with median duration.
+        """
+        if self._predictions is None:
+            self._predictions = self.load()
+            known = sorted(self._predictions.values())
+            self._default = (known[len(known) // 2] if known
+                             else DEFAULT_DURATION)
+        return self._predictions.get(item_key(item), self._default)
+
+    def is_known(self, item):
+        self.predict(item)
+        return item_key(item) in self._predictions
+
+    def close(self):
+        self.connection.close()
+
+
+def get_history(config):
+    """Return `DurationsHistory` of session (or None, if disabled)"""
+    return getattr(config, '_durations_history', None)
+
+
+def lpt_order(items, predict):
+    """Return items ordered longest first (incremental classes as whole)"""
+    units = split_units(items)
+    units.sort(key=lambda unit: -sum(predict(x) for x in unit))
+    return [x for unit in units for x in unit]
+
+
+def forecast(config, items, history):
+    """Return lines of predicted session time report"""
+    total = sum(history.predict(x) for x in items)
+    known = sum(1 for x in items if history.is_known(x))
+    lines = ['Tests: {0} ({1} with history), ~{2:.0f} min'.format(
+        len(items), known, total / 60)]
+    if config.getoption("--env") and config.getoption("--snapshot"):
+        reverts = count_reverts(items)
+        revert_minutes = reverts * config.getoption("--revert-minutes")
+        lines.append('Reverts: {0}, ~{1} min'.format(reverts,
+                                                     revert_minutes))
+        total += revert_minutes * 60
+    lines.append('Session: ~{0:.0f} min'.format(total / 60))
+    return lines
+
+
+def pytest_configure(config):
+    path = config.getoption("--durations-db")
+    if path:
+        # `plugins.labs` workers predict with durations saved before start
+        config._durations_history = DurationsHistory(
+            path, until=getattr(config, '_labs_started', None))
+
+
+def pytest_unconfigure(config):
+    history = get_history(config)
+    if history is not None:
+        history.close()
+
+
+def pytest_collection_modifyitems(session, config, items):
+    history = get_history(config)
+    if history is None:
+        return
+    if config.getoption("--durations-order"):
+        items[:] = lpt_order(items, history.predict)
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_finish(session):
+    config = session.config
+    history = get_history(config)
+    if history is None or not config.getoption("--durations-forecast"):
+        return
+    config._durations_forecast = forecast(config, session.items, history)
+
+
+def pytest_runtestloop(session):
+    if session.config.getoption("--durations-forecast"):
+        return True
+
+
+def pytest_terminal_summary(terminalreporter):
+    lines = getattr(terminalreporter.config, '_durations_forecast', None)
+    if lines:
+        terminalreporter.write_sep('=', 'durations forecast')
+        for line in lines:
+            terminalreporter.write_line(line)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    history = get_history(item.config)
+    if history is None:
+        return
+    report = outcome.get_result()
+    phases = [(report.when, report.duration)]
+    revert_duration = getattr(item, 'revert_duration', None)
+    if report.when == 'teardown' and revert_duration is not None:
+        phases = [(report.when, max(report.duration - revert_duration, 0)),
+                  (REVERT_PHASE, revert_duration)]
+    try:
+        for phase, duration in phases:
+            history.add(item, phase, report.outcome, duration)
+    except sqlite3.Error as e:
+        logger.warning("Can't save duration of {0}: {1}".format(item.nodeid,
+                                                                e))
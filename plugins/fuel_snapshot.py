@@ -12,24 +12,47 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+"""Fuel diagnostic snapshots on test failures
+
+Snapshots are generated and downloaded by background thread, so tests
+continue while dump is running. Failures reported within
+`--snapshots-window` seconds after the first one (or while previous
+snapshot is generated) are coalesced into single snapshot. Each snapshot
+is saved to own directory under `snapshots`, which is linked from junit
+report with `fuel_snapshot` property of failed tests.
+"""
+
+from collections import OrderedDict
+import gzip
 import logging
 import os
 import re
+import shutil
+import threading
+import time
 
-from fuelclient.objects import SnapshotTask
 from fuelclient.client import APIClient
+from fuelclient.objects import SnapshotTask
 import pytest
 import requests
 import waiting
 
 logger = logging.getLogger(__name__)
 
+SNAPSHOTS_DIR = 'snapshots'
+COMPRESSED_EXTS = ('.gz', '.xz', '.bz2', '.tgz')
+
 
 def pytest_addoption(parser):
     parser.addoption("--make-snapshots",
                      '-D',
                      action="store_true",
                      help="Generate fuel diagnostic snapshot on failues")
+    parser.addoption("--snapshots-window",
+                     action="store",
+                     type=int,
+                     default=60,
+                     help="Seconds to coalesce failures into one snapshot")
 
 
 @pytest.fixture(autouse=True)
@@ -37,7 +60,198 @@ def set_fuel_ip(request, fuel):
     setattr(request.node, 'fuel_ip', fuel.admin_ip)
 
 
+def download(url, path, headers=None, retries=3, chunk_size=65536):
+    """Download url to path, resuming interrupted download
+
+    Data is written to `<path>.part` file, which is renamed after download
+    is completed.
+    """
+    part_path = path + '.part'
+    headers = dict(headers or {})
+    # Resume offset should match file size, so no transfer encoding
+    headers['Accept-Encoding'] = 'identity'
+    for attempt in range(retries + 1):
+        offset = 0
+        if os.path.exists(part_path):
+            offset = os.path.getsize(part_path)
+        if offset:
+            headers['Range'] = 'bytes={0}-'.format(offset)
+        try:
+            response = requests.get(url, stream=True, headers=headers,
+                                    timeout=60)
+            if response.status_code == 416:
+                # Nothing left to download
+                break
+            response.raise_for_status()
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+            break
+        except (requests.RequestException, IOError) as e:
+            if attempt == retries:
+                raise
+            logger.warning('Download of {0} is interrupted ({1}), '
+                           'resuming'.format(url, e))
+    os.rename(part_path, path)
+    return path
+
+
+def compress(path):
+    """Gzip file, if it's not compressed yet
+
+    :return: path of compressed file
+    """
+    if path.endswith(COMPRESSED_EXTS):
+        return path
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return path + '.gz'
+
+
+class SnapshotWorker(object):
+    """Generates and downloads Fuel snapshots in background thread
+
+    :param window: seconds to wait for other failures before snapshot
+        generating
+    """
+
+    def __init__(self, directory=SNAPSHOTS_DIR, window=60,
+                 timeout=10 * 60):
+        self.directory = directory
+        self.window = window
+        self.timeout = timeout
+        self._pending = OrderedDict()
+        self._downloaded = {}
+        self._busy = False
+        self._hurry = False
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, fuel_ip, test_name):
+        """Request snapshot for failed test
+
+        :return: path of snapshot directory
+        """
+        with self._condition:
+            group = self._pending.get(fuel_ip)
+            if group is None:
+                name = re.sub(r'[^\w\s-]', '_', test_name).strip().lower()
+                name = '{0}_{1}'.format(time.strftime('%Y%m%d-%H%M%S'), name)
+                group = {'path': os.path.join(self.directory, name),
+                         'tests': [],
+                         'created': time.time()}
+                self._pending[fuel_ip] = group
+                self._condition.notify_all()
+            group['tests'].append(test_name)
+            return group['path']
+
+    def wait(self):
+        """Wait for requested snapshots without coalescing window"""
+        with self._condition:
+            self._hurry = True
+            self._condition.notify_all()
+            while self._pending or self._busy:
+                self._condition.wait(1)
+            self._hurry = False
+
+    def stop(self):
+        self.wait()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _next_group(self):
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None, None
+                if self._pending:
+                    fuel_ip, group = next(iter(self._pending.items()))
+                    delay = group['created'] + self.window - time.time()
+                    if delay <= 0 or self._hurry:
+                        del self._pending[fuel_ip]
+                        self._busy = True
+                        return fuel_ip, group
+                    self._condition.wait(delay)
+                else:
+                    self._condition.wait()
+
+    def _run(self):
+        while True:
+            fuel_ip, group = self._next_group()
+            if group is None:
+                return
+            try:
+                self._make(fuel_ip, group)
+            except Exception as e:
+                logger.warning(e)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _make(self, fuel_ip, group):
+        logger.info('Start generate fuel snapshot for {0}'.format(
+            ', '.join(group['tests'])))
+        task = SnapshotTask.start_snapshot_task({})
+        waiting.wait(lambda: task.is_finished,
+                     timeout_seconds=self.timeout,
+                     sleep_seconds=5,
+                     waiting_for='dump to be finished')
+        if task.status != 'ready':
+            raise Exception("Snapshot generating task ended with error. "
+                            "Task message: {message}".format(**task.data))
+
+        url = 'http://{fuel_ip}:8000{task.data[message]}'.format(
+            fuel_ip=fuel_ip, task=task)
+        if not os.path.exists(group['path']):
+            os.makedirs(group['path'])
+        with open(os.path.join(group['path'], 'tests.txt'), 'w') as f:
+            f.write('\n'.join(group['tests']) + '\n')
+        if url in self._downloaded:
+            logger.info('Snapshot {0} is already downloaded to {1}'.format(
+                url, self._downloaded[url]))
+            return
+        filename = os.path.basename(task.data['message']) or 'snapshot.tar'
+        path = download(url, os.path.join(group['path'], filename),
+                        headers={'x-auth-token': APIClient.auth_token})
+        self._downloaded[url] = compress(path)
+        logger.info('Fuel snapshot is saved to {0}'.format(
+            self._downloaded[url]))
+
+
+def get_worker(config):
+    """Return `SnapshotWorker` of session (it's started on first call)"""
+    worker = getattr(config, '_fuel_snapshots', None)
+    if worker is None:
+        worker = SnapshotWorker(window=config.getoption("--snapshots-window"))
+        config._fuel_snapshots = worker
+    return worker
+
+
+def wait_for_snapshots(config):
+    """Wait for requested snapshots (before env revert, for example)"""
+    worker = getattr(config, '_fuel_snapshots', None)
+    if worker is not None:
+        worker.wait()
+
+
+def link_to_report(item, report, path):
+    """Add `fuel_snapshot` property to junit report testcase"""
+    xml = getattr(item.config, '_xml', None)
+    if xml is not None:
+        xml.node_reporter(report).add_property('fuel_snapshot', path)
+
+
+@pytest.hookimpl(hookwrapper=True)
 def pytest_runtest_makereport(item, call):
+    outcome = yield
     config = item.session.config
     fuel_ip = getattr(item, 'fuel_ip', None)
     if fuel_ip is None:
@@ -45,35 +259,16 @@ def pytest_runtest_makereport(item, call):
 
     make_snapshot = config.getoption("--make-snapshots")
     is_ci = os.environ.get('JOB_NAME') is not None
-    test_failed = call.excinfo is not None
-    if test_failed and (make_snapshot or is_ci):
-        logger.info('Start generate fuel snapshot')
-        try:
-            task = SnapshotTask.start_snapshot_task({})
-            waiting.wait(lambda: task.is_finished,
-                         timeout_seconds=10 * 60,
-                         sleep_seconds=5,
-                         waiting_for='dump to be finished')
-            if task.status != 'ready':
-                raise Exception("Snapshot generating task ended with error. "
-                                "Task message: {message}".format(**task.data))
-
-            url = 'http://{fuel_ip}:8000{task.data[message]}'.format(
-                fuel_ip=fuel_ip, task=task)
-            response = requests.get(
-                url,
-                stream=True,
-                headers={'x-auth-token': APIClient.auth_token})
-
-            test_name = item.nodeid
-            logger.info('Making snapshot to test {}'.format(test_name))
-            filename = re.sub('[^\w\s-]', '_', test_name).strip().lower()
-            _, ext = os.path.splitext(task.data['message'])
-            ext = ext or '.tar'
-            path = os.path.join('snapshots', filename + ext)
-
-            with open(path, 'wb') as f:
-                for chunk in response.iter_content(65536):
-                    f.write(chunk)
-        except Exception as e:
-            logger.warning(e)
+    report = outcome.get_result()
+    if report.failed and (make_snapshot or is_ci):
+        path = get_worker(config).request(fuel_ip, item.nodeid)
+        logger.info('Fuel snapshot for {0} will be saved to {1}'.format(
+            item.nodeid, path))
+        link_to_report(item, report, path)
+
+
+def pytest_unconfigure(config):
+    worker = getattr(config, '_fuel_snapshots', None)
+    if worker is not None:
+        logger.info('Wait for fuel snapshots')
+        worker.stop()
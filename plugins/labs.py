@@ -0,0 +1,225 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run tests on several labs in parallel with pytest-xdist
+
+Labs are described with inventory file (YAML or JSON)::
+
+    - name: lab1
+      env: devops_env_1         # --env
+      snapshot: ready_with_3ha  # --snapshot
+      fuel_ip: 10.109.0.2       # --fuel-ip (optional)
+      cluster: env_1            # --cluster (optional)
+      checks:                   # `check_env_` guards values (optional)
+        is_ha: true
+        is_ceph_enabled: false
+
+    $ py.test mos_tests --labs labs.yaml --labs-durations report.xml
+
+One xdist worker is started for each lab. Every worker collects all tests
+and computes the same sharding: tests (incremental classes as a whole) are
+assigned to labs, whose checks don't contradict `check_env_` marker, with
+longest processing time first rule. Durations are taken from junit report
+of previous run (if passed) or from `plugins.durations` history. Each
+worker deselects tests of other labs.
+"""
+
+import logging
+import re
+import time
+from xml.etree import ElementTree
+
+import pytest
+import yaml
+
+from plugins.devops import split_units
+from plugins.durations import DEFAULT_DURATION
+from plugins.durations import get_history
+from plugins.testrail_id import SUFFIX_RE
+
+logger = logging.getLogger(__name__)
+
+GUARD_RESERVED = {'or', 'and', 'not', '(', ')'}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--labs",
+                     action="store",
+                     help="Labs inventory file to run tests on all labs in "
+                          "parallel (requires pytest-xdist)")
+    parser.addoption("--labs-durations",
+                     action="store",
+                     help="Junit report of previous run with tests durations "
+                          "for sharding")
+
+
+def load_labs(path):
+    with open(path) as f:
+        labs = yaml.safe_load(f)
+    for lab in labs:
+        lab.setdefault('checks', {})
+    return labs
+
+
+def _junit_key(classname, name):
+    # Durations should be found, even if testrail_id suffix is changed
+    return classname, SUFFIX_RE.sub('', name)
+
+
+def item_junit_key(item):
+    """Return junit (classname, name) of item like junit report does"""
+    path, bracket, params = item.nodeid.partition('[')
+    names = [x for x in path.split('::') if x != '()']
+    names[0] = re.sub(r'\.py$', '', names[0].replace('/', '.'))
+    return _junit_key('.'.join(names[:-1]), names[-1] + bracket + params)
+
+
+def load_durations(path):
+    """Read tests durations from junit report
+
+    :return: dict with junit keys and durations in seconds
+    """
+    durations = {}
+    for _, element in ElementTree.iterparse(path):
+        if element.tag == 'testcase':
+            key = _junit_key(element.get('classname', ''),
+                             element.get('name', ''))
+            durations[key] = float(element.get('time') or 0)
+            element.clear()
+    return durations
+
+
+def lab_can_run(lab, item):
+    """Check that lab checks don't contradict `check_env_` marker
+
+    Guards, which are absent in lab checks, are considered as passed (test
+    will check them on runtime).
+    """
+    marker = item.get_marker('check_env_')
+    if not marker:
+        return True
+    expression = ' and '.join(marker.args)
+    expression = expression.replace('(', ' ( ').replace(')', ' ) ')
+    tokens = []
+    for token in expression.split():
+        if token in GUARD_RESERVED:
+            tokens.append(token)
+        elif token in lab['checks']:
+            tokens.append(str(bool(lab['checks'][token])))
+        else:
+            return True
+    return eval(' '.join(tokens))
+
+
+def shard(items, labs, predict=lambda item: DEFAULT_DURATION):
+    """Assign tests to labs
+
+    :param predict: callable to predict test duration in seconds
+    :return: list of items lists (for each lab), original order is kept
+    """
+    units = []
+    for position, unit in enumerate(split_units(items)):
+        duration = sum(predict(x) for x in unit)
+        eligible = [i for i, lab in enumerate(labs)
+                    if all(lab_can_run(lab, x) for x in unit)]
+        # Test will be skipped on any lab
+        eligible = eligible or list(range(len(labs)))
+        units.append((duration, position, unit, eligible))
+
+    loads = [0] * len(labs)
+    assigned = [[] for _ in labs]
+    for duration, position, unit, eligible in sorted(
+            units, key=lambda x: (-x[0], x[1])):
+        index = min(eligible, key=lambda i: (loads[i], i))
+        loads[index] += duration
+        assigned[index].append((position, unit))
+
+    for lab, load, lab_units in zip(labs, loads, assigned):
+        logger.info('Lab {0}: {1} tests, ~{2:.0f} min'.format(
+            lab['name'], sum(len(x) for _, x in lab_units), load / 60))
+    return [[x for _, unit in sorted(lab_units) for x in unit]
+            for lab_units in assigned]
+
+
+def _worker_input(obj):
+    # `slaveinput` is used by pytest-xdist < 1.22
+    return getattr(obj, 'workerinput', getattr(obj, 'slaveinput', None))
+
+
+def get_worker_id(config):
+    """Return xdist worker index (None on master or without xdist)"""
+    worker_input = _worker_input(config)
+    if worker_input is None:
+        return None
+    worker_id = worker_input.get('workerid', worker_input.get('slaveid'))
+    return int(worker_id.lstrip('gw'))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    path = config.getoption("--labs")
+    if path is None:
+        return
+    labs = load_labs(path)
+    worker_id = get_worker_id(config)
+    if worker_id is None:
+        if not config.pluginmanager.hasplugin('xdist'):
+            raise pytest.UsageError('--labs requires pytest-xdist')
+        # Each worker runs its own (deselected) part of tests
+        config.option.dist = 'each'
+        config.option.numprocesses = len(labs)
+        config.option.tx = ['popen'] * len(labs)
+        config._labs_started = time.time()
+        return
+    lab = labs[worker_id]
+    logger.info('Worker {0} runs tests on lab {1}'.format(worker_id,
+                                                          lab['name']))
+    config.option.env = lab.get('env')
+    config.option.snapshot = lab.get('snapshot')
+    config.option.fuel_ip = lab.get('fuel_ip')
+    if lab.get('cluster'):
+        config.option.cluster = [lab['cluster']]
+    config._labs = labs
+    config._lab_index = worker_id
+    config._labs_started = _worker_input(config)['labs_started']
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_configure_node(node):
+    # Workers should shard with the same history, so durations of tests,
+    # which are already finished by other workers, are ignored
+    _worker_input(node)['labs_started'] = node.config._labs_started
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    labs = getattr(config, '_labs', None)
+    if labs is None:
+        return
+    durations_path = config.getoption("--labs-durations")
+    history = get_history(config)
+    if durations_path:
+        durations = load_durations(durations_path)
+        predict = lambda x: durations.get(item_junit_key(x),
+                                          DEFAULT_DURATION)
+    elif history is not None:
+        predict = history.predict
+    else:
+        predict = lambda x: DEFAULT_DURATION
+    selected = shard(items, labs, predict)[config._lab_index]
+    selected_ids = set(id(x) for x in selected)
+    deselected = [x for x in items if id(x) not in selected_ids]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    items[:] = selected
@@ -14,10 +14,20 @@
 
 from __future__ import print_function
 from collections import defaultdict
+import re
 import unittest
 
 import pytest
 
+SUFFIX_RE = re.compile(r'\[\((\d+)\)\]$')
+
+
+def get_testrail_id(name):
+    """Return testrail_id from test name suffix (or None)"""
+    match = SUFFIX_RE.search(name)
+    if match:
+        return match.group(1)
+
 
 def pytest_addoption(parser):
     parser.addoption("--check-testrail-id", action="store_true",
@@ -0,0 +1,122 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Post results to TestRail run while tests are running
+
+Only tests with `testrail_id` marker are reported. Results are posted in
+batches (see `tools/report_results.ResultsUploader`), the rest of results is
+posted at the end of session.
+"""
+
+import logging
+import os
+import sys
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+TOOLS_DIR = os.path.join(os.path.dirname(__file__), '..', 'tools')
+
+# Outcomes of test phases from the best to the worst
+STATUSES = ('passed', 'skipped', 'failed')
+
+
+def pytest_addoption(parser):
+    parser.addoption("--testrail-run-id",
+                     action="store",
+                     help="Post results to TestRail run with this id")
+    parser.addoption("--testrail-suite-id",
+                     action="store",
+                     help="TestRail suite id of run")
+    parser.addoption("--testrail-batch-size",
+                     action="store",
+                     type=int,
+                     default=20,
+                     help="Results count to be posted at once")
+
+
+def pytest_configure(config):
+    run_id = config.getoption("--testrail-run-id")
+    if run_id is None:
+        return
+    # tools modules use implicit relative imports
+    sys.path.insert(0, TOOLS_DIR)
+    from report_results import ResultsUploader
+    from testrail_client import TestRailProject
+
+    # Same variables as `tools/settings.TestRailSettings`, that module is not
+    # imported to keep its scripts setup out of tests session
+    client = TestRailProject(
+        url=os.environ.get('TESTRAIL_URL', 'https://mirantis.testrail.com'),
+        user=os.environ.get('TESTRAIL_USER', 'user@example.com'),
+        password=os.environ.get('TESTRAIL_PASSWORD', 'password'),
+        project=os.environ.get('TESTRAIL_PROJECT', 'Mirantis OpenStack'))
+    config._testrail_uploader = ResultsUploader(
+        client, run_id, config.getoption("--testrail-suite-id"),
+        batch_size=config.getoption("--testrail-batch-size"))
+
+
+def _post(uploader, result=None):
+    from testrail import APIError
+    try:
+        if result is None:
+            uploader.flush()
+        else:
+            uploader.add(result)
+    except APIError as e:
+        # Batch will be posted with next results
+        logger.warning("Can't post results to TestRail: {0}".format(e))
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Post single result for item after teardown with worst outcome"""
+    outcome = yield
+    uploader = getattr(item.config, '_testrail_uploader', None)
+    if uploader is None:
+        return
+    report = outcome.get_result()
+    if report.passed:
+        status = 'passed'
+    elif report.skipped:
+        status = 'skipped'
+    else:
+        status = 'failed'
+    comments = report.longrepr
+    if isinstance(comments, tuple):
+        # (path, lineno, reason) for skipped tests
+        comments = comments[2]
+    elif comments is not None:
+        comments = str(comments)
+    duration = report.duration
+    previous = getattr(item, '_testrail_result', None)
+    if previous is not None:
+        duration += previous[1]
+        if STATUSES.index(previous[0]) >= STATUSES.index(status):
+            status, comments = previous[0], previous[2]
+    item._testrail_result = (status, duration, comments)
+    if report.when != 'teardown':
+        return
+    del item._testrail_result
+    from report_results import make_result
+    result = make_result(item.name, status, duration, comments)
+    if result is not None:
+        _post(uploader, result)
+
+
+def pytest_unconfigure(config):
+    uploader = getattr(config, '_testrail_uploader', None)
+    if uploader is not None:
+        _post(uploader)
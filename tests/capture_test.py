@@ -0,0 +1,129 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import subprocess
+
+import pytest
+
+from mos_tests.functions import capture
+from mos_tests.functions.capture import Flow
+from mos_tests.functions.capture import FlowCounter
+from mos_tests.functions import common
+
+TCPDUMP_LINES = [
+    '1476880000.100000 Out fa:16:3e:00:00:01 ethertype IPv4 (0x0800), '
+    'length 98: 10.0.0.1 > 10.0.0.2: ICMP echo request, id 1, seq 1, '
+    'length 64',
+    '1476880000.200000 Out fa:16:3e:00:00:01 ethertype IPv4 (0x0800), '
+    'length 98: 10.0.0.1 > 10.0.0.2: ICMP echo request, id 1, seq 2, '
+    'length 64',
+    '1476880000.300000 B fa:16:3e:00:00:02 ethertype ARP (0x0806), '
+    'length 44: Request who-has 10.0.0.1 tell 10.0.0.2, length 28',
+    'tcpdump: verbose output suppressed, use -v or -vv for full protocol',
+]
+
+
+class FakeChannel(object):
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.closed = False
+
+    def exit_status_ready(self):
+        return self.proc.poll() is not None
+
+    def close(self):
+        self.closed = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class FakeRemote(object):
+    """SSHClient running commands locally"""
+
+    def execute_async(self, command):
+        proc = subprocess.Popen(command, shell=True,
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        return FakeChannel(proc), proc.stdin, proc.stdout, proc.stderr
+
+    def execute(self, command, verbose=False):
+        subprocess.call(command, shell=True)
+
+
+@pytest.mark.parametrize('kwargs, command', [
+    ({}, 'tcpdump -i any'),
+    ({'interface': None, 'snaplen': 128, 'args': ' -n -tt '},
+     'tcpdump -s 128 -n -tt'),
+    ({'interface': 'br-mesh', 'bpf_filter': 'udp port 4789'},
+     "tcpdump -i br-mesh 'udp port 4789'"),
+    ({'netns': 'qrouter-1', 'bpf_filter': 'icmp'},
+     'ip netns exec qrouter-1 tcpdump -i any icmp'),
+])
+def test_tcpdump_command(kwargs, command):
+    assert capture.tcpdump_command(**kwargs) == command
+
+
+def test_parse_summary():
+    assert capture.parse_summary(TCPDUMP_LINES[0]) == (
+        1476880000.1, TCPDUMP_LINES[0].split(' ', 1)[1])
+    assert capture.parse_summary(TCPDUMP_LINES[3]) == (None,
+                                                       TCPDUMP_LINES[3])
+
+
+def test_parse_counters():
+    counters = capture.parse_counters([
+        '2 196 IPv4 10.0.0.1 10.0.0.2',
+        '1 44 ARP',
+        'garbage',
+    ])
+
+    assert counters == {
+        Flow('IPv4', '10.0.0.1', '10.0.0.2'): FlowCounter(2, 196),
+        Flow('ARP', None, None): FlowCounter(1, 44),
+    }
+
+
+def test_counters_awk():
+    awk = subprocess.Popen(['awk', capture.COUNTERS_AWK],
+                           stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    output = awk.communicate('\n'.join(TCPDUMP_LINES).encode('utf-8'))[0]
+
+    assert capture.parse_counters(output.decode('utf-8').splitlines()) == {
+        Flow('IPv4', '10.0.0.1', '10.0.0.2'): FlowCounter(2, 196),
+        Flow('ARP', None, None): FlowCounter(1, 44),
+    }
+
+
+def test_remote_tcpdump():
+    lines = []
+    tcpdump = capture.RemoteTcpdump(
+        FakeRemote(), "sh -c 'echo $$; echo foo; echo bar; exec sleep 30'",
+        callback=lines.append)
+    tcpdump.start()
+    assert tcpdump.pid.isdigit()
+    common.wait(lambda: len(lines) == 2, timeout_seconds=10)
+
+    assert tcpdump.stop() == ['foo', 'bar']
+    assert lines == ['foo', 'bar']
+
+
+def test_remote_tcpdump_start_failure():
+    tcpdump = capture.RemoteTcpdump(FakeRemote(), 'echo no tcpdump >&2')
+
+    with pytest.raises(Exception):
+        tcpdump.start()
+    assert tcpdump.errors == ['no tcpdump']
@@ -0,0 +1,132 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+pytest_plugins = "pytester"
+
+
+def test_disjoint_side_effects_share_revert(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        @pytest.mark.side_effects('nova')
+        def test_a():
+            pass
+
+        @pytest.mark.side_effects('neutron')
+        def test_b():
+            pass
+
+        @pytest.mark.side_effects('cinder')
+        def test_c():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.devops", "--revert-plan")
+    result.stdout.fnmatch_lines("*: 0 (~0 min) before scheduling, 0 *")
+
+
+def test_overlapping_side_effects_are_reordered(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        @pytest.mark.side_effects('nova')
+        def test_a():
+            pass
+
+        @pytest.mark.side_effects('nova', 'glance')
+        def test_b():
+            pass
+
+        @pytest.mark.side_effects('neutron')
+        def test_c():
+            pass
+
+        @pytest.mark.undestructive
+        def test_d():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "--schedule-reverts", "--revert-plan")
+    result.stdout.fnmatch_lines(
+        "*: 2 (~30 min) before scheduling, 1 (~15 min) after")
+
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "--schedule-reverts", "--verbose")
+    result.stdout.fnmatch_lines([
+        "*::test_d PASSED*",
+        "*::test_a PASSED*",
+        "*::test_c PASSED*",
+        "*::test_b PASSED*",
+    ])
+
+
+def test_revert_before_undestructive_test(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        @pytest.mark.side_effects('nova')
+        def test_a():
+            pass
+
+        @pytest.mark.undestructive
+        def test_b():
+            pass
+
+        @pytest.mark.side_effects('neutron')
+        def test_c():
+            pass
+
+        def test_d():
+            pass
+
+        @pytest.mark.side_effects('cinder')
+        def test_e():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "--schedule-reverts", "--revert-plan")
+    result.stdout.fnmatch_lines(
+        "*: 3 (~45 min) before scheduling, 1 (~15 min) after")
+
+
+def test_incremental_class_is_not_divided(testdir):
+    testdir.makepyfile("""
+        import pytest
+
+        @pytest.mark.incremental
+        class TestSmth(object):
+
+            @pytest.mark.undestructive
+            def test_a(self):
+                pass
+
+            @pytest.mark.side_effects('nova')
+            def test_b(self):
+                pass
+
+        @pytest.mark.side_effects('nova')
+        def test_c():
+            pass
+
+        @pytest.mark.undestructive
+        def test_d():
+            pass
+    """)
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "--schedule-reverts", "--verbose")
+    result.stdout.fnmatch_lines([
+        "*::test_d PASSED*",
+        "*::test_c PASSED*",
+        "*::TestSmth::test_a PASSED*",
+        "*::TestSmth::test_b PASSED*",
+    ])
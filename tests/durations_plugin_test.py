@@ -0,0 +1,48 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+pytest_plugins = "pytester"
+
+
+def test_forecast_uses_history(testdir):
+    testdir.makepyfile("""
+        import time
+
+        def test_a():
+            time.sleep(0.1)
+
+        def test_b():
+            pass
+    """)
+    db = str(testdir.tmpdir.join('durations.db'))
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "-p", "plugins.durations",
+                               "--durations-db", db, "--durations-forecast")
+    result.stdout.fnmatch_lines([
+        "*durations forecast*",
+        "Tests: 2 (0 with history), ~2 min",
+        "Session: ~2 min",
+    ])
+
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "-p", "plugins.durations",
+                               "--durations-db", db)
+    result.assert_outcomes(passed=2)
+
+    result = testdir.runpytest("-p", "plugins.devops",
+                               "-p", "plugins.durations",
+                               "--durations-db", db, "--durations-forecast")
+    result.stdout.fnmatch_lines([
+        "Tests: 2 (2 with history), ~0 min",
+    ])
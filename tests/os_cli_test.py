@@ -0,0 +1,151 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import select
+import subprocess
+
+import pytest
+
+from mos_tests.functions import os_cli
+
+FAKE_SHELL = '''
+import sys
+
+instances = []
+
+
+class OpenStackShell(object):
+
+    def __init__(self):
+        instances.append(self)
+
+    def run(self, argv):
+        sys.stdout.write('options: %s\\n' % ' '.join(argv[:-2]))
+        return self.run_subcommand(argv[-2:])
+
+    def run_subcommand(self, argv):
+        if argv[0] == 'fail':
+            sys.stderr.write('%s failed\\n' % argv[1])
+            return 1
+        sys.stdout.write('%s %s in shell %s\\n' % (argv[0], argv[1],
+                                                   len(instances)))
+        return 0
+'''
+
+
+class FakeChannel(object):
+    """paramiko channel with local process"""
+
+    def __init__(self, env):
+        self.env = env
+        self.closed = False
+
+    def exec_command(self, command):
+        self.proc = subprocess.Popen(command, shell=True, env=self.env,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+
+    def _ready(self, stream):
+        return bool(select.select([stream], [], [], 0)[0])
+
+    def fileno(self):
+        return self.proc.stdout.fileno()
+
+    def sendall(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def recv_ready(self):
+        return self._ready(self.proc.stdout)
+
+    def recv_stderr_ready(self):
+        return self._ready(self.proc.stderr)
+
+    def recv(self, size):
+        return os.read(self.proc.stdout.fileno(), size)
+
+    def recv_stderr(self, size):
+        return os.read(self.proc.stderr.fileno(), size)
+
+    def exit_status_ready(self):
+        return self.proc.poll() is not None
+
+    def close(self):
+        self.closed = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class FakeRemote(object):
+    execution_timeout = 10
+    timeout = 10
+
+    def __init__(self, env):
+        self._ssh = self
+        self.env = env
+
+    def get_transport(self):
+        return self
+
+    def open_session(self, timeout):
+        return FakeChannel(self.env)
+
+
+@pytest.yield_fixture
+def session(tmpdir):
+    package = tmpdir.mkdir('openstackclient')
+    package.join('__init__.py').write('')
+    package.join('shell.py').write(FAKE_SHELL)
+    env = dict(os.environ, PYTHONPATH=str(tmpdir))
+    with os_cli.CLISession(FakeRemote(env), init_command='true') as session:
+        yield session
+
+
+def test_execute_many(session):
+    results = session.execute_many(['echo foo', 'echo bar >&2; false'])
+
+    assert results[0].stdout_string == 'foo'
+    assert results[0].is_ok
+    assert results[1].stderr_string == 'bar'
+    assert results[1]['exit_code'] == 1
+
+
+def test_openstack_batch_in_single_process(session):
+    results = os_cli.OpenStack(session).batch(
+        ['project list', 'user list'], flags='--insecure')
+
+    assert results == ['options: --insecure\nproject list in shell 1',
+                       'user list in shell 1']
+
+
+def test_openstack_batch_failure(session):
+    results = os_cli.os_execute_openstack_many(
+        session, ['fail first', 'user list'], fail_ok=True, merge_stderr=True)
+
+    assert results == ['first failedoptions:', 'user list in shell 1']
+    with pytest.raises(os_cli.exceptions.CommandFailed):
+        os_cli.os_execute_openstack_many(session, ['fail first'])
+
+
+def test_closed_session(session):
+    session.timeout = 1
+    session._chan.sendall('exit\n')
+
+    with pytest.raises(os_cli.CLISessionError):
+        session.execute_many(['true'])
@@ -0,0 +1,114 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import struct
+
+import pytest
+
+from mos_tests.functions import pcap
+
+
+def ip_header(src, dst, proto, payload_len):
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + payload_len, 0, 0, 64,
+                       proto, 0, socket.inet_aton(src),
+                       socket.inet_aton(dst))
+
+
+def ethernet(eth_type, payload):
+    return b'\x00' * 12 + struct.pack('!H', eth_type) + payload
+
+
+def icmp_packet(src, dst):
+    icmp = b'\x08\x00' + b'\x00' * 6
+    return ethernet(pcap.ETH_TYPE_IP,
+                    ip_header(src, dst, pcap.IP_PROTO_ICMP, len(icmp)) + icmp)
+
+
+def arp_packet(src, dst):
+    arp = (struct.pack('!HHBBH', 1, 0x0800, 6, 4, 1) + b'\x00' * 6 +
+           socket.inet_aton(src) + b'\x00' * 6 + socket.inet_aton(dst))
+    return ethernet(pcap.ETH_TYPE_ARP, arp)
+
+
+def vxlan_packet(vni, inner):
+    vxlan = struct.pack('!II', 0x08000000, vni << 8) + inner
+    udp = struct.pack('!HHHH', 40000, pcap.VXLAN_PORT, 8 + len(vxlan),
+                      0) + vxlan
+    ip = ip_header('10.0.0.1', '10.0.0.2', pcap.IP_PROTO_UDP, len(udp)) + udp
+    # Linux cooked capture header
+    return b'\x00' * 14 + struct.pack('!H', pcap.ETH_TYPE_IP) + ip
+
+
+def write_pcap(path, linktype, frames):
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535,
+                            linktype))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack('<IIII', i, 0, len(frame), len(frame)))
+            f.write(frame)
+
+
+@pytest.fixture
+def vxlan_pcap(tmpdir):
+    path = str(tmpdir.join('vxlan.pcap'))
+    write_pcap(path, pcap.LINKTYPE_LINUX_SLL, [
+        vxlan_packet(100, icmp_packet('192.168.1.3', '192.168.1.4')),
+        vxlan_packet(100, arp_packet('192.168.1.3', '192.168.1.5')),
+        vxlan_packet(200, icmp_packet('192.168.1.4', '192.168.1.3')),
+    ])
+    return path
+
+
+def test_decode_vxlan(vxlan_pcap):
+    packets = pcap.read_packets(vxlan_pcap)
+
+    assert [x.vni for x in packets] == [100, 100, 200]
+    assert packets[0].src == '192.168.1.3'
+    assert packets[0].dst == '192.168.1.4'
+    assert packets[0].proto == pcap.IP_PROTO_ICMP
+    assert packets[1].arp_src == '192.168.1.3'
+    assert packets[1].arp_dst == '192.168.1.5'
+
+
+def test_match_all_conditions_at_once(vxlan_pcap):
+    result = pcap.match(vxlan_pcap,
+                        other_vni=pcap.vni_is_not(100),
+                        arp=pcap.arp('192.168.1.3', '192.168.1.5'),
+                        icmp=pcap.icmp('192.168.1.3', '192.168.1.4'),
+                        no_icmp=pcap.icmp('192.168.1.5', '192.168.1.3'))
+
+    assert [x.index for x in result['other_vni']] == [3]
+    assert [x.index for x in result['arp']] == [2]
+    assert [x.index for x in result['icmp']] == [1]
+    assert result['no_icmp'] == []
+
+
+def test_decode_ethernet(tmpdir):
+    path = str(tmpdir.join('tap.pcap'))
+    write_pcap(path, pcap.LINKTYPE_ETHERNET,
+               [arp_packet('10.1.1.3', '10.1.1.4')])
+
+    packets = pcap.read_packets(path)
+
+    assert len(packets) == 1
+    assert packets[0].vni is None
+    assert packets[0].arp_src == '10.1.1.3'
+
+
+def test_empty_file(tmpdir):
+    path = tmpdir.join('empty.pcap')
+    path.write('')
+
+    assert pcap.read_packets(str(path)) == []
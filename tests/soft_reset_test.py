@@ -0,0 +1,293 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+
+import pytest
+
+from mos_tests.functions.soft_reset import SoftReset
+
+_ids = itertools.count()
+
+
+def new_id(prefix):
+    return '{0}-{1}'.format(prefix, next(_ids))
+
+
+class Obj(object):
+
+    def __init__(self, id, **kwargs):
+        self.id = id
+        self.name = id
+        self.__dict__.update(kwargs)
+
+    def get_keys(self):
+        return dict(self.extra_specs)
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class FakeManager(object):
+
+    def __init__(self, *items):
+        self.items = {x.id: x for x in items}
+
+    def list(self, *args, **kwargs):
+        return list(self.items.values())
+
+    def get(self, id):
+        return self.items[id]
+
+    def delete(self, id):
+        del self.items[id]
+
+
+class FakeNeutron(object):
+
+    def __init__(self):
+        self.networks = {}
+        self.ports = {}
+        self.routers = {}
+        self.floatingips = {}
+        self.security_groups = {}
+        self.quotas = {}
+
+    def create_network(self):
+        network = {'id': new_id('net'), 'subnets': [new_id('subnet')]}
+        self.networks[network['id']] = network
+        return network
+
+    def create_port(self, network_id, device_id='', device_owner=''):
+        port = {'id': new_id('port'), 'network_id': network_id,
+                'device_id': device_id, 'device_owner': device_owner,
+                'fixed_ips': [
+                    {'subnet_id': self.networks[network_id]['subnets'][0]}]}
+        self.ports[port['id']] = port
+        return port
+
+    def create_router(self):
+        router = {'id': new_id('router'), 'external_gateway_info': None}
+        self.routers[router['id']] = router
+        return router
+
+    def add_interface_router(self, router_id, network_id):
+        self.create_port(network_id, router_id, 'network:router_interface')
+
+    def create_security_group(self):
+        group = {'id': new_id('sg'), 'security_group_rules': []}
+        self.security_groups[group['id']] = group
+        return group
+
+    def list_networks(self):
+        return {'networks': list(self.networks.values())}
+
+    def list_ports(self, **filters):
+        return {'ports': [x for x in self.ports.values()
+                          if all(x[k] == v for k, v in filters.items())]}
+
+    def list_routers(self):
+        return {'routers': list(self.routers.values())}
+
+    def list_floatingips(self):
+        return {'floatingips': list(self.floatingips.values())}
+
+    def list_security_groups(self):
+        return {'security_groups': list(self.security_groups.values())}
+
+    def show_quota(self, project_id):
+        return {'quota': dict(self.quotas.get(project_id, {}))}
+
+    def delete_port(self, port_id):
+        if self.ports[port_id]['device_owner'] == 'network:router_interface':
+            raise Exception('Port {0} has owner router'.format(port_id))
+        del self.ports[port_id]
+
+    def delete_network(self, network_id):
+        if self.list_ports(network_id=network_id)['ports']:
+            raise Exception('Network {0} is in use'.format(network_id))
+        del self.networks[network_id]
+
+    def remove_interface_router(self, router_id, body):
+        del self.ports[body['port_id']]
+
+    def remove_gateway_router(self, router_id):
+        self.routers[router_id]['external_gateway_info'] = None
+
+    def delete_router(self, router_id):
+        del self.routers[router_id]
+
+    def delete_security_group(self, group_id):
+        del self.security_groups[group_id]
+
+    def delete_floatingip(self, floatingip_id):
+        del self.floatingips[floatingip_id]
+
+
+class FakeClient(object):
+
+    def __init__(self, **managers):
+        self.__dict__.update(managers)
+
+
+class FakeOSConn(object):
+
+    def __init__(self):
+        self.project = Obj('admin')
+        self.neutron = FakeNeutron()
+        self.nova = FakeClient(
+            servers=FakeManager(),
+            flavors=FakeManager(Obj('m1.tiny', extra_specs={})),
+            keypairs=FakeManager(),
+            quotas=FakeManager(Obj('admin', cores=20)))
+        self.cinder = FakeClient(
+            volumes=FakeManager(),
+            volume_snapshots=FakeManager(),
+            quotas=FakeManager(Obj('admin', volumes=10)))
+        self.glance = FakeClient(images=FakeManager(Obj('cirros')))
+        self.heat = FakeClient(stacks=FakeManager())
+        self.keystone = FakeClient(users=FakeManager(Obj('admin')),
+                                   projects=FakeManager(self.project))
+        self.network = self.neutron.create_network()
+        self.router = self.neutron.create_router()
+        self.neutron.add_interface_router(self.router['id'],
+                                          self.network['id'])
+        self.security_group = self.neutron.create_security_group()
+
+
+PCS_STATUS = """<crm_mon>
+  <nodes>
+    <node name="node-1" online="true"/>
+  </nodes>
+  <resources>
+    <clone id="clone_p_haproxy">
+      <resource id="p_haproxy" resource_agent="ocf::fuel:ns_haproxy"
+                role="{role}" active="{active}" failed="false">
+        <node name="node-1"/>
+      </resource>
+    </clone>
+  </resources>
+</crm_mon>"""
+
+
+class FakeResult(object):
+
+    def __init__(self, stdout_string):
+        self.is_ok = True
+        self.stdout_string = stdout_string
+
+
+class FakeNode(object):
+    """Controller node, its SSH client returns `pcs status` of env"""
+
+    def __init__(self, env):
+        self.env = env
+        self.data = {'online': True}
+
+    def ssh(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, command, verbose=True):
+        return FakeResult(self.env.pcs_status)
+
+
+class FakeEnv(object):
+
+    def __init__(self):
+        self.problems = {}
+        self.pcs_status = PCS_STATUS.format(role='Started', active='true')
+
+    def get_readiness_problems(self):
+        return self.problems
+
+    def get_nodes_by_role(self, role):
+        return [FakeNode(self)]
+
+
+@pytest.fixture
+def os_conn():
+    return FakeOSConn()
+
+
+@pytest.fixture
+def env():
+    return FakeEnv()
+
+
+@pytest.fixture
+def soft_reset(env, os_conn):
+    return SoftReset(env, os_conn, timeout=1)
+
+
+def test_created_resources_are_deleted(soft_reset, os_conn):
+    neutron = os_conn.neutron
+    os_conn.nova.servers.items['vm'] = Obj('vm')
+    network = neutron.create_network()
+    neutron.create_port(network['id'])
+    router = neutron.create_router()
+    neutron.add_interface_router(router['id'], network['id'])
+
+    assert soft_reset.reset()
+
+    assert os_conn.nova.servers.items == {}
+    assert list(neutron.networks) == [os_conn.network['id']]
+    assert list(neutron.routers) == [os_conn.router['id']]
+    assert len(neutron.ports) == 1
+
+
+def test_deleted_baseline_resource(soft_reset, os_conn):
+    os_conn.glance.images.delete('cirros')
+
+    assert not soft_reset.reset()
+
+
+def test_damaged_env(soft_reset, env):
+    env.problems = {'nodes': ['node-1']}
+
+    assert not soft_reset.reset()
+
+
+def test_stopped_pacemaker_resource(soft_reset, env):
+    env.pcs_status = PCS_STATUS.format(role='Stopped', active='false')
+
+    assert not soft_reset.reset()
+
+
+@pytest.mark.parametrize('change', [
+    lambda c: c.network['subnets'].append('subnet'),
+    lambda c: c.neutron.create_port(c.network['id'], 'vm'),
+    lambda c: c.router.update(external_gateway_info={'network_id': 'ext'}),
+    lambda c: c.security_group['security_group_rules'].append({'id': 'r'}),
+    lambda c: c.nova.flavors.get('m1.tiny').extra_specs.update(cpu='x'),
+    lambda c: setattr(c.nova.quotas.get('admin'), 'cores', 40),
+    lambda c: c.neutron.quotas.update(admin={'port': 100}),
+], ids=['subnet', 'port', 'gateway', 'rule', 'extra_specs', 'nova_quota',
+        'neutron_quota'])
+def test_changed_baseline_resource(soft_reset, os_conn, change):
+    change(os_conn)
+
+    assert not soft_reset.reset()
+
+
+def test_interface_to_created_network(soft_reset, os_conn):
+    network = os_conn.neutron.create_network()
+    os_conn.neutron.add_interface_router(os_conn.router['id'], network['id'])
+
+    assert not soft_reset.reset()
@@ -0,0 +1,260 @@
+#    Copyright 2016 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import sys
+import threading
+
+import pytest
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+
+# tools modules use implicit relative imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tools'))
+
+import report_results  # noqa
+from test_result import TestResult  # noqa
+import testrail  # noqa
+from testrail_client import TestRailProject  # noqa
+
+PAGE_SIZE = 250
+
+
+class HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FakeTestRail(object):
+    """In-memory TestRail with paginated bulk methods"""
+
+    def __init__(self, cases_count):
+        self.requests = []
+        self.failures = []
+        self.post_failures = []
+        self.posted = []
+        self.cases = [{'id': i, 'suite_id': 1, 'title': 'case_{0}'.format(i),
+                       'custom_test_group': 'group_{0}'.format(i)}
+                      for i in range(1, cases_count + 1)]
+
+    def get(self, method, args, params):
+        if method == 'get_projects':
+            return [{'id': 1, 'name': 'Project'}]
+        if method == 'get_statuses':
+            return [{'id': 1, 'name': 'passed'}, {'id': 5, 'name': 'failed'},
+                    {'id': 6, 'name': 'skipped'}]
+        if method == 'get_cases':
+            offset = int(params.get('offset', 0))
+            page = {'offset': offset, 'limit': PAGE_SIZE,
+                    'cases': self.cases[offset:offset + PAGE_SIZE],
+                    '_links': {'next': None}}
+            if offset + PAGE_SIZE < len(self.cases):
+                page['_links']['next'] = (
+                    '/api/v2/get_cases/1&suite_id=1&offset={0}'.format(
+                        offset + PAGE_SIZE))
+            return page
+        raise KeyError(method)
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, code, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def parse(self):
+                api = self.path.split('/api/v2/', 1)[1]
+                parts = api.split('&')
+                params = dict(x.split('=', 1) for x in parts[1:])
+                method, _, args = parts[0].partition('/')
+                fake.requests.append((self.command, method))
+                return method, args, params
+
+            def do_GET(self):
+                method, args, params = self.parse()
+                if fake.failures:
+                    return self.respond(fake.failures.pop(0), {})
+                self.respond(200, fake.get(method, args, params))
+
+            def do_POST(self):
+                method, args, params = self.parse()
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length))
+                if fake.post_failures:
+                    return self.respond(fake.post_failures.pop(0), {})
+                fake.posted.append(body)
+                self.respond(200, {})
+
+        Handler.protocol_version = 'HTTP/1.1'
+        return Handler
+
+
+@pytest.yield_fixture
+def fake_testrail():
+    fake = FakeTestRail(cases_count=2000)
+    server = HTTPServer(('127.0.0.1', 0), fake.handler())
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    fake.url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.yield_fixture
+def project(fake_testrail):
+    project = TestRailProject(fake_testrail.url, 'user', 'password',
+                              'Project')
+    yield project
+    project.client.session.close()
+
+
+def test_publish_results_with_few_calls(fake_testrail, project):
+    results = [TestResult('case_{0}'.format(i), None, 'passed', 1)
+               for i in range(1, 1001)]
+    results += [TestResult(None, 'group_{0}'.format(i), 'failed', 1)
+                for i in range(1001, 2001)]
+
+    project.add_results_for_cases(run_id=1, suite_id=1,
+                                  tests_results=results)
+
+    posted = fake_testrail.posted[0]['results']
+    assert len(posted) == 2000
+    assert posted[0]['case_id'] == 1
+    assert posted[0]['status_id'] == 1
+    assert posted[-1]['case_id'] == 2000
+    assert posted[-1]['status_id'] == 5
+    # projects + statuses + 8 pages of cases + results
+    assert len(fake_testrail.requests) == 11
+
+
+def test_retry_on_rate_limit(fake_testrail, project):
+    project.client.backoff = 0
+    fake_testrail.failures = [429, 503]
+
+    assert project.get_status('failed')['id'] == 5
+    assert len(fake_testrail.requests) == 4
+
+
+def test_raise_after_retries(fake_testrail, project):
+    project.client.backoff = 0
+    project.client.retries = 1
+    fake_testrail.failures = [500, 500]
+
+    with pytest.raises(testrail.APIError):
+        project.get_statuses()
+
+
+def test_post_is_not_retried_on_gateway_error(fake_testrail, project):
+    project.client.backoff = 0
+    fake_testrail.post_failures = [502]
+
+    with pytest.raises(testrail.APIError):
+        project.client.send_post('add_results_for_cases/1', {'results': []})
+    posts = [x for x in fake_testrail.requests if x[0] == 'POST']
+    assert posts == [('POST', 'add_results_for_cases')]
+
+
+JUNIT_REPORT = """<?xml version="1.0" encoding="utf-8"?>
+<testsuite errors="0" failures="1" name="pytest" skips="1" tests="4">
+  <testcase classname="a" name="test_a[(1)]" time="1.5"/>
+  <testcase classname="a" name="test_b[param][(2)]" time="0.1">
+    <failure message="assert False">trace</failure>
+  </testcase>
+  <testcase classname="a" name="test_c" time="1"/>
+  <testcase classname="a" name="test_d[(4)]" time="0">
+    <skipped message="not supported"/>
+  </testcase>
+</testsuite>"""
+
+
+def make_results(*case_ids):
+    return [TestResult('test[({0})]'.format(x), None, 'passed', 1,
+                       case_id=x) for x in case_ids]
+
+
+def test_iter_junit_results(tmpdir):
+    report = tmpdir.join('report.xml')
+    report.write(JUNIT_REPORT)
+
+    results = list(report_results.iter_junit_results(str(report)))
+
+    assert [x.case_id for x in results] == [1, 2, 4]
+    assert [x.status for x in results] == ['passed', 'failed', 'skipped']
+    assert [x.duration for x in results] == ['2s', '1s', None]
+    assert results[1].comments == 'assert False\ntrace'
+    assert results[2].comments == 'not supported'
+
+
+def test_uploader_keeps_results_if_post_fails(fake_testrail, project):
+    project.client.backoff = 0
+    project.client.retries = 0
+    uploader = report_results.ResultsUploader(project, 1, 1, batch_size=2)
+    fake_testrail.post_failures = [500]
+
+    with pytest.raises(testrail.APIError):
+        for result in make_results(1, 2):
+            uploader.add(result)
+    uploader.add(make_results(3)[0])
+
+    posted = [x['results'] for x in fake_testrail.posted]
+    assert [[y['case_id'] for y in x] for x in posted] == [[1, 2, 3]]
+    assert uploader.posted == 3
+    assert uploader.batch == []
+
+
+def test_uploader_keeps_result_if_size_flush_fails(fake_testrail, project):
+    project.client.backoff = 0
+    project.client.retries = 0
+    results = make_results(1, 2, 3)
+    size = report_results.result_size(results[0])
+    uploader = report_results.ResultsUploader(project, 1, 1,
+                                              batch_bytes=size * 2)
+    uploader.add(results[0])
+    uploader.add(results[1])
+    fake_testrail.post_failures = [500]
+
+    with pytest.raises(testrail.APIError):
+        uploader.add(results[2])
+    assert [x.case_id for x in uploader.batch] == [1, 2, 3]
+
+    uploader.add(make_results(4)[0])
+    uploader.flush()
+
+    posted = [x['results'] for x in fake_testrail.posted]
+    assert [[y['case_id'] for y in x] for x in posted] == [[1, 2, 3], [4]]
+
+
+def test_report_junit_results_in_batches(fake_testrail, project, tmpdir):
+    report = tmpdir.join('report.xml')
+    report.write(JUNIT_REPORT)
+
+    count = report_results.report_junit_results(project, 1, 1, str(report),
+                                                batch_size=2)
+
+    assert count == 3
+    posted = [x['results'] for x in fake_testrail.posted]
+    assert [[y['case_id'] for y in x] for x in posted] == [[1, 2], [4]]
+    assert [y['status_id'] for x in posted for y in x] == [1, 5, 6]
+    assert posted[0][0]['elapsed'] == '2s'
+    assert posted[0][1]['comment'] == 'assert False\ntrace'
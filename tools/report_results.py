@@ -14,17 +14,150 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+import logging
+import math
 import optparse
+import os
+import sys
+from xml.etree import ElementTree
 
+# `plugins` package is imported from repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from settings import logger
-from settings import TestRailSettings
+from plugins.testrail_id import SUFFIX_RE  # noqa
 from testrail_client import TestRailProject
 from testrail import APIError
 from test_result import TestResult
 
 
-LOG = logger
+LOG = logging.getLogger(__name__)
+
+MAX_COMMENT_LENGTH = 32 * 1024
+
+
+def get_case_id(test_name):
+    """Return TestRail case id from test name suffix (or None)"""
+    match = SUFFIX_RE.search(test_name)
+    if match:
+        return int(match.group(1))
+
+
+def make_result(test_name, status, duration, comments=None):
+    """Make TestResult for test name with testrail_id suffix
+
+    :return: TestResult or None, if test has no case id
+    """
+    case_id = get_case_id(test_name)
+    if case_id is None:
+        return None
+    if comments and len(comments) > MAX_COMMENT_LENGTH:
+        comments = '...\n' + comments[-MAX_COMMENT_LENGTH:]
+    elapsed = '{0}s'.format(int(math.ceil(duration))) if duration else None
+    return TestResult(test_name, None, status, elapsed, comments=comments,
+                      case_id=case_id)
+
+
+def testcase_result(testcase):
+    """Convert junit `testcase` element to TestResult (or None)"""
+    status = 'passed'
+    comments = None
+    for child in testcase:
+        if child.tag in ('failure', 'error'):
+            status = 'failed'
+        elif child.tag == 'skipped' and status == 'passed':
+            status = 'skipped'
+        else:
+            continue
+        comments = '\n'.join(x for x in (child.get('message'), child.text)
+                             if x)
+    return make_result(testcase.get('name', ''), status,
+                       float(testcase.get('time') or 0), comments)
+
+
+def iter_junit_results(source):
+    """Iterate over TestResults of junit xml report
+
+    Report is parsed incrementally, each `testcase` element is dropped after
+    it is converted, so memory usage doesn't depend on report size.
+
+    :param source: path or file object
+    """
+    for _, element in ElementTree.iterparse(source):
+        if element.tag != 'testcase':
+            continue
+        result = testcase_result(element)
+        element.clear()
+        if result is not None:
+            yield result
+
+
+def result_size(result):
+    """Estimate size of result in request body"""
+    return len(json.dumps([result.description, result.url, result.comments,
+                           result.version])) + 256
+
+
+class ResultsUploader(object):
+    """Post results with `add_results_for_cases` in size bounded batches
+
+    Batch is posted when it has `batch_size` results or `batch_bytes`
+    estimated size. Batch is kept if post fails, so it will be retried on
+    next flush.
+    """
+
+    def __init__(self, client, run_id, suite_id, batch_size=100,
+                 batch_bytes=1024 * 1024):
+        self.client = client
+        self.run_id = run_id
+        self.suite_id = suite_id
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.batch = []
+        self.batch_length = 0
+        self.posted = 0
+
+    def add(self, result):
+        size = result_size(result)
+        try:
+            if self.batch and self.batch_length + size > self.batch_bytes:
+                self.flush()
+        finally:
+            # Result is kept for next flush even if post fails
+            self.batch.append(result)
+            self.batch_length += size
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        self.client.add_results_for_cases(self.run_id, self.suite_id,
+                                          self.batch)
+        self.posted += len(self.batch)
+        LOG.info('{0} results are posted to run {1} ({2} total)'.format(
+            len(self.batch), self.run_id, self.posted))
+        self.batch = []
+        self.batch_length = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+def report_junit_results(client, run_id, suite_id, source, **kwargs):
+    """Post all results from junit xml report to TestRail run
+
+    :param kwargs: `ResultsUploader` batch size arguments
+    :return: count of posted results
+    """
+    with ResultsUploader(client, run_id, suite_id, **kwargs) as uploader:
+        for result in iter_junit_results(source):
+            uploader.add(result)
+    return uploader.posted
 
 
 def report_test_results_for_run(client, run_name, suite_id, case_name, case_status):
@@ -41,6 +174,10 @@ def report_test_results_for_run(client, run_name, suite_id, case_name, case_stat
 
 
 def main():
+    import settings
+    from settings import TestRailSettings
+
+    settings.setup()
     parser = optparse.OptionParser(
         description='Publish the results of Automated Cloud Tests in TestRail')
     parser.add_option('-r', '--run-name', dest='run_name',
@@ -52,10 +189,20 @@ def main():
                            'the test run')
     parser.add_option('-n', '--case_name', dest='test_case_name', default="SimpleTestCase",
                       help='Name of the test case')
+    parser.add_option('-x', '--junit-xml', dest='junit_xml',
+                      help='Post all results of junit xml report '
+                           '(from `--junit-xml` pytest option)')
+    parser.add_option('--run-id', dest='run_id', type='int',
+                      help='The id of existing test run to post results to')
+    parser.add_option('--batch-size', dest='batch_size', type='int',
+                      default=100, help='Max results count in one request')
+    parser.add_option('--batch-bytes', dest='batch_bytes', type='int',
+                      default=1024 * 1024,
+                      help='Max estimated size of one request')
 
     (options, args) = parser.parse_args()
 
-    if options.run_name is None:
+    if options.run_name is None and options.run_id is None:
         raise optparse.OptionValueError('No run name was specified!')
 
     # STEP #1
@@ -71,6 +218,23 @@ def main():
     LOG.info('Tests suite is "{0}".'.format(the_suite['name']))
 
     try:
+        if options.junit_xml:
+            run_id = options.run_id
+            if run_id is None:
+                run_id = client.add_run(client.test_run_struct(
+                    name=options.run_name,
+                    suite_id=int(options.test_suite_id),
+                    milestone_id=client.get_milestone_by_name(
+                        TestRailSettings.milestone)['id'],
+                    description=options.run_name,
+                    config_ids=None))['id']
+            count = report_junit_results(client, run_id,
+                                         options.test_suite_id,
+                                         options.junit_xml,
+                                         batch_size=options.batch_size,
+                                         batch_bytes=options.batch_bytes)
+            LOG.info('{0} results are reported.'.format(count))
+            return
         report_test_results_for_run(client, options.run_name, options.test_suite_id, options.test_case_name, 'passed')
     except APIError as api_error:
         LOG.exception(api_error)
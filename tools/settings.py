@@ -16,17 +16,9 @@ import logging
 import os
 
 logger = logging.getLogger(__package__)
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-ch.setFormatter(formatter)
-logger.addHandler(ch)
-logger.setLevel(logging.INFO)
 
 LOGS_DIR = os.environ.get('LOGS_DIR', os.getcwd())
 
-os.environ["ENV_NAME"] = "some_environment"
-os.environ["ISO_PATH"] = "./fuel.iso"
-
 JENKINS = {
     'url': os.environ.get('JENKINS_URL', 'http://localhost/'),
     'version_artifact': os.environ.get('JENKINS_VERSION_ARTIFACT',
@@ -38,6 +30,23 @@ GROUPS_TO_EXPAND = [
     'prepare_slaves_5', 'prepare_slaves_9']
 
 
+def setup():
+    """Configure logging and environment of tools scripts
+
+    Should be called from scripts `main`, not on import, as tools modules
+    are imported by pytest plugins too.
+    """
+    ch = logging.StreamHandler()
+    formatter = logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s')
+    ch.setFormatter(formatter)
+    logger.addHandler(ch)
+    logger.setLevel(logging.INFO)
+
+    os.environ["ENV_NAME"] = "some_environment"
+    os.environ["ISO_PATH"] = "./fuel.iso"
+
+
 class LaunchpadSettings(object):
     """LaunchpadSettings."""  # TODO documentation
 
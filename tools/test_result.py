@@ -1,4 +1,6 @@
-from settings import logger
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class TestResult(object):
@@ -6,7 +8,7 @@ class TestResult(object):
 
     def __init__(self, name, group, status, duration, url=None,
                  version=None, description=None, comments=None,
-                 launchpad_bug=None, steps=None):
+                 launchpad_bug=None, steps=None, case_id=None):
         self.name = name
         self.group = group
         self._status = status
@@ -27,6 +29,7 @@ class TestResult(object):
             'custom_status2': ['in_progress']
         }
         self._steps = steps
+        self.case_id = case_id
 
     @property
     def version(self):
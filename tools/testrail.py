@@ -1,6 +1,5 @@
 #
-# TestRail API binding for Python 2.x (API v2, available since 
-# TestRail 3.0)
+# TestRail API binding for Python (API v2, available since TestRail 3.0)
 #
 # Learn more:
 #
@@ -9,16 +8,35 @@
 #
 # Copyright Gurock Software GmbH. See license.md for details.
 #
+# Requests are made with single keep-alive session. Requests rejected with
+# rate limit (429) or server (5xx) errors are retried with exponential
+# backoff.
+#
+
+import json
+import time
+
+import requests
 
-import urllib2, json, base64
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST requests are not idempotent, so they are retried only if they were
+# surely not processed by TestRail
+POST_RETRY_STATUSES = (429, 503)
 
-class APIClient:
-    def __init__(self, base_url):
+
+class APIClient(object):
+    def __init__(self, base_url, retries=5, backoff=1, timeout=60):
         self.user = ''
         self.password = ''
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
         if not base_url.endswith('/'):
             base_url += '/'
         self.__url = base_url + 'index.php?/api/v2/'
+        self.session = requests.Session()
+        self.session.headers['Content-Type'] = 'application/json'
+        self.requests_count = 0
 
     #
     # Send Get
@@ -34,6 +52,33 @@ class APIClient:
     def send_get(self, uri):
         return self.__send_request('GET', uri, None)
 
+    #
+    # Send Get All
+    #
+    # Issues GET requests for all pages of bulk API method and returns
+    # the joined list of entities. Works with both paginated (TestRail 6.7+,
+    # dict with `_links` and entities under `key`) and plain list responses.
+    #
+    # Arguments:
+    #
+    # uri                 The API method to call including parameters
+    #                     (e.g. get_cases/1&suite_id=2)
+    # key                 The name of entities list in paginated response
+    #                     (e.g. cases)
+    #
+    def send_get_all(self, uri, key):
+        result = []
+        while uri:
+            page = self.send_get(uri)
+            if isinstance(page, list):
+                return result + page
+            result.extend(page.get(key, []))
+            next_uri = (page.get('_links') or {}).get('next')
+            if not next_uri:
+                break
+            uri = next_uri.split('/api/v2/', 1)[-1]
+        return result
+
     #
     # Send POST
     #
@@ -50,35 +95,54 @@ class APIClient:
     def send_post(self, uri, data):
         return self.__send_request('POST', uri, data)
 
+    def __retry_delay(self, response, attempt):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return int(retry_after)
+        return self.backoff * 2 ** attempt
+
     def __send_request(self, method, uri, data):
         url = self.__url + uri
-        request = urllib2.Request(url)
-        if (method == 'POST'):
-            request.add_data(json.dumps(data))
-        auth = base64.b64encode('%s:%s' % (self.user, self.password))
-        request.add_header('Authorization', 'Basic %s' % auth)
-        request.add_header('Content-Type', 'application/json')
+        if method == 'POST':
+            data = json.dumps(data)
+            retry_statuses = POST_RETRY_STATUSES
+            retry_errors = requests.exceptions.ConnectTimeout
+        else:
+            retry_statuses = RETRY_STATUSES
+            retry_errors = requests.ConnectionError
+        for attempt in range(self.retries + 1):
+            self.requests_count += 1
+            try:
+                response = self.session.request(
+                    method, url, data=data, auth=(self.user, self.password),
+                    timeout=self.timeout)
+            except requests.ConnectionError as e:
+                if not isinstance(e, retry_errors) or attempt == self.retries:
+                    raise APIError('TestRail API is unavailable ({0})'.format(
+                        e))
+                response = None
+            else:
+                if (response.status_code not in retry_statuses or
+                        attempt == self.retries):
+                    break
+            time.sleep(self.__retry_delay(response, attempt))
 
-        e = None
         try:
-            response = urllib2.urlopen(request).read()
-        except urllib2.HTTPError as e:
-            response = e.read()
-
-        if response:
-            result = json.loads(response)
-        else:
+            result = response.json() if response.content else {}
+        except ValueError:
             result = {}
 
-        if e != None:
-            if result and 'error' in result:
+        if response.status_code >= 400:
+            if isinstance(result, dict) and 'error' in result:
                 error = '"' + result['error'] + '"'
             else:
                 error = 'No additional error message received'
-            raise APIError('TestRail API returned HTTP %s (%s)' % 
-                (e.code, error))
+            raise APIError('TestRail API returned HTTP %s (%s)' %
+                           (response.status_code, error))
 
         return result
 
+
 class APIError(Exception):
     pass
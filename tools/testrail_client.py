@@ -12,23 +12,47 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from settings import logger
+import logging
+
 from testrail import APIClient
 from testrail import APIError
 
+logger = logging.getLogger(__name__)
+
 
 class TestRailProject(object):
-    """TestRailProject."""  # TODO documentation
+    """TestRail project API wrapper
+
+    Rarely changed entities (statuses, milestones, configs) and case indexes
+    are fetched once and memoized, so results publishing makes few API calls
+    regardless of results count. Use `invalidate` to drop memoized data.
+    """
 
     def __init__(self, url, user, password, project):
         self.client = APIClient(base_url=url)
         self.client.user = user
         self.client.password = password
+        self._cache = {}
         self.project = self._get_project(project)
 
+    def _cached(self, key, getter):
+        if key not in self._cache:
+            self._cache[key] = getter()
+        return self._cache[key]
+
+    def invalidate(self, *keys):
+        """Drop memoized data (all, if no keys passed)
+
+        :param keys: cache keys, e.g. 'statuses' or ('cases', suite_id)
+        """
+        if not keys:
+            self._cache.clear()
+        for key in keys:
+            self._cache.pop(key, None)
+
     def _get_project(self, project_name):
         projects_uri = 'get_projects'
-        projects = self.client.send_get(uri=projects_uri)
+        projects = self.client.send_get_all(uri=projects_uri, key='projects')
         for project in projects:
             if project['name'] == project_name:
                 return project
@@ -68,7 +92,8 @@ class TestRailProject(object):
     def get_configs(self):
         configs_uri = 'get_configs/{project_id}'.format(
             project_id=self.project['id'])
-        return self.client.send_get(configs_uri)
+        return self._cached('configs',
+                            lambda: self.client.send_get(configs_uri))
 
     def get_config(self, config_id):
         for configs in self.get_configs():
@@ -88,7 +113,8 @@ class TestRailProject(object):
     def get_milestones(self):
         milestones_uri = 'get_milestones/{project_id}'.format(
             project_id=self.project['id'])
-        return self.client.send_get(uri=milestones_uri)
+        return self._cached('milestones', lambda: self.client.send_get_all(
+            uri=milestones_uri, key='milestones'))
 
     def get_milestone(self, milestone_id):
         milestone_uri = 'get_milestone/{milestone_id}'.format(
@@ -98,7 +124,7 @@ class TestRailProject(object):
     def get_milestone_by_name(self, name):
         for milestone in self.get_milestones():
             if milestone['name'] == name:
-                return self.get_milestone(milestone_id=milestone['id'])
+                return milestone
 
     def get_suites(self):
         suites_uri = 'get_suites/{project_id}'.format(
@@ -119,7 +145,7 @@ class TestRailProject(object):
             project_id=self.project['id'],
             suite_id=suite_id
         )
-        return self.client.send_get(sections_uri)
+        return self.client.send_get_all(sections_uri, key='sections')
 
     def get_section(self, section_id):
         section_uri = 'get_section/{section_id}'.format(section_id=section_id)
@@ -151,33 +177,58 @@ class TestRailProject(object):
             cases_uri = '{0}&section_id={section_id}'.format(
                 cases_uri, section_id=section_id
             )
-        return self.client.send_get(cases_uri)
+        return self.client.send_get_all(cases_uri, key='cases')
+
+    def get_cases_index(self, suite_id):
+        """Return memoized suite cases indexes
+
+        :return: tuple of dicts (cases by title, cases by custom_test_group),
+            first case wins for duplicated keys
+        """
+        def build():
+            by_title = {}
+            by_group = {}
+            for case in self.get_cases(suite_id):
+                by_title.setdefault(case['title'], case)
+                by_group.setdefault(case.get('custom_test_group'), case)
+            return by_title, by_group
+
+        return self._cached(('cases', int(suite_id)), build)
 
     def get_case(self, case_id):
         case_uri = 'get_case/{case_id}'.format(case_id=case_id)
         return self.client.send_get(case_uri)
 
     def get_case_by_name(self, suite_id, name, cases=None):
-        for case in cases or self.get_cases(suite_id):
+        if cases is None:
+            return self.get_cases_index(suite_id)[0].get(name)
+        for case in cases:
             if case['title'] == name:
-                return self.get_case(case_id=case['id'])
+                return case
 
     def get_case_by_group(self, suite_id, group, cases=None):
-        for case in cases or self.get_cases(suite_id):
+        if cases is None:
+            return self.get_cases_index(suite_id)[1].get(group)
+        for case in cases:
             if case['custom_test_group'] == group:
-                return self.get_case(case_id=case['id'])
+                return case
 
     def add_case(self, section_id, case):
         add_case_uri = 'add_case/{section_id}'.format(section_id=section_id)
-        return self.client.send_post(add_case_uri, case)
+        new_case = self.client.send_post(add_case_uri, case)
+        self.invalidate(('cases', int(new_case['suite_id'])))
+        return new_case
 
     def delete_case(self, case_id):
-        return self.client.send_post('delete_case/' + str(case_id), None)
+        result = self.client.send_post('delete_case/' + str(case_id), None)
+        self.invalidate(*[x for x in self._cache
+                          if isinstance(x, tuple) and x[0] == 'cases'])
+        return result
 
     def get_plans(self):
         plans_uri = 'get_plans/{project_id}'.format(
             project_id=self.project['id'])
-        return self.client.send_get(plans_uri)
+        return self.client.send_get_all(plans_uri, key='plans')
 
     def get_plan(self, plan_id):
         plan_uri = 'get_plan/{plan_id}'.format(plan_id=plan_id)
@@ -239,7 +290,7 @@ class TestRailProject(object):
     def get_runs(self):
         runs_uri = 'get_runs/{project_id}'.format(
             project_id=self.project['id'])
-        return self.client.send_get(uri=runs_uri)
+        return self.client.send_get_all(uri=runs_uri, key='runs')
 
     def get_run(self, run_id):
         run_uri = 'get_run/{run_id}'.format(run_id=run_id)
@@ -301,19 +352,20 @@ class TestRailProject(object):
 
     def get_statuses(self):
         statuses_uri = 'get_statuses'
-        return self.client.send_get(statuses_uri)
+        return self._cached('statuses',
+                            lambda: self.client.send_get(statuses_uri))
 
     def get_status(self, name):
-        for status in self.get_statuses():
-            if status['name'] == name:
-                return status
+        statuses = self._cached('statuses_by_name', lambda: {
+            x['name']: x for x in self.get_statuses()})
+        return statuses.get(name)
 
     def get_tests(self, run_id, status_id=None):
         tests_uri = 'get_tests/{run_id}'.format(run_id=run_id)
         if status_id:
             tests_uri = '{0}&status_id={1}'.format(tests_uri,
                                                    ','.join(status_id))
-        return self.client.send_get(tests_uri)
+        return self.client.send_get_all(tests_uri, key='tests')
 
     def get_test(self, test_id):
         test_uri = 'get_test/{test_id}'.format(test_id=test_id)
@@ -351,7 +403,7 @@ class TestRailProject(object):
 
     def get_results_for_run(self, run_id):
         results_run_uri = 'get_results_for_run/{run_id}'.format(run_id=run_id)
-        return self.client.send_get(results_run_uri)
+        return self.client.send_get_all(results_run_uri, key='results')
 
     def get_results_for_case(self, run_id, case_id):
         results_case_uri = 'get_results_for_case/{run_id}/{case_id}'.format(
@@ -390,14 +442,14 @@ class TestRailProject(object):
         add_results_test_uri = 'add_results_for_cases/{run_id}'.format(
             run_id=run_id)
         new_results = {'results': []}
-        tests_cases = self.get_cases(suite_id)
         for results in tests_results:
-            if results.group is None:
+            if results.case_id is not None:
+                case = {'id': results.case_id}
+            elif results.group is None:
                 case = self.get_case_by_name(suite_id, results.name)
             else:
                 case = self.get_case_by_group(suite_id=suite_id,
-                                              group=results.group,
-                                              cases=tests_cases)
+                                              group=results.group)
             case_id = case['id']
             new_result = {
                 'case_id': case_id,